@@ -3,8 +3,10 @@ from tkinter import *
 from src.Application.Compile_Project.Compile_Project import CompileDialog
 from src.Application.Utilities.General_Support_Functions import set_application_icon
 
-root = Tk()
-root = set_application_icon(root)
-root.eval('tk::PlaceWindow . center')
-CompileDialog(root)
-root.mainloop()
+# The guard keeps worker processes (the contact sheet thumbnails are made in a process pool) from opening the dialog
+if __name__ == '__main__':
+    root = Tk()
+    root = set_application_icon(root)
+    root.eval('tk::PlaceWindow . center')
+    CompileDialog(root)
+    root.mainloop()
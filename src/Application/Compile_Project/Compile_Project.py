@@ -8,15 +8,18 @@ import time
 from tkinter import *
 from tkinter import ttk, filedialog, messagebox
 
-import pandas as pd
-
 from src.Application.Utilities.Compille_All_tracks import compile_all_tracks
+from src.Application.Utilities.Directory_Index import (
+    get_project_index,
+    invalidate_directory_index)
 from src.Application.Utilities.General_Support_Functions import (
     read_experiment_file,
     read_squares_from_file,
     format_time_nicely,
     correct_all_images_column_types,
-    classify_directory)
+    classify_directory,
+    set_pandas_options)
+from src.Application.Utilities.Thumbnails import write_contact_sheet
 from src.Application.Utilities.ToolTips import ToolTip
 from src.Fiji.LoggerConfig import (
     paint_logger,
@@ -39,6 +42,9 @@ if not paint_logger_file_name_assigned:
 def compile_project_output(
         project_dir: str,
         verbose: bool = False):
+    # pandas is imported on first use, so the Compile Project dialog comes up without waiting for it
+    import pandas as pd
+
     paint_logger.info("")
     paint_logger.info(f"Compiling 'All Recordings' and 'All Squares' for {project_dir}")
     time_stamp = time.time()
@@ -47,16 +53,18 @@ def compile_project_output(
     df_all_recordings = pd.DataFrame()
     df_all_squares = pd.DataFrame()
 
-    experiment_dirs = os.listdir(project_dir)
-    experiment_dirs.sort()
+    # All subdirectories, sorted, from the shared directory index. Not only those that pass the experiment check,
+    # so an incomplete experiment is reported below rather than silently left out
+    project_index = get_project_index(project_dir)
+    experiment_dirs = list(project_index['subdirectories']) if project_index else []
 
     for experiment_name in experiment_dirs:
 
         experiment_dir_path = os.path.join(project_dir, experiment_name)
-        if not os.path.isdir(experiment_dir_path) or 'Output' in experiment_name or experiment_name.startswith('-'):
+        if 'Output' in experiment_name or experiment_name.startswith('-'):
             continue
         if False:
-            paint_logger.debug(f'Processing experiment: {experiment_dir_path}')
+            paint_logger.debug('Processing experiment: %s', experiment_dir_path)
 
         # Read the experiment file
         df_experiment = read_experiment_file(os.path.join(experiment_dir_path, 'All Recordings.csv'))
@@ -95,6 +103,7 @@ def compile_project_output(
     # Save the files,
     df_all_squares.to_csv(os.path.join(project_dir, 'All Squares.csv'), index=False)
     df_all_recordings.to_csv(os.path.join(project_dir, 'All Recordings.csv'), index=False)
+    invalidate_directory_index(project_dir)
 
     run_time = time.time() - time_stamp
     paint_logger.info(
@@ -107,6 +116,9 @@ def compile_project_output(
 
     compile_all_tracks(project_dir)
 
+    # An overview of all recordings of the project, for browsing without opening every image
+    write_contact_sheet(project_dir)
+
 
 class CompileDialog:
 
@@ -163,6 +175,7 @@ class CompileDialog:
         # Determine if it indeed is a project directory
         dir_type, _ = classify_directory(self.project_directory)
         if dir_type == 'Project':  # Project directory, so proceed
+            set_pandas_options()  # pandas is only imported now, so the dialog starts without waiting for it
             compile_project_output(project_dir=self.project_directory, verbose=True)
             self.root.destroy()
         elif dir_type == 'Experiment':  # Experiment directory, so warn
@@ -1,10 +1,7 @@
 import warnings
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from scipy.optimize import OptimizeWarning
-from scipy.optimize import curve_fit
 
 from src.Fiji.LoggerConfig import paint_logger
 
@@ -59,8 +56,12 @@ def curve_fit_and_plot(
     """
     The funct ion fits an exponential decay function to the data and plots the result.
     Function = m * np.exp(-t * x) + b
+    SciPy is imported on the first fit and matplotlib only when a plot is made, as both take long to import.
     """
 
+    from scipy.optimize import OptimizeWarning
+    from scipy.optimize import curve_fit
+
     # The curve_fit function expects x and y Numpy arrays
     x = np.asarray(plot_data["Track Duration"])
     y = np.asarray(plot_data["Frequency"])
@@ -107,6 +108,8 @@ def curve_fit_and_plot(
             r_squared = 0
 
     if plot_to_file:
+        import matplotlib.pyplot as plt
+
         fig, ax = plt.subplots()
         ax.scatter(x, y, linewidth=1.0, label="Data")
         ax.plot(x, mono_exp(x, m, t, b), linewidth=1.0, label="Fitted")
@@ -134,6 +137,7 @@ def curve_fit_and_plot(
             fig.savefig(file)
             if verbose:
                 paint_logger.debug("\nWriting plot file: " + file)
+        plt.close(fig)
 
     # Inspect the parameters
     if verbose:
@@ -142,8 +146,6 @@ def curve_fit_and_plot(
         print(f'Y = {m:.3f} * e^(-{t:.3f} * x) + {b:.3f}')
         print(f'Tau = {tau_per_sec * 1e3:.0f} ms')
 
-    plt.close()
-
     # Convert to milliseconds
     tau_per_sec *= 1000
     return tau_per_sec, r_squared
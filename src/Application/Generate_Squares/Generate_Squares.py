@@ -8,10 +8,12 @@ from src.Application.Recording_Viewer.Select_Squares import (
     select_squares_with_parameters,
     label_selected_squares_and_tracks)
 from src.Fiji.LoggerConfig import (
-    paint_logger,
+    get_paint_logger,
     paint_logger_change_file_handler_name,
     paint_logger_file_name_assigned)
 
+paint_logger = get_paint_logger('Generate_Squares')
+
 if not paint_logger_file_name_assigned:
     paint_logger_change_file_handler_name('Generate Squares.log')
 
@@ -20,6 +22,7 @@ from src.Application.Generate_Squares.Generate_Squares_Support_Functions import
     calc_variability,
     calculate_density,
     calc_area_of_square,
+    calc_recording_size,
     calc_average_track_count_in_background_squares,
     create_unique_key_for_squares,
     extra_constraints_on_tracks_for_tau_calculation,
@@ -27,10 +30,20 @@ from src.Application.Generate_Squares.Generate_Squares_Support_Functions import
     read_recordings_of_experiment,
     read_tracks_of_experiment,
     get_row_and_column,
+    get_recording_duration,
+    get_recording_calibration,
     calculate_tau,
     calculate_average_long_track
 )
-
+from src.Application.Utilities.Diffusion_Coefficient_Engine import (
+    update_tracks_diffusion_coefficients,
+    get_frame_intervals,
+    FIRST_SPOT)
+
+from src.Application.Utilities.Directory_Index import (
+    get_project_index,
+    get_file_mtime,
+    invalidate_directory_index)
 from src.Application.Utilities.General_Support_Functions import (
     format_time_nicely)
 
@@ -66,23 +79,21 @@ def process_project(
 
     paint_logger.info(f"Starting generating squares for all recordings in {project_path}")
     paint_logger.info('')
-    experiment_dirs = os.listdir(project_path)
-    experiment_dirs.sort()
+    # The experiment directories (and the files they hold) come from the shared directory index
+    project_index = get_project_index(project_path)
+    experiment_indexes = project_index['subdirectories'] if project_index else {}
 
     nr_experiments_processed = 0
-    for experiment_dir in experiment_dirs:
+    for experiment_dir, experiment_index in experiment_indexes.items():
 
-        # Skip if not a directory or if it is the Output directory
-        if not os.path.isdir(os.path.join(project_path, experiment_dir)):
-            continue
+        # Skip if it is the Output directory
         if 'Output' in experiment_dir:
             continue
 
         # Look at the time tags and decide if reprocessing is needed. Always process when the paint_force flag is set
-        if (os.path.exists(os.path.join(project_path, experiment_dir)) and
-                os.path.exists(os.path.join(project_path, experiment_dir, 'All Squares.csv')) and
-                os.path.exists(os.path.join(project_path, experiment_dir, 'All Recordings.csv')) and
-                os.path.exists(os.path.join(project_path, experiment_dir, 'All Tracks.csv')) and
+        if (get_file_mtime(experiment_index, 'All Squares.csv') is not None and
+                get_file_mtime(experiment_index, 'All Recordings.csv') is not None and
+                get_file_mtime(experiment_index, 'All Tracks.csv') is not None and
                 not paint_force):
             paint_logger.info('')
             paint_logger.info(f"Experiment output exists and skipped: {experiment_dir}")
@@ -135,6 +146,16 @@ def process_experiment(
     # Read the Recordings file, check the integrity and add some columns
     df_recordings_of_experiment = read_recordings_of_experiment(experiment_path)
 
+    # When Run TrackMate exported the spots, calculate the diffusion coefficients here rather than in Fiji
+    spots_file_path = os.path.join(experiment_path, 'All Spots.csv')
+    if os.path.isfile(spots_file_path):
+        dc_method = get_paint_attribute('Generate Squares', 'Diffusion Coefficient Method') or FIRST_SPOT
+        df_tracks_of_experiment = update_tracks_diffusion_coefficients(
+            df_tracks_of_experiment,
+            pd.read_csv(spots_file_path),
+            get_frame_intervals(df_recordings_of_experiment),
+            dc_method)
+
     # Add some parameters that the user just specified to the experiment
     df_recordings_of_experiment = add_columns_to_experiment(
         df_recordings_of_experiment,
@@ -170,7 +191,8 @@ def process_experiment(
         recording_name = recording_data['Ext Recording Name']
 
         # Process the Recording
-        paint_logger.debug(f"Processing file {current_image_nr} of {nr_of_recordings_to_process}: {recording_name}")
+        paint_logger.debug("Processing file %d of %d: %s", current_image_nr, nr_of_recordings_to_process,
+                           recording_name)
 
         df_tracks_of_recording = df_tracks_of_experiment[
             df_tracks_of_experiment['Ext Recording Name'] == recording_name]
@@ -209,6 +231,7 @@ def process_experiment(
     # Make a unique index and then save df_squares_of_experiment into the All Squares file
     df_squares_of_experiment = create_unique_key_for_squares(df_squares_of_experiment)
     df_squares_of_experiment.to_csv(os.path.join(experiment_path, "All Squares.csv"), index=False)
+    invalidate_directory_index(experiment_path)
 
     run_time = round(time.time() - time_stamp, 1)
     paint_logger.info(f"Processed  {nr_files:2d} images in {experiment_path} in {format_time_nicely(run_time)}")
@@ -257,7 +280,11 @@ def process_recording(
     # Create an empty squares dataframe, that will contain the data for each square
     df_squares_of_recording = pd.DataFrame()
     nr_total_squares = int(nr_of_squares_in_row * nr_of_squares_in_row)
-    square_area = calc_area_of_square(nr_of_squares_in_row)
+    # The squares are laid out on, and their area is taken from, the same calibrated recording
+    recording_calibration = get_recording_calibration(recording_data)
+    recording_size = calc_recording_size(*recording_calibration)
+    square_area = calc_area_of_square(nr_of_squares_in_row, *recording_calibration)
+    recording_duration = get_recording_duration(recording_data)
 
     # --------------------------------------------------------------------------------------------
     # Generate the data for a square in a row and append it to the squares dataframe
@@ -277,6 +304,8 @@ def process_recording(
             min_allowable_r_squared,
             min_tracks_for_tau,
             square_area,
+            recording_size,
+            recording_duration,
             square_seq_nr,
             row_nr,
             col_nr)
@@ -317,7 +346,9 @@ def process_recording(
         min_allowable_r_squared,
         nr_of_squares_in_row,
         float(recording_data['Concentration']),
-        select_parameters)
+        select_parameters,
+        square_area,
+        recording_duration)
 
     return df_squares_of_recording, df_tracks_of_recording, recording_tau, recording_r_squared, recording_density
 
@@ -339,11 +370,13 @@ def process_square(
         min_allowable_r_squared: float,
         min_tracks_for_tau: int,
         square_area: float,
+        recording_size: float,
+        recording_duration: float,
         square_seq_nr: int,
         row_nr: int,
         col_nr: int) -> pd.Series:
     # Determine which tracks fall within the square defined by boundaries x0, y0, x1, y1
-    x0, y0, x1, y1 = get_square_coordinates(nr_of_squares_in_row, square_seq_nr)
+    x0, y0, x1, y1 = get_square_coordinates(nr_of_squares_in_row, square_seq_nr, recording_size)
     mask = ((df_tracks_of_recording['Track X Location'] >= x0) &
             (df_tracks_of_recording['Track X Location'] < x1) &
             (df_tracks_of_recording['Track Y Location'] >= y0) &
@@ -385,11 +418,11 @@ def process_square(
 
         # Calculate the density for the square-
         density = calculate_density(
-            nr_tracks=nr_of_tracks_in_square, area=square_area, time=100, concentration=concentration,
+            nr_tracks=nr_of_tracks_in_square, area=square_area, time=recording_duration, concentration=concentration,
             magnification=1000)
 
         # Calculate the variability for the square
-        variability = calc_variability(df_tracks_of_square, square_seq_nr, nr_of_squares_in_row, 10)
+        variability = calc_variability(df_tracks_of_square, square_seq_nr, nr_of_squares_in_row, 10, recording_size)
 
         # Calculate the diffusion coefficient for the square
         dc_mean = df_tracks_of_square['Diffusion Coefficient'].mean()
@@ -445,7 +478,9 @@ def calculate_tau_and_density_for_recording(
         min_allowable_r_squared: float,
         nr_of_squares_in_row: int,
         concentration: float,
-        select_parameters: dict
+        select_parameters: dict,
+        square_area: float,
+        recording_duration: float
 ) -> tuple:
     """
     This function calculates a single Tau and Density for a Recording. It does this by considering all the tracks
@@ -477,8 +512,8 @@ def calculate_tau_and_density_for_recording(
         min_allowable_r_squared)
 
     # Calculate the Density
-    area = calc_area_of_square(nr_of_squares_in_row)
     density = calculate_density(
-        nr_tracks=nr_of_tracks_for_single_tau, area=area, time=100, concentration=concentration, magnification=1000)
+        nr_tracks=nr_of_tracks_for_single_tau, area=square_area, time=recording_duration, concentration=concentration,
+        magnification=1000)
 
     return tau, r_squared, density
@@ -3,14 +3,10 @@ import time
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 
-from src.Application.Generate_Squares.Generate_Squares import (
-    process_project,
-    process_experiment)
-from src.Application.Generate_Squares.Generate_Squares_Support_Functions import (
-    pack_select_parameters)
 from src.Application.Utilities.General_Support_Functions import (
     format_time_nicely,
-    classify_directory
+    classify_directory,
+    set_pandas_options
 )
 from src.Application.Utilities.ToolTips import ToolTip
 from src.Fiji.LoggerConfig import (
@@ -173,6 +169,14 @@ class GenerateSquaresDialog:
             messagebox.showwarning(title='Warning', message="The selected directory does not exist")
             return
 
+        # The processing needs pandas, NumPy and SciPy, they are imported here rather than when the dialog starts
+        set_pandas_options()
+        from src.Application.Generate_Squares.Generate_Squares import (
+            process_project,
+            process_experiment)
+        from src.Application.Generate_Squares.Generate_Squares_Support_Functions import (
+            pack_select_parameters)
+
         self.level, _ = classify_directory(self.paint_directory)
         if self.level == 'Project':
             generate_function = process_project
@@ -11,16 +11,15 @@ from src.Application.Generate_Squares.Curvefit_and_Plot import (
 from src.Fiji.LoggerConfig import paint_logger
 from src.Fiji.PaintConfig import get_paint_attribute
 
-pd.options.mode.copy_on_write = True
-
 
 def calculate_density(nr_tracks: int, area: float, time: float, concentration: float, magnification: float) -> float:
     """
     The function implements a simple algorithm to calculate the density of tracks in a square.
     To calculate the density use the actual surface coordinates.
-    Assume 2000 frames (100 sec) -  need to check - this is not always the case
+    The time is the duration of the recording (see get_recording_duration), 100 sec (2000 frames) if not known
     Multiply by 1000 to get an easier number
-    Area is calculated with Fiji info:
+    Area is calculated from the Pixel Size and Image Width of the recording (see calc_recording_size), with Fiji info
+    when those are not known:
         Width: 82.0864 microns(512)
         Height: 82.0864 microns(512)
     The area of a square then is (82.0854/nr_of_squares_in_row)^2
@@ -43,15 +42,17 @@ def calculate_density(nr_tracks: int, area: float, time: float, concentration: f
     return density
 
 
-def get_square_coordinates(nr_of_squares_in_row, sequence_number):
+def get_square_coordinates(nr_of_squares_in_row, sequence_number, recording_size=None):
     """
 
     :param nr_of_squares_in_row:
     :param sequence_number: The sequence number of the square for which the coordinates are needed
+    :param recording_size: The width of the recording in micrometers (see calc_recording_size)
     :return: The coordinates of the upper left (x0, y0) and lower right corner (x1, y1)
     """
-    width = 82.0864 / nr_of_squares_in_row
-    height = 82.0864 / nr_of_squares_in_row
+    recording_size = recording_size or calc_recording_size()
+    width = recording_size / nr_of_squares_in_row
+    height = recording_size / nr_of_squares_in_row
 
     i = sequence_number % nr_of_squares_in_row
     j = sequence_number // nr_of_squares_in_row
@@ -63,7 +64,7 @@ def get_square_coordinates(nr_of_squares_in_row, sequence_number):
     return x0, y0, x1, y1
 
 
-def calc_variability(df_tracks, square_nr, nr_of_squares_in_row, granularity):
+def calc_variability(df_tracks, square_nr, nr_of_squares_in_row, granularity, recording_size=None):
     """
     The variability is calculated by creating a grid of granularity x granularity in the square for
     which tracks_fd specifies the tracks
@@ -71,9 +72,14 @@ def calc_variability(df_tracks, square_nr, nr_of_squares_in_row, granularity):
     :param square_nr: The sequence number of the square for which the variability is calculated
     :param nr_of_squares_in_row: The number of rows and columns in the image
     :param granularity: Specifies how fine the grid is that is created
+    :param recording_size: The width of the recording in micrometers (see calc_recording_size)
     :return:
     """
 
+    # The width and height of a square follow from the width of the recording
+    width = (recording_size or calc_recording_size()) / nr_of_squares_in_row
+    height = width
+
     # Create the matrix for the variability analysis
     matrix = np.zeros((granularity, granularity), dtype=int)
 
@@ -83,10 +89,6 @@ def calc_variability(df_tracks, square_nr, nr_of_squares_in_row, granularity):
         x = float(row["Track X Location"])
         y = float(row["Track Y Location"])
 
-        # The width of the image is 82.0864 micrometer. The width and height of a square can be calculated
-        width = 82.0864 / nr_of_squares_in_row
-        height = width
-
         # Get the grid indices for this track and update the matrix
         xi, yi = get_indices(x, y, width, height, square_nr, nr_of_squares_in_row, 10)
         matrix[yi, xi] += 1
@@ -190,15 +192,55 @@ def calc_average_track_count_in_background_squares(df_squares, nr_of_average_cou
     return average
 
 
-def calc_area_of_square(nr_of_squares_in_row):
-    micrometer_per_pixel = 0.1602804  # Referenced from Fiji
-    pixel_per_image = 512  # Referenced from Fiji
-    micrometer_per_image = micrometer_per_pixel * pixel_per_image
+def calc_recording_size(micrometer_per_pixel=None, pixel_per_image=None):
+    """
+    The width (and height) of a recording in micrometers, from its calibration (see get_recording_calibration)
+    :return: The width in micrometers, 82.0864 when the calibration is not known
+    """
+
+    micrometer_per_pixel = micrometer_per_pixel or 0.1602804  # Referenced from Fiji
+    pixel_per_image = pixel_per_image or 512  # Referenced from Fiji
+    return micrometer_per_pixel * pixel_per_image
+
+
+def calc_area_of_square(nr_of_squares_in_row, micrometer_per_pixel=None, pixel_per_image=None):
+    micrometer_per_image = calc_recording_size(micrometer_per_pixel, pixel_per_image)
     micrometer_per_square = micrometer_per_image / nr_of_squares_in_row
     area = micrometer_per_square * micrometer_per_square
     return area
 
 
+def _get_positive_value(recording_data, column):
+    try:
+        value = float(recording_data.get(column))
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def get_recording_duration(recording_data):
+    """
+    The duration of a recording from its acquisition parameters: 'Nr Frames' (written by Prepare Experiment Info from
+    the metadata index) times the 'Frame Interval' (written by Run TrackMate)
+    :return: The duration in seconds, 100 seconds (2000 frames) when the parameters are not known
+    """
+
+    nr_frames = _get_positive_value(recording_data, 'Nr Frames')
+    frame_interval = _get_positive_value(recording_data, 'Frame Interval')
+    if nr_frames is None or frame_interval is None:
+        return 100
+    return nr_frames * frame_interval
+
+
+def get_recording_calibration(recording_data):
+    """
+    The pixel size and width of a recording from its acquisition parameters, as written by Prepare Experiment Info
+    :return: A tuple with the micrometer per pixel and the pixels per image, None for values that are not known
+    """
+
+    return _get_positive_value(recording_data, 'Pixel Size'), _get_positive_value(recording_data, 'Image Width')
+
+
 def create_unique_key_for_squares(df):
     df['String Square Nr'] = df['Square Nr'].astype(str)
     df['Unique Key'] = df['Ext Recording Name'] + ' - ' + df['String Square Nr']
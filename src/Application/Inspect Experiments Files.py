@@ -5,9 +5,11 @@ from tkinter import ttk, filedialog, messagebox
 
 import pandas as pd
 
+from src.Application.Utilities.Directory_Index import get_project_index
 from src.Application.Utilities.General_Support_Functions import (
     read_experiment_file,
-    classify_directory
+    classify_directory,
+    set_pandas_options
 )
 from src.Fiji.PaintConfig import (
     get_paint_attribute,
@@ -32,14 +34,13 @@ def inspect_experiment_squares_files(root_dir):
         logging.error(f"Root directory '{root_dir}' does not exist.")
         return
 
-    # Get the list of experiment directories
-    experiment_dir_names = sorted(os.listdir(root_dir))
+    # Get the list of directories from the shared directory index, also those that are incomplete, to report them
+    project_index = get_project_index(root_dir)
+    experiment_dir_names = list(project_index['subdirectories']) if project_index else []
 
     for experiment_dir_name in experiment_dir_names:
         paint_dir_path = os.path.join(root_dir, experiment_dir_name)
 
-        if not os.path.isdir(paint_dir_path):  # If it's not a directory, skip it
-            continue
         if 'Output' in experiment_dir_name:  # Skip the output directory
             continue
         if experiment_dir_name.startswith('-'):  # Skip directories marked with '-'
@@ -146,6 +147,7 @@ class InspectDialog:
 
 
 if __name__ == '__main__':
+    set_pandas_options()
     root = Tk()
     root.eval('tk::PlaceWindow . center')
     InspectDialog(root)
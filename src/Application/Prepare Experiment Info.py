@@ -7,12 +7,21 @@ from tkinter import ttk, filedialog
 import pandas as pd
 
 from src.Application.Process_Projects.Convert_BF_from_nd2_to_jpg import convert_bf_images
-from src.Application.Utilities.General_Support_Functions import set_application_icon
+from src.Application.Utilities.General_Support_Functions import (
+    set_application_icon,
+    set_pandas_options)
+from src.Application.Utilities.ND2_Metadata_Index import (
+    get_metadata_index,
+    get_recording_metadata)
 from src.Fiji.LoggerConfig import (
     paint_logger,
     paint_logger_change_file_handler_name)
 from src.Fiji.PaintConfig import get_paint_attribute
 
+# The filename format of both the film and the BF
+RECORDING_NAME_FORMAT = re.compile(
+    r'(?P<exp_date>\d{6})-Exp-(?P<condition_nr>\d{1,2})-[AB][1234]-(?P<replicate_nr>\d{1,2})(-BF[1-2])?$')
+
 
 def prepare_experiment_info_file(image_source_directory, experiment_directory):
     """
@@ -20,20 +29,16 @@ def prepare_experiment_info_file(image_source_directory, experiment_directory):
     :return:
     """
 
-    all_recordings = os.listdir(image_source_directory)
-    all_recordings.sort()
     format_problem = False
     img_file_ext = get_paint_attribute('Paint', 'Image File Extension')
 
+    # A single scan of the directory, which also reads the acquisition parameters of new recordings
+    metadata_index = get_metadata_index(image_source_directory, img_file_ext)
+    all_recordings = list(metadata_index)
+
     # Check if this is a likely correct directory. There should be lots of image files
-    count = 0
-    count_bf = 0
-    for recording_name in all_recordings:
-        if recording_name.endswith(img_file_ext):
-            if recording_name.find("BF") == -1:
-                count += 1
-            else:
-                count_bf += 1
+    count_bf = sum(1 for recording_name in all_recordings if recording_name.find("BF") != -1)
+    count = len(all_recordings) - count_bf
 
     # If there are less than 10 files, ask the user
     if count < 10:
@@ -46,23 +51,13 @@ def prepare_experiment_info_file(image_source_directory, experiment_directory):
     # Prepare the df to receive the date
     df_experiment = pd.DataFrame()
 
-    # Scan the files
-    all_recordings = os.listdir(image_source_directory)
-    all_recordings.sort()
-
     seq_nr = 1
     paint_logger.info("")
 
     for recording_name in all_recordings:
 
-        # Skip files starting with .
-        if recording_name.startswith(('._', '.DS')) or not recording_name.endswith(img_file_ext):
-            continue
-
         # Check the filename format of both the film and the BF
-        regexp = re.compile(
-            r'(?P<exp_date>\d{6})-Exp-(?P<condition_nr>\d{1,2})-[AB][1234]-(?P<replicate_nr>\d{1,2})(-BF[1-2])?$')
-        match = regexp.match(os.path.splitext(recording_name)[0])
+        match = RECORDING_NAME_FORMAT.match(os.path.splitext(recording_name)[0])
         if match is None:
             format_problem = True
             paint_logger.info(f"Image name: {recording_name} is not in the expected format")
@@ -81,6 +76,7 @@ def prepare_experiment_info_file(image_source_directory, experiment_directory):
         paint_logger.info(f'Processing file: {recording_name}')
 
         recording_name = recording_name.replace(img_file_ext, "")
+        metadata = get_recording_metadata(metadata_index, recording_name, img_file_ext)
 
         row = {'Recording Sequence Nr': seq_nr,
                'Recording Name': recording_name,
@@ -95,6 +91,10 @@ def prepare_experiment_info_file(image_source_directory, experiment_directory):
                'Concentration': '',
                'Threshold': '',
                'Process': 'Yes',
+               'Nr Frames': metadata.get('Nr Frames', ''),
+               'Pixel Size': metadata.get('Pixel Size', ''),
+               'Image Width': metadata.get('Image Width', ''),
+               'Image Height': metadata.get('Image Height', ''),
                }
         df_experiment = pd.concat([df_experiment, pd.DataFrame.from_records([row])])
         seq_nr += 1
@@ -123,6 +123,7 @@ def prepare_experiment_info_file(image_source_directory, experiment_directory):
 
 
 if __name__ == '__main__':
+    set_pandas_options()
 
     class BatchDialog:
 
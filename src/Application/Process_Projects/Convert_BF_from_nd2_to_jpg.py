@@ -1,38 +1,98 @@
+"""
+Conversion of the bright field recordings to JPEG.
+
+The BF recordings that are new or changed since their JPEG was written are converted in a process pool. 16-bit frames
+are scaled to 8 bit with a lookup table, without float temporaries. The JPEGs, and their thumbnails (see Thumbnails),
+are kept in a 'Brightfield Images' directory next to the recordings, and that directory is synchronised incrementally
+to the experiment: only files that are missing or differ are copied, and JPEGs that no longer have a source are
+removed.
+"""
+
 import os
 import shutil
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 from PIL import Image
 from nd2reader import ND2Reader
 
+from src.Application.Utilities.ND2_Metadata_Index import get_metadata_index
+from src.Application.Utilities.Thumbnails import make_thumbnails_for_directory
 from src.Fiji.LoggerConfig import paint_logger
 from src.Fiji.PaintConfig import get_paint_attribute
 
 
+def _normalise_to_uint8(frame):
+    """
+    Scale a 16-bit frame to the range 0-255, as (frame - min) / (max - min) * 255 rounded down, in integer arithmetic.
+    The minimum is subtracted in place and the result is taken from a lookup table of (max - min + 1) entries.
+    :return: The 8-bit frame
+    """
+
+    if not frame.flags.writeable:
+        frame = frame.copy()
+    min_val = int(frame.min())
+    max_val = int(frame.max())
+
+    # Avoid division by zero in case the image is uniform
+    if max_val == min_val:
+        return np.zeros(frame.shape, dtype=np.uint8)
+
+    np.subtract(frame, min_val, out=frame)
+    lut = (np.arange(max_val - min_val + 1, dtype=np.uint32) * 255 // (max_val - min_val)).astype(np.uint8)
+    return np.take(lut, frame)
+
+
 def _convert_native_to_jpg(native_file_path, output_file):
-    with ND2Reader(native_file_path) as images:
-
-        frame = images[0]
-        # Check if the frame is in 16-bit format
-        if frame.dtype == np.uint16:
-            # Normalize the 16-bit frame to the range 0-255 (8-bit)
-            min_val = np.min(frame)
-            max_val = np.max(frame)
-
-            # Avoid division by zero in case the image is uniform
-            if max_val > min_val:
-                frame = ((frame - min_val) / (max_val - min_val) * 255).astype(np.uint8)
-            else:
-                frame = np.zeros_like(frame, dtype=np.uint8)  # Handle uniform image case
+    """
+    Convert the first frame of a recording to JPEG. This function runs in a worker process.
+    :return: None if the conversion succeeded, otherwise the error message
+    """
 
-        # Convert frame to PIL Image
-        img = Image.fromarray(frame)
+    try:
+        with ND2Reader(native_file_path) as images:
+            frame = np.asarray(images[0])
+            # Check if the frame is in 16-bit format
+            if frame.dtype == np.uint16:
+                frame = _normalise_to_uint8(frame)
+            Image.fromarray(frame).save(output_file, 'JPEG')
+    except Exception as e:
+        return str(e)
+    return None
 
-        # Save the image as .jpg
-        img.save(output_file, 'JPEG')
 
+def _sync_directory(source_dir, dest_dir):
+    """
+    Make dest_dir the same as source_dir, copying only files that are missing or differ in size or modification time.
+    Subdirectories (the thumbnails) are synchronised in the same way.
+    :return: The number of files copied
+    """
 
-def convert_bf_images(image_source_directory, paint_directory, force=False):
+    os.makedirs(dest_dir, exist_ok=True)
+    source_files = {}
+    nr_copied = 0
+    for entry in os.scandir(source_dir):
+        if entry.is_file():
+            source_files[entry.name] = entry.stat()
+        elif entry.is_dir():
+            nr_copied += _sync_directory(entry.path, os.path.join(dest_dir, entry.name))
+
+    for entry in os.scandir(dest_dir):
+        if entry.is_file() and entry.name not in source_files:
+            os.remove(entry.path)
+
+    for file_name, source_stat in source_files.items():
+        dest_file = os.path.join(dest_dir, file_name)
+        if os.path.isfile(dest_file):
+            dest_stat = os.stat(dest_file)
+            if dest_stat.st_size == source_stat.st_size and int(dest_stat.st_mtime) == int(source_stat.st_mtime):
+                continue
+        shutil.copy2(os.path.join(source_dir, file_name), dest_file)
+        nr_copied += 1
+    return nr_copied
+
+
+def convert_bf_images(image_source_directory, paint_directory, force=False, max_workers=None):
     """
     Convert BF images to JPEG and store them in a specified directory.
 
@@ -40,6 +100,7 @@ def convert_bf_images(image_source_directory, paint_directory, force=False):
         image_source_directory (str): Directory containing the  images.
         paint_directory (str): Directory to store the converted JPEGs.
         force (bool): Force overwrite of existing JPEG files, even if up to date.
+        max_workers (int): The number of worker processes, defaults to the number of CPUs.
     """
 
     img_file_ext = get_paint_attribute('Paint', 'Image File Extension')
@@ -52,13 +113,12 @@ def convert_bf_images(image_source_directory, paint_directory, force=False):
     paint_logger.info('')  # Start logging new run
 
     count = found = converted = 0
-    all_images = sorted(os.listdir(image_source_directory))  # Sort images for predictable processing order
 
-    for image_name in all_images:
-        # Skip hidden files or system files
-        if image_name.startswith('._') or not image_name.endswith(img_file_ext):
-            continue
+    # The metadata index lists the recordings, sorted for predictable processing order, with their modification times
+    metadata_index = get_metadata_index(image_source_directory, img_file_ext, max_workers=max_workers)
 
+    conversions = []
+    for image_name, index_entry in metadata_index.items():
         count += 1
 
         # Only process Bright Field (BF) images
@@ -69,32 +129,41 @@ def convert_bf_images(image_source_directory, paint_directory, force=False):
             output_file = os.path.join(bf_jpeg_dir, image_name.replace(img_file_ext, '.jpg'))
 
             # Determine if the image needs to be converted (force flag or file modification check)
-            convert = force or not os.path.isfile(output_file) or os.path.getmtime(output_file) < os.path.getmtime(
-                input_file)
+            convert = force or not os.path.isfile(output_file) or os.path.getmtime(output_file) < index_entry['Mtime']
 
             if convert:
-                try:
-                    _convert_native_to_jpg(input_file, output_file)
-                    paint_logger.info("Image %s was updated.", display_name)
-                    converted += 1
-                except Exception as e:
-                    paint_logger.error("Error converting %s: %s", display_name, str(e))
+                conversions.append((display_name, input_file, output_file))
             else:
                 paint_logger.info("Image %s does not require updating.", display_name)
 
+    # A pool only pays off when there is more than one image to convert
+    if len(conversions) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            errors = list(executor.map(_convert_native_to_jpg,
+                                       [input_file for _, input_file, _ in conversions],
+                                       [output_file for _, _, output_file in conversions]))
+    else:
+        errors = [_convert_native_to_jpg(input_file, output_file) for _, input_file, output_file in conversions]
+
+    for (display_name, _, _), error in zip(conversions, errors):
+        if error is None:
+            paint_logger.info("Image %s was updated.", display_name)
+            converted += 1
+        else:
+            paint_logger.error("Error converting %s: %s", display_name, error)
+
+    # The thumbnails of the converted images, and of earlier images that do not have them yet
+    make_thumbnails_for_directory(bf_jpeg_dir, max_workers=max_workers)
+
     # Log the conversion summary
     paint_logger.info('')
     paint_logger.info("Converted %d BF images, out of %d BF images from %d total images.", converted, found,
                       count)
 
-    # Copy the entire 'Converted BF Images' directory to the paint directory
+    # Bring the 'Brightfield Images' directory in the paint directory up to date
     dest_dir = os.path.join(paint_directory, "Brightfield Images")
-    if os.path.exists(dest_dir):
-        # If the destination directory already exists, remove it before copying
-        shutil.rmtree(dest_dir)
-
     try:
-        shutil.copytree(bf_jpeg_dir, dest_dir)
-        paint_logger.info("Copied the entire 'Brightfield Images' directory to %s", dest_dir)
+        nr_copied = _sync_directory(bf_jpeg_dir, dest_dir)
+        paint_logger.info("Copied %d changed files of the 'Brightfield Images' directory to %s", nr_copied, dest_dir)
     except Exception as e:
         paint_logger.error("Error copying the directory %s to %s: %s", bf_jpeg_dir, dest_dir, str(e))
@@ -0,0 +1,46 @@
+import argparse
+import os
+import sys
+
+from src.Application.Utilities.Diffusion_Coefficient_Engine import (
+    recompute_diffusion_coefficients,
+    FIRST_SPOT,
+    MSD_FIT)
+from src.Application.Utilities.Directory_Index import get_experiment_names
+from src.Application.Utilities.General_Support_Functions import set_pandas_options
+from src.Fiji.LoggerConfig import paint_logger_change_file_handler_name
+from src.Fiji.PaintConfig import get_paint_attribute
+
+paint_logger_change_file_handler_name('Recalculate Diffusion Coefficients.log')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recalculate the diffusion coefficients in All Tracks from All Spots, without running TrackMate")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--experiment-directory', nargs='+', help='One or more experiment directories')
+    group.add_argument('--project-directory', help='A project directory, all its experiments are processed')
+    parser.add_argument('--recordings-directory',
+                        help='Read the frame intervals from the recordings here instead of from All Recordings')
+    parser.add_argument('--method', choices=[FIRST_SPOT, MSD_FIT],
+                        help="By default the 'Diffusion Coefficient Method' of Generate Squares in Paint.json")
+    args = parser.parse_args()
+    set_pandas_options()
+
+    method = args.method or get_paint_attribute('Generate Squares', 'Diffusion Coefficient Method') or FIRST_SPOT
+    if args.project_directory:
+        experiment_paths = [os.path.join(args.project_directory, experiment_name)
+                            for experiment_name in get_experiment_names(args.project_directory)]
+    else:
+        experiment_paths = args.experiment_directory
+
+    nr_failed = 0
+    for experiment_path in experiment_paths:
+        if not recompute_diffusion_coefficients(experiment_path, args.recordings_directory, method):
+            nr_failed += 1
+    if nr_failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,13 @@
 import math
 import os
 import platform
+import queue
 import shutil
 import statistics
 import subprocess
 import sys
 import tempfile
+import threading
 import time
 import tkinter as tk
 from datetime import datetime
@@ -14,13 +16,19 @@ from tkinter import messagebox
 from tkinter import ttk
 
 import pandas as pd
-from PIL import Image
+from PIL import ImageTk
 
 from src.Application.Generate_Squares.Generate_Squares_Support_Functions import (
     calculate_tau,
     extra_constraints_on_tracks_for_tau_calculation,
     calc_area_of_square,
-    calculate_density)
+    calc_recording_size,
+    calculate_density,
+    get_recording_duration,
+    get_recording_calibration)
+from src.Application.Recording_Viewer.Background_Worker import (
+    LatestRequestWorker,
+    DEBOUNCE_DELAY)
 from src.Application.Recording_Viewer.Class_Define_Cell_Dialog import DefineCellDialog
 from src.Application.Recording_Viewer.Class_Heatmap_Dialog import HeatMapDialog
 from src.Application.Recording_Viewer.Class_Select_Recording_Dialog import SelectRecordingDialog
@@ -28,20 +36,45 @@ from src.Application.Recording_Viewer.Class_Select_Square_Dialog import SelectSq
 from src.Application.Recording_Viewer.Class_Select_Viewer_Data_Dialog import SelectViewerDataDialog
 from src.Application.Recording_Viewer.Display_Selected_Squares import (
     display_selected_squares)
-from src.Application.Recording_Viewer.Get_Images import get_images
+from src.Application.Recording_Viewer.Edit_Journal import (
+    EditJournal,
+    replay_journal,
+    SQUARES,
+    TRACKS,
+    RECORDINGS)
+from src.Application.Recording_Viewer.Export_Pictures import (
+    make_export_job,
+    export_pictures,
+    render_recording_picture,
+    write_pdf_from_pngs)
+from src.Application.Recording_Viewer.Get_Images import (
+    ImageCache,
+    get_images,
+    prefetch_neighbouring_images)
 from src.Application.Recording_Viewer.Heatmap_Support import (
-    get_colormap_colors, get_color_index,
-    get_heatmap_data)
+    get_column_stats,
+    get_heatmap_data,
+    get_heatmap_image)
+from src.Application.Recording_Viewer.Project_Loader import (
+    start_loading_project_tables,
+    LOAD_PROGRESS,
+    LOAD_SQUARES,
+    LOAD_TRACKS,
+    LOAD_ERROR)
 from src.Application.Recording_Viewer.Recording_Viewer_Support_Functions import (
-    test_if_square_is_in_rectangle,
-    save_as_png,
+    get_recording_rows,
+    update_recording_rows,
+    labels_changed,
+    get_square_pixel_bounds,
+    find_squares_in_rectangle,
     find_excel_executable)
 from src.Application.Recording_Viewer.Select_Squares import (
+    count_selected_squares,
     relabel_tracks,
     select_squares)
 from src.Application.Utilities.General_Support_Functions import (
-    read_squares_from_file,
-    set_application_icon)
+    set_application_icon,
+    set_pandas_options)
 from src.Fiji.LoggerConfig import (
     paint_logger,
     paint_logger_change_file_handler_name)
@@ -71,6 +104,7 @@ class RecordingViewer:
         self.user_specified_mode = user_specified_mode
 
         self.initialize_variables()
+        self.recalc_worker = LatestRequestWorker(self.viewer_dialog)
 
         self.setup_ui()
         self.load_images_and_config()
@@ -106,6 +140,26 @@ class RecordingViewer:
         self.df_all_tracks = None
         self.df_experiment = None
 
+        # Recording name -> (start, stop) row positions in df_all_squares and df_all_tracks
+        self.squares_ranges = {}
+        self.tracks_ranges = {}
+        self.heatmap_column_stats = None  # The min and max of the heatmap columns, until the squares change
+        self.loading_queue = None  # The background loader of All Squares and All Tracks reports on this queue
+
+        # Pending (coalesced) navigation and redraw requests
+        self.pending_img_no = None
+        self.requested_img_no = None  # A recording selected while the squares were still loading
+        self.navigation_idle_id = None
+        self.detail_render_id = None
+        self.redraw_idle_id = None
+        self.right_image_item = None
+
+        # Recording name -> ThresholdIndex, built when a recording is first shown
+        self.threshold_indexes = {}
+
+        # Recording name -> (square numbers, pixel bounds) used for the rectangle selection
+        self.square_pixel_bounds = {}
+
         # UI state variables
         self.start_x = None
         self.start_y = None
@@ -114,6 +168,7 @@ class RecordingViewer:
         # Variables to keep track if the user changed something
         self.recording_changed = False
         self.save_on_exit = False
+        self.edit_journal = EditJournal(self.user_specified_directory)
 
         # Variables indicating whether to show squares and square numbers in the left pane
         self.show_squares_numbers = True
@@ -134,8 +189,14 @@ class RecordingViewer:
         self.square_info_popup = None
         self.select_recording_dialog = None
 
-        self.squares_in_rectangle = []
+        self.squares_in_rectangle = set()
         self.saved_list_images = []
+        self.image_cache = ImageCache()
+        self.squares_layer = None  # The pool of canvas items for the squares, created on first display
+        self.heatmap_image = None
+        self.export_thread = None
+        self.export_result = {}
+        self.recalc_worker = None  # Created once the viewer dialog exists
         self.only_valid_tau = True
 
         self.selected_values = []
@@ -317,12 +378,10 @@ class RecordingViewer:
     # ----------------------------------------------------------------------------------------
 
     def load_images_and_config(self):
-
-        # Read the 'All Squares' file
-        self.df_all_squares = read_squares_from_file(
-            os.path.join(self.user_specified_directory, 'All Squares.csv'))
-        if self.df_all_squares is None:
-            self.show_error_and_exit("No 'All Squares.csv.csv' file, Did you select an image directory?")
+        """
+        Stage 1 of loading: read 'All Recordings' and show the images of the first recording straight away.
+        All Squares and All Tracks are read in the background, see on_project_tables_loading.
+        """
 
         # Read the 'All Experiments' file
         self.df_experiment = pd.read_csv(os.path.join(self.user_specified_directory, 'All Recordings.csv'),
@@ -332,19 +391,6 @@ class RecordingViewer:
             self.show_error_and_exit("No 'All Recordings' file, Did you select an image directory?")
         self.df_experiment.set_index('Ext Recording Name', drop=False, inplace=True)
 
-        # Check that the two files align
-        if set(self.df_all_squares['Ext Recording Name']) != set(self.df_experiment['Ext Recording Name']):
-            self.show_error_and_exit(
-                "The recordings in the 'All Squares' file do not align with the 'All Experiments' file")
-
-        # Read the 'All Tracks' file
-        self.df_all_tracks = pd.read_csv(os.path.join(self.user_specified_directory, 'All Tracks.csv'))
-        if self.df_all_tracks is None:
-            self.show_error_and_exit("No 'All Tracks' file, Did you select an image directory?")
-        if 'Unique Key' not in self.df_all_tracks.columns:
-            self.show_error("No 'Unique Key' in the All Tracks file. Did you run Generate Squares?")
-        self.df_all_tracks.set_index('Unique Key', inplace=True, drop=False)
-
         self.nr_of_squares_in_row = int(self.df_experiment.iloc[0]['Nr of Squares in Row'])
 
         # Load the images
@@ -356,16 +402,81 @@ class RecordingViewer:
         self.list_of_image_names = [image['Left Image Name'] for image in self.list_images]
         self.cb_image_names['values'] = self.list_of_image_names
 
+        # First paint: the images and information of the first recording, without squares
+        self.img_no = 0
         self.initialise_image_display()
-        self.img_no = -1
-        self.on_forward_backward('FORWARD')
+        self.cb_image_names.set(self.image_name)
+        self.set_forward_backward_buttons('block_backward')
+        prefetch_neighbouring_images(self)
 
-    def setup_exclude_button(self):
-        # Find the index of the row matching the image name
-        row_index = self.df_experiment.index[self.df_experiment['Ext Recording Name'] == self.image_name].tolist()[0]
+        # Read the large tables in the background, the dialogs become available when everything is loaded
+        self.set_dialog_buttons(tk.DISABLED)
+        self.loading_queue = start_loading_project_tables(self.user_specified_directory)
+        self.viewer_dialog.after(100, self.on_project_tables_loading)
+
+    def on_project_tables_loading(self):
+        """
+        Process what the background loader has reported so far, then check again later until it is done
+        """
+
+        while True:
+            try:
+                message = self.loading_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if message[0] == LOAD_PROGRESS:
+                self.viewer_dialog.title(f'Recording Viewer - {self.user_specified_directory} - {message[1]}')
+            elif message[0] == LOAD_ERROR:
+                self.show_error_and_exit(message[1])
+            elif message[0] == LOAD_SQUARES:
+                self.on_squares_loaded(message[1], message[2])
+            elif message[0] == LOAD_TRACKS:
+                self.on_tracks_loaded(message[1], message[2])
+                return
+
+        self.viewer_dialog.after(100, self.on_project_tables_loading)
 
-        # Check the 'Exclude' status and set properties accordingly
-        is_excluded = self.df_experiment.loc[row_index, 'Exclude']
+    def on_squares_loaded(self, df_all_squares, squares_ranges):
+        """
+        Stage 2 of loading: the squares are available, so the recording on display can be shown with its squares
+        """
+
+        # Check that the two files align
+        if set(df_all_squares['Ext Recording Name']) != set(self.df_experiment['Ext Recording Name']):
+            self.show_error_and_exit(
+                "The recordings in the 'All Squares' file do not align with the 'All Experiments' file")
+
+        self.df_all_squares = df_all_squares
+        self.squares_ranges = squares_ranges
+        self.heatmap_column_stats = None
+
+        # Show the recording on display, or the one the user selected during loading, complete with squares
+        img_no = self.img_no if self.requested_img_no is None else self.requested_img_no
+        self.requested_img_no = None
+        self.show_recording(img_no)
+
+    def on_tracks_loaded(self, df_all_tracks, tracks_ranges):
+        """
+        Stage 3 of loading: with the tracks available everything can be edited
+        """
+
+        self.df_all_tracks = df_all_tracks
+        self.tracks_ranges = tracks_ranges
+
+        # Restore the edits of a session that did not end normally, the selection parameters may have changed
+        if self.edit_journal.exists():
+            self.replay_edit_journal()
+            self.list_images = get_images(self, initial=True)
+            self.show_recording(self.img_no)
+
+        self.viewer_dialog.title(f'Recording Viewer - {self.user_specified_directory}')
+        self.set_dialog_buttons(tk.NORMAL)
+        self.loading_queue = None
+
+    def setup_exclude_button(self):
+        # Check the 'Exclude' status and set properties accordingly (the index is the recording name)
+        is_excluded = self.df_experiment.loc[self.image_name, 'Exclude']
         self.bn_exclude.config(text='Include' if is_excluded else 'Exclude')
         self.text_for_info4.set('Excluded' if is_excluded else '')
         self.lbl_info4.config(style="Red.Label" if is_excluded else "Black.Label")
@@ -396,8 +507,7 @@ class RecordingViewer:
 
             self.set_dialog_buttons(tk.DISABLED)
             self.heatmap_control_dialog = HeatMapDialog(self, self.on_heatmap_close_callback)
-            self.img_no -= 1
-            self.on_forward_backward('FORWARD')
+            self.show_recording(self.img_no)
 
     def on_select_squares(self):
         # If the select square dialog is not already active, then we need to run the select square dialog
@@ -542,112 +652,106 @@ class RecordingViewer:
             direction = 'START' if event.state & 0x0001 else 'BACKWARD'
         else:
             return
-        self.on_forward_backward(direction)
+        self.request_navigation(direction)
 
     def toggle_show_squares(self):
         self.show_squares = not self.show_squares
-        self.display_selected_squares()
+        self.request_redraw()
 
     def toggle_show_square_numbers(self):
         self.show_squares_numbers = not self.show_squares_numbers
         self.show_numbers = self.show_squares  # Set show_numbers based on show_squares
-        self.display_selected_squares()
+        self.request_redraw()
 
     def toggle_selected_squares(self):
         self.show_squares = not self.show_squares
-        self.display_selected_squares()
+        self.request_redraw()
 
     def on_toggle_valid_square(self):
+        # The squares are still loading
+        if self.df_all_squares is None:
+            return
         self.only_valid_tau = not self.only_valid_tau
         select_squares(self, only_valid_tau=self.only_valid_tau)
         self.display_selected_squares()
 
     def output_pictures_to_pdf(self):
+        """
+        Write the pictures of all recordings, with and without squares, to png files and one pdf.
+        The pictures are rendered off-screen in a process pool, on a background thread, so the viewer stays usable.
+        """
+
+        if self.df_all_squares is None:
+            return
+        if self.export_thread is not None and self.export_thread.is_alive():
+            messagebox.showinfo("Export in progress", "The pictures are still being exported")
+            return
+
         # Create the squares directory if it does not exist
         squares_dir = os.path.join(self.user_specified_directory, 'Output', 'Squares')
         os.makedirs(squares_dir, exist_ok=True)
-
-        # Cycle through all images
-        self.img_no = -1
-        for img_no in range(len(self.list_images)):
-            self.on_forward_backward('FORWARD')
-
-            image_name = self.list_images[self.img_no]['Left Image Name']
-            paint_logger.debug(f"Writing {image_name} to pdf file {os.path.join(squares_dir, image_name)}")
-
-            # Delete the squares and write the canvas with just the tracks
-            self.left_image_canvas.delete("all")
-            self.left_image_canvas.create_image(0, 0, anchor=NW, image=self.list_images[self.img_no]['Left Image'])
-            save_as_png(self.left_image_canvas, os.path.join(squares_dir, image_name))
-
-            # Add the squares and write the canvas complete with squares
-            self.select_squares_for_display()
-            self.display_selected_squares()
-            image_name = image_name + '-squares'
-            save_as_png(self.left_image_canvas, os.path.join(squares_dir, image_name))
-
-        # Find all the png files and sort them
-        png_files = []
-        files = os.listdir(squares_dir)
-        for file in files:
-            if file.endswith(".png"):
-                png_files.append(os.path.join(squares_dir, file))
-        png_files = sorted(png_files)
-
-        # Create Image objects of all png files
-        png_images = []
-        for png_file in png_files:
-            png_images.append(Image.open(png_file))
         pdf_path = os.path.join(squares_dir, 'images.pdf')
 
-        # Create a PDF with a first image and add all the other images to it
-        if platform.system() == "Darwin":
-            png_images[0].save(pdf_path, "PDF", resolution=200.0, save_all=True, append_images=png_images[1:])
-
-        # Go back to the image where we were
-        self.img_no -= 1
-        self.on_forward_backward('FORWARD')
+        # The squares of the recording on display may have edits that are not yet in All Squares
+        jobs = []
+        for record in self.list_images:
+            if record['Left Image Name'] == self.image_name:
+                df_squares = self.df_squares
+            else:
+                df_squares = get_recording_rows(self.df_all_squares, self.squares_ranges, record['Left Image Name'])
+            jobs.append(make_export_job(record, df_squares, self.nr_of_squares_in_row, squares_dir,
+                                        self.show_squares, self.show_squares_numbers, self.only_valid_tau))
+
+        self.export_result = {}
+
+        def run_export():
+            try:
+                self.export_result['Nr Exported'] = export_pictures(jobs, pdf_path)
+            except Exception as e:
+                self.export_result['Error'] = e
+
+        paint_logger.info(f"Exporting the pictures of {len(jobs)} recordings to {pdf_path}")
+        self.export_thread = threading.Thread(target=run_export, daemon=True)
+        self.export_thread.start()
+        self.viewer_dialog.after(500, self.check_export_finished)
+
+    def check_export_finished(self):
+        if self.export_thread.is_alive():
+            self.viewer_dialog.after(500, self.check_export_finished)
+            return
+        if 'Error' in self.export_result:
+            paint_logger.error(f"Exporting the pictures failed: {self.export_result['Error']}")
+            messagebox.showerror("Export failed", f"Exporting the pictures failed: {self.export_result['Error']}")
+        else:
+            paint_logger.info(f"Exported the pictures of {self.export_result['Nr Exported']} recordings")
+        self.export_thread = None
 
     def output_picture(self):
+        """
+        Write the pictures of the current recording, with and without squares, to png files and add all png files
+        in the squares directory to the pdf
+        """
+
+        if self.df_all_squares is None:
+            return
+
         # Create the squares directory if it does not exist
         squares_dir = os.path.join(self.user_specified_directory, 'Output', 'Squares')
         os.makedirs(squares_dir, exist_ok=True)
 
-        image_name = self.list_images[self.img_no]['Left Image Name']
-        paint_logger.debug(f"Writing {image_name} to pdf file {os.path.join(squares_dir, image_name)}")
-
-        # Delete the squares and write the canvas with just the tracks
-        self.left_image_canvas.delete("all")
-        self.left_image_canvas.create_image(0, 0, anchor=NW, image=self.list_images[self.img_no]['Left Image'])
-        save_as_png(self.left_image_canvas, os.path.join(squares_dir, image_name))
-
-        # Add the squares and write the canvas complete with squares
-        self.select_squares_for_display()
-        self.display_selected_squares()
-        image_name = image_name + '-squares'
-        save_as_png(self.left_image_canvas, os.path.join(squares_dir, image_name))
-
-        # Find all the png files and sort them
-        png_files = []
-        files = os.listdir(squares_dir)
-        for file in files:
-            if file.endswith(".png"):
-                png_files.append(os.path.join(squares_dir, file))
-        png_files = sorted(png_files)
-
-        # Create Image objects of all png files
-        png_images = []
-        for png_file in png_files:
-            png_images.append(Image.open(png_file))
-        pdf_path = os.path.join(squares_dir, 'images.pdf')
+        record = self.list_images[self.img_no]
+        image_name = record['Left Image Name']
+        paint_logger.debug("Writing %s to pdf file %s", image_name, os.path.join(squares_dir, image_name))
 
-        # Create a PDF with a first image and add all the other images to it
-        if platform.system() == "Darwin":
-            png_images[0].save(pdf_path, "PDF", resolution=200.0, save_all=True, append_images=png_images[1:])
+        picture, squares_picture = render_recording_picture(
+            record['Left Image Path'], self.df_squares, self.nr_of_squares_in_row, self.show_squares,
+            self.show_squares_numbers)
+        picture.save(os.path.join(squares_dir, image_name + '.png'), 'png')
+        squares_picture.save(os.path.join(squares_dir, image_name + '-squares.png'), 'png')
 
-        # Go back to the image where we were
-        self.img_no -= 1
-        self.on_forward_backward('FORWARD')
+        # Find all the png files, sort them and write them to the pdf
+        png_files = sorted(os.path.join(squares_dir, file) for file in os.listdir(squares_dir) if file.endswith(".png"))
+        write_pdf_from_pngs(png_files, os.path.join(squares_dir, 'images.pdf'))
 
     def on_escape(self):
 
@@ -662,7 +766,9 @@ class RecordingViewer:
     def callback_to_close_define_cells_dialog(self):
         # Now update All Squares
         if self.recording_changed:
-            self.df_all_squares.update(self.df_squares)
+            recording_name = self.update_squares_of_recording()
+            if recording_name is not None:
+                self.edit_journal.record_recording(self.df_experiment, self.df_squares, recording_name)
             self.save_on_exit = True
         self.define_cells_dialog = None
 
@@ -672,7 +778,7 @@ class RecordingViewer:
         It will empty the list of squares that are currently selected and update the display
         """
 
-        self.squares_in_rectangle = []
+        self.squares_in_rectangle = set()
         self.display_selected_squares()
 
     def callback_to_assign_squares_to_cell_id(self, cell_id):
@@ -684,11 +790,11 @@ class RecordingViewer:
         # Update 'Cell Id' for all squares in the rectangle
         self.df_squares.set_index('Square Nr', inplace=True, drop=False)
         if len(self.squares_in_rectangle) > 0:
-            self.df_squares.loc[self.squares_in_rectangle, 'Cell Id'] = int(cell_id)
+            self.df_squares.loc[sorted(self.squares_in_rectangle), 'Cell Id'] = int(cell_id)
 
         # Set the flag and clear the list
         self.recording_changed = True
-        self.squares_in_rectangle = []
+        self.squares_in_rectangle = set()
         self.display_selected_squares()
 
     def callback_to_reset_cell_definition(self):
@@ -706,8 +812,9 @@ class RecordingViewer:
         current_image = self.list_images[self.img_no]
 
         # Update the image display based on the current image number
-        self.left_image_canvas.create_image(0, 0, anchor=tk.NW, image=current_image['Left Image'])
-        self.right_image_canvas.create_image(0, 0, anchor=tk.NW, image=current_image['Right Image'])
+        self.left_image_canvas.create_image(0, 0, anchor=tk.NW, image=self.image_cache.left_image(current_image))
+        self.right_image_item = self.right_image_canvas.create_image(
+            0, 0, anchor=tk.NW, image=self.image_cache.right_image(current_image))
 
         # Update labels for image information
         self.lbl_image_bf_name.set(current_image['Right Image Name'])
@@ -726,7 +833,8 @@ class RecordingViewer:
         self.text_for_info3.set(info3)
 
         self.image_name = current_image['Left Image Name']
-        self.df_squares = self.df_all_squares[self.df_all_squares['Ext Recording Name'] == self.image_name]
+        if self.df_all_squares is not None:
+            self.df_squares = get_recording_rows(self.df_all_squares, self.squares_ranges, self.image_name)
 
     def on_exinclude(self):
         """
@@ -745,24 +853,35 @@ class RecordingViewer:
         self.lbl_info4.config(style="Red.Label" if is_excluded else "Black.Label")
         self.lbl_info4.configure(foreground='red' if is_excluded else 'black')
 
+        self.edit_journal.record_experiment(self.df_experiment, row_index)
         self.recording_changed = True  # ToDo
 
+    def has_unsaved_changes(self):
+        """
+        :return: True if there are journalled edits that are not saved yet, or edits of the recording on display that
+        are not even journalled yet
+        """
+
+        return self.recording_changed or self.save_on_exit or self.edit_journal.is_dirty()
+
     def on_exit_viewer(self):
-        if self.save_on_exit or self.recording_changed:  # You need to test both!
+        if self.has_unsaved_changes():
             status = self.save_changes_on_exit()
             if status is None:
                 return
             else:
+                self.image_cache.shutdown()
+                self.recalc_worker.shutdown()
                 root.quit()
         else:
+            self.image_cache.shutdown()
+            self.recalc_worker.shutdown()
             root.quit()
 
     def image_selected(self, _):
         image_name = self.cb_image_names.get()
         paint_logger.debug(image_name)
-        index = self.list_of_image_names.index(image_name)
-        self.img_no = index - 1
-        self.on_forward_backward('FORWARD')
+        self.show_recording(self.list_of_image_names.index(image_name))
 
     def update_select_squares(
             self,
@@ -826,6 +945,12 @@ class RecordingViewer:
                 image['Max Allowable Variability'] = max_allowable_variability
                 image['Neighbour Mode'] = neighbour_mode
                 image['Min Allowable R Squared'] = min_allowable_r_squared
+
+            self.edit_journal.record_all_recordings(self.df_experiment, {
+                'Min Required Density Ratio': min_required_density_ratio,
+                'Max Allowable Variability': max_allowable_variability,
+                'Min Allowable R Squared': min_allowable_r_squared,
+                'Neighbour Mode': neighbour_mode})
         elif setting_type == "Exit":
             self.select_square_dialog = None
         else:
@@ -838,19 +963,31 @@ class RecordingViewer:
         info3 = f"Min Required Density Ratio: {min_required_density_ratio:,} - Max Allowable Variability: {max_allowable_variability}"
         self.text_for_info3.set(info3)
 
-        recalc_recording_tau_and_density(self)
+        # The curve fit is done in the background, so moving a slider does not block the viewer
+        recalc_recording_tau_and_density(self, background=True)
 
     def select_squares_for_display(self):
         select_squares(self, only_valid_tau=self.only_valid_tau)  # The function is in the file 'Select_Squares.py'
 
+    def count_selected_squares(self, min_required_density_ratio, max_allowable_variability, min_track_duration,
+                               max_track_duration, min_allowable_r_squared, neighbour_mode):
+        """
+        Return the number of squares of the current recording that would be selected, the neighbour rules included.
+        Used by the SelectSquareDialog to show a live count while a slider is moved.
+        """
+
+        return count_selected_squares(
+            self, min_required_density_ratio, max_allowable_variability, min_track_duration, max_track_duration,
+            min_allowable_r_squared, neighbour_mode, only_valid_tau=self.only_valid_tau)
+
     def display_selected_squares(self):
         display_selected_squares(self)
 
     def square_assigned_to_cell(self, square_nr):
         if square_nr in self.squares_in_rectangle:
-            self.squares_in_rectangle.remove(square_nr)
+            self.squares_in_rectangle.discard(square_nr)
         else:
-            self.squares_in_rectangle.append(int(square_nr))
+            self.squares_in_rectangle.add(int(square_nr))
         self.display_selected_squares()
 
     def provide_information_on_square(self, event, label_nr, square_nr):
@@ -930,13 +1067,16 @@ class RecordingViewer:
         if self.define_cells_dialog is None:
             pass  # ToDo Maybe open the dialog here
 
-        for i in range(len(self.df_squares)):
-            square = self.df_squares.iloc[i]
-            if square['Selected']:
-                if test_if_square_is_in_rectangle(
-                        square['X0'], square['Y0'], square['X1'], square['Y1'], self.start_x, self.start_y,
-                        event.x, event.y):
-                    self.squares_in_rectangle.append(int(square['Square Nr']))
+        # The pixel bounds of the squares of a recording do not change, so they are computed only once
+        square_nrs, bounds = self.square_pixel_bounds.get(self.image_name, (None, None))
+        if square_nrs is None or len(square_nrs) != len(self.df_squares):
+            recording_size = calc_recording_size(*get_recording_calibration(self.df_experiment.loc[self.image_name]))
+            square_nrs, bounds = get_square_pixel_bounds(self.df_squares, recording_size)
+            self.square_pixel_bounds[self.image_name] = (square_nrs, bounds)
+
+        self.squares_in_rectangle |= find_squares_in_rectangle(
+            square_nrs, bounds, self.df_squares['Selected'].to_numpy(dtype=bool), self.start_x, self.start_y,
+            event.x, event.y)
         self.display_selected_squares()
 
     def mark_selected_squares(self):
@@ -951,23 +1091,115 @@ class RecordingViewer:
         The function is called when we switch image
         """
 
-        # ----------------------------------------------------------------------------
-        # Determine what the next image is, depending on the direction
-        # Be sure not move beyond the boundaries (could happen when the left and right keys are used)
-        # Disable the forward and backward buttons when the boundaries are reached
-        # ----------------------------------------------------------------------------
+        # Until the squares have been loaded in the background, only the first recording is shown
+        if self.df_all_squares is None:
+            return
+
+        self.show_recording(self.next_image_number(self.img_no, direction))
+
+    def show_recording(self, img_no):
+        """
+        Show recording img_no complete with its squares. Before the squares are loaded, the recording is only
+        remembered and on_squares_loaded shows it.
+        """
+
+        if self.df_all_squares is None:
+            self.requested_img_no = img_no
+            return
+
+        # A complete render supersedes any navigation that was still pending
+        self.cancel_pending_navigation()
+        self.switch_recording(img_no)
+        self.render_recording_detail()
+
+    def next_image_number(self, img_no, direction):
+        """
+        Determine what the next image is, depending on the direction
+        Be sure not move beyond the boundaries (could happen when the left and right keys are used)
+        """
 
-        # Determine the next image number
         if direction == 'START':
-            self.img_no = 0
+            img_no = 0
         elif direction == 'END':
-            self.img_no = len(self.list_images) - 1
+            img_no = len(self.list_images) - 1
         elif direction == 'FORWARD':
-            if self.img_no != len(self.list_images) - 1:
-                self.img_no += 1
+            if img_no != len(self.list_images) - 1:
+                img_no += 1
         elif direction == 'BACKWARD':
-            if self.img_no != 0:
-                self.img_no -= 1
+            if img_no != 0:
+                img_no -= 1
+        return img_no
+
+    # --------------------------------------------------------------------------------------
+    # Coalesced navigation: key repeats are collapsed into one switch per idle moment and the
+    # squares or heatmap are only rendered for the recording the user stops on
+    # --------------------------------------------------------------------------------------
+
+    def request_navigation(self, direction):
+        if self.df_all_squares is None:
+            return
+        base_img_no = self.img_no if self.pending_img_no is None else self.pending_img_no
+        self.pending_img_no = self.next_image_number(base_img_no, direction)
+        if self.navigation_idle_id is None:
+            self.navigation_idle_id = self.viewer_dialog.after_idle(self.flush_navigation)
+
+    def flush_navigation(self):
+        self.navigation_idle_id = None
+        img_no, self.pending_img_no = self.pending_img_no, None
+        if img_no is not None and img_no != self.img_no:
+            self.switch_recording(img_no)
+            self.show_recording_preview()
+
+        # The full render waits until the navigation has come to rest
+        if self.detail_render_id is not None:
+            self.viewer_dialog.after_cancel(self.detail_render_id)
+        self.detail_render_id = self.viewer_dialog.after(DEBOUNCE_DELAY, self.render_pending_detail)
+
+    def render_pending_detail(self):
+        self.detail_render_id = None
+        self.render_recording_detail()
+
+    def cancel_pending_navigation(self):
+        if self.navigation_idle_id is not None:
+            self.viewer_dialog.after_cancel(self.navigation_idle_id)
+            self.navigation_idle_id = None
+        if self.detail_render_id is not None:
+            self.viewer_dialog.after_cancel(self.detail_render_id)
+            self.detail_render_id = None
+        self.pending_img_no = None
+
+    def request_redraw(self):
+        """
+        Redraw the squares once the event queue is empty, repeated requests are collapsed into one
+        """
+
+        # The squares are still loading, on_squares_loaded draws them with the current settings
+        if self.df_all_squares is None:
+            return
+        if self.redraw_idle_id is None:
+            self.redraw_idle_id = self.viewer_dialog.after_idle(self.flush_redraw)
+
+    def flush_redraw(self):
+        self.redraw_idle_id = None
+        self.display_selected_squares()
+
+    def show_recording_preview(self):
+        """
+        While navigating quickly, only the recording image is shown on the left, without squares
+        """
+
+        if self.heatmap_control_dialog is None and self.squares_layer is not None:
+            self.squares_layer.render(
+                self.image_cache.left_image(self.list_images[self.img_no]), self.df_squares,
+                self.nr_of_squares_in_row, False, self.show_squares_numbers, [])
+
+    def switch_recording(self, img_no):
+        """
+        Make img_no the current recording: save the edits of the previous one and update the Brightfield image,
+        the navigation buttons and the information labels
+        """
+
+        self.img_no = img_no
 
         # Set the name of the new image
         self.image_name = self.list_images[self.img_no]['Left Image Name']
@@ -977,7 +1209,7 @@ class RecordingViewer:
             self.save_changes_on_recording_change(self)
             self.save_on_exit = True
             self.recording_changed = False
-        self.df_squares = self.df_all_squares[self.df_all_squares['Ext Recording Name'] == self.image_name]
+        self.df_squares = get_recording_rows(self.df_all_squares, self.squares_ranges, self.image_name)
 
         # Set the correct state of Forward and back buttons
         if self.img_no == len(self.list_images) - 1:
@@ -990,13 +1222,20 @@ class RecordingViewer:
         # image_name = self.list_images[self.img_no]['Left Image Name']
         self.cb_image_names.set(self.image_name)
 
+        # Have the images of the neighbouring recordings decoded in the background
+        prefetch_neighbouring_images(self)
+
         # ----------------------------------------------------------------------------
         # Irrespective up heatmap or normal image update the BF image, the bright field
         # and the labels can be updated
         # ----------------------------------------------------------------------------
 
-        # Place new image_bf
-        self.right_image_canvas.create_image(0, 0, anchor=NW, image=self.list_images[self.img_no]['Right Image'])
+        # Place new image_bf, reusing the image item on the canvas
+        image_bf = self.image_cache.right_image(self.list_images[self.img_no])
+        if self.right_image_item is None or self.right_image_canvas.type(self.right_image_item) != 'image':
+            self.right_image_item = self.right_image_canvas.create_image(0, 0, anchor=NW, image=image_bf)
+        else:
+            self.right_image_canvas.itemconfigure(self.right_image_item, image=image_bf)
         self.lbl_image_bf_name.set(str(self.img_no + 1) + ":  " + self.list_images[self.img_no]['Right Image Name'])
 
         # The information labels are updated
@@ -1017,76 +1256,125 @@ class RecordingViewer:
 
         # Set the correct label for Exclude/Include button
         if self.heatmap_control_dialog is None:
-            row_index = self.df_experiment.index[self.df_experiment['Ext Recording Name'] == self.image_name].tolist()[
-                0]
-            if self.df_experiment.loc[row_index, 'Exclude']:
+            if self.df_experiment.loc[self.image_name, 'Exclude']:
                 self.bn_exclude.config(text='Include')
                 self.text_for_info4.set("Excluded")
             else:
                 self.bn_exclude.config(text='Exclude')
                 self.text_for_info4.set("")
 
+    def render_recording_detail(self):
+        """
+        Select and draw the squares, or the heatmap, of the current recording
+        """
+
         # If the heatmap control dialog is up display the heatmap
         if self.heatmap_control_dialog:
-            self.display_heatmap()
-            # And Send the heatmap control dialog a sign that min max values have changed
+            # Send the heatmap control dialog a sign that min max values have changed, it redraws the heatmap
             self.heatmap_control_dialog.on_heatmap_global_local_change()
             return
 
-        else:  # update the regular image
-
-            self.left_image_canvas.create_image(0, 0, anchor=NW, image=self.list_images[self.img_no]['Left Image'])
+        # Update the regular image, the recording image itself is placed by display_selected_squares
+        # Set the filter parameters with values retrieved from the experiment file
+        self.min_track_duration = 0  # self.df_experiment.loc[self.image_name]['Min Duration']   # ToDo this does not look ok
+        self.max_track_duration = 200  # self.df_experiment.loc[self.image_name]['Max Duration']
 
-            # Set the filter parameters with values retrieved from the experiment file
-            self.min_track_duration = 0  # self.df_experiment.loc[self.image_name]['Min Duration']   # ToDo this does not look ok
-            self.max_track_duration = 200  # self.df_experiment.loc[self.image_name]['Max Duration']
-
-            self.min_required_density_ratio = self.list_images[self.img_no]['Min Required Density Ratio']
-            self.max_allowable_variability = self.list_images[self.img_no]['Max Allowable Variability']
-            self.min_allowable_r_squared = self.list_images[self.img_no]['Min Allowable R Squared']
-            self.neighbour_mode = self.list_images[self.img_no]['Neighbour Mode']
+        self.min_required_density_ratio = self.list_images[self.img_no]['Min Required Density Ratio']
+        self.max_allowable_variability = self.list_images[self.img_no]['Max Allowable Variability']
+        self.min_allowable_r_squared = self.list_images[self.img_no]['Min Allowable R Squared']
+        self.neighbour_mode = self.list_images[self.img_no]['Neighbour Mode']
 
-            if self.select_square_dialog:
-                self.select_square_dialog.initialise_controls(
-                    self.min_required_density_ratio,
-                    self.max_allowable_variability,
-                    self.min_track_duration,
-                    self.max_track_duration,
-                    self.min_allowable_r_squared,
-                    self.neighbour_mode)
+        if self.select_square_dialog:
+            self.select_square_dialog.initialise_controls(
+                self.min_required_density_ratio,
+                self.max_allowable_variability,
+                self.min_track_duration,
+                self.max_track_duration,
+                self.min_allowable_r_squared,
+                self.neighbour_mode)
 
-        # Then display
+        # Make sure that there is no user square selection left, then display
+        self.squares_in_rectangle = set()
         self.select_squares_for_display()
-        if self.heatmap_control_dialog:
-            self.display_heatmap()
-        else:
-            self.display_selected_squares()
+        self.display_selected_squares()
+
+    def update_squares_of_recording(self):
+        """
+        Write the squares of the current recording back into All Squares, using the recording's row range
+        """
 
-        # Make sure that there is no user square selection left
-        self.squares_in_rectangle = []
-        self.mark_selected_squares()
+        if self.df_squares is None or len(self.df_squares) == 0:
+            return None
+        recording_name = self.df_squares['Ext Recording Name'].iloc[0]
+        self.df_squares.set_index('Unique Key', inplace=True, drop=False)
+        update_recording_rows(self.df_all_squares, self.squares_ranges, recording_name, self.df_squares)
+        self.heatmap_column_stats = None
+        return recording_name
 
     def save_changes_on_recording_change(self, save_experiment=True, save_squares=True):
 
-        # Save the changes in All Squares
-        self.df_squares.set_index('Unique Key', inplace=True, drop=False)
-        self.df_all_squares.update(self.df_squares)
+        # Save the changes in All Squares. Note that self.image_name may already point to the next recording,
+        # so the recording name is taken from the squares themselves
+        recording_name = self.update_squares_of_recording()
+        if recording_name is None:
+            return
+        if self.df_all_tracks is None:  # Still loading, the track labels can not have changed yet
+            self.edit_journal.record_recording(self.df_experiment, self.df_squares, recording_name)
+            return
 
-        # Update the labels in All Tracks
+        # Update the labels in All Tracks, All Tracks only becomes dirty when a label actually changed
         df_recording_squares = self.df_squares
-        df_recording_tracks = self.df_all_tracks[self.df_all_tracks['Ext Recording Name'] == self.image_name]
+        df_recording_tracks = get_recording_rows(self.df_all_tracks, self.tracks_ranges, recording_name)
         dfs, dft = relabel_tracks(df_recording_squares, df_recording_tracks)
-        self.df_all_tracks.update(dft)
+        tracks_changed = labels_changed(df_recording_tracks['Label Nr'], dft['Label Nr'])
+        if tracks_changed:
+            update_recording_rows(self.df_all_tracks, self.tracks_ranges, recording_name, dft)
+
+        self.edit_journal.record_recording(self.df_experiment, self.df_squares, recording_name, tracks_changed)
+
+    def replay_edit_journal(self):
+        """
+        Offer to restore the edits journalled by a previous session that was not closed normally
+        """
+
+        restore = messagebox.askyesno(
+            "Restore Changes",
+            "Changes from a previous session that did not end normally were found. Do you want to restore them?")
+        if not restore:
+            self.edit_journal.clear()
+            return
+
+        records = self.edit_journal.read()
+        replayed = replay_journal(records, self.df_experiment, self.df_all_squares, self.squares_ranges)
+        self.heatmap_column_stats = None
+
+        # The track labels follow from the restored square labels
+        for recording_name in replayed:
+            df_recording_squares = get_recording_rows(self.df_all_squares, self.squares_ranges, recording_name)
+            df_recording_tracks = get_recording_rows(self.df_all_tracks, self.tracks_ranges, recording_name)
+            dfs, dft = relabel_tracks(df_recording_squares.copy(), df_recording_tracks)
+            update_recording_rows(self.df_all_tracks, self.tracks_ranges, recording_name, dft)
+            self.edit_journal.mark_dirty(recording_name, SQUARES, TRACKS)
+
+        self.edit_journal.mark_dirty(None, RECORDINGS)
+        self.save_on_exit = True
+        paint_logger.info(f"Restored {len(records)} journalled changes, affecting {len(replayed)} recordings")
 
     def save_changes_on_exit(self, save_experiment=True, save_squares=True):
 
         # See if there is anything to save
-        if not self.save_on_exit and not self.recording_changed:
+        if not self.has_unsaved_changes():
             return False
 
         # There is something to save, but the Never option is selected
+        # Fold in the edits of the recording currently on display
+        if self.recording_changed:
+            self.save_changes_on_recording_change()
+            self.recording_changed = False
+
         if self.save_state_var.get() == 'Never':
             paint_logger.debug("Changes were not saved, because the 'Never' option was selected.")
+            self.edit_journal.clear()
             return False
 
         if self.save_state_var.get() == 'Ask':
@@ -1094,10 +1382,11 @@ class RecordingViewer:
         else:  # Then must be 'Always'
             save = True
         if save:
-            # Save the Squares  data
-            self.df_all_squares.to_csv(os.path.join(self.user_specified_directory, 'All Squares.csv'), index=False)
-            self.df_all_tracks.to_csv(os.path.join(self.user_specified_directory, 'All Tracks.csv'), index=False)
-            self.df_experiment.to_csv(os.path.join(self.user_specified_directory, 'All Recordings.csv'), index=False)
+            # Only the files that contain changed data are rewritten
+            self.edit_journal.save(self.user_specified_directory, self.df_all_squares, self.df_all_tracks,
+                                   self.df_experiment)
+        elif save is not None:
+            self.edit_journal.clear()
 
         return save
 
@@ -1115,8 +1404,16 @@ class RecordingViewer:
 
     def heatmap_type_selection_changed(self, *args):
 
-        self.img_no -= 1
-        self.on_forward_backward('FORWARD')
+        self.show_recording(self.img_no)
+
+    def get_heatmap_column_stats(self):
+        """
+        The min and max of the heatmap columns of All Squares, computed when first needed after the squares changed
+        """
+
+        if self.heatmap_column_stats is None and self.df_all_squares is not None:
+            self.heatmap_column_stats = get_column_stats(self.df_all_squares)
+        return self.heatmap_column_stats
 
     def display_heatmap(self):
 
@@ -1125,19 +1422,19 @@ class RecordingViewer:
 
         self.df_squares.set_index('Square Nr', inplace=True, drop=False)
 
-        colors = get_colormap_colors('Blues', 20)
         heatmap_mode = self.heatmap_option.get()
         heatmap_global_min_max = self.heatmap_global_min_max.get()
 
-        df_heatmap_data, min_val, max_val = get_heatmap_data(self.df_squares, self.df_all_squares, heatmap_mode,
-                                                             heatmap_global_min_max)
+        df_heatmap_data, min_val, max_val = get_heatmap_data(self.df_squares, self.get_heatmap_column_stats(),
+                                                             heatmap_mode, heatmap_global_min_max)
         if df_heatmap_data is None:
             messagebox.showwarning("No data for heatmap", "There is no data for the heatmap")
             return
 
-        for index, row in df_heatmap_data.iterrows():
-            draw_heatmap_square(self.left_image_canvas, index, self.nr_of_squares_in_row, row['Value'],
-                                min_val, max_val, colors)
+        # The heatmap is drawn as one image, keep a reference to prevent it from being garbage collected
+        self.heatmap_image = ImageTk.PhotoImage(
+            get_heatmap_image(df_heatmap_data, self.nr_of_squares_in_row, min_val, max_val))
+        self.left_image_canvas.create_image(0, 0, anchor=NW, image=self.heatmap_image)
 
     def on_heatmap_close_callback(self):
 
@@ -1212,80 +1509,90 @@ class RecordingViewer:
         sys.exit()
 
 
-def draw_heatmap_square(
-        canvas_to_draw_on,
-        square_nr,
-        nr_of_squares_in_row,
-        value,
-        min_value,
-        max_value,
-        colors):
-    # Calculate column, row, and square dimensions
-    col_nr = square_nr % nr_of_squares_in_row
-    row_nr = square_nr // nr_of_squares_in_row
-    square_size = 512 / nr_of_squares_in_row
-
-    # Determine the color index based on the value
-    color_index = get_color_index(value, max_value, min_value, 20)
-    color = colors[color_index]
-
-    # Define coordinates for the rectangle
-    x1 = col_nr * square_size
-    y1 = row_nr * square_size
-    x2 = x1 + square_size
-    y2 = y1 + square_size
-
-    # Draw the square with the selected color
-    canvas_to_draw_on.create_rectangle(x1, y1, x2, y2, fill=color, outline=color)
-
-
-def recalc_recording_tau_and_density(self):
+def calculate_recording_tau_and_density(df_tracks_for_recording, selected_square_nrs, min_allowable_r_squared,
+                                        nr_of_squares_in_row, recording_data):
     """
-    Recalculate the Tau and Density values for the current recording
+    Calculate the Tau, R Squared and Density of a recording from the tracks in its selected squares.
+    The density uses the acquisition parameters and concentration of the recording, as Generate Squares does.
+    The function does not touch the viewer, so it can run on a background thread.
+    :return: A tuple (tau, r_squared, density)
     """
 
-    df_squares_for_single_tau = self.df_squares[self.df_squares['Selected']]
-    df_tracks_for_reecording = self.df_all_tracks[self.df_all_tracks['Ext Recording Name'] == self.image_name]
-
-    df_tracks_for_tau = df_tracks_for_reecording[
-        df_tracks_for_reecording['Square Nr'].isin(df_squares_for_single_tau['Square Nr'])]
+    df_tracks_for_tau = df_tracks_for_recording[df_tracks_for_recording['Square Nr'].isin(selected_square_nrs)]
     df_tracks_for_tau = extra_constraints_on_tracks_for_tau_calculation(df_tracks_for_tau)
 
     tau, r_squared = calculate_tau(
         df_tracks_for_tau,
         # self.min_tracks_for_tau,
         10,
-        self.min_allowable_r_squared)
+        min_allowable_r_squared)
 
     # Calculate the Density values
-    area = calc_area_of_square(self.nr_of_squares_in_row)
+    area = calc_area_of_square(nr_of_squares_in_row, *get_recording_calibration(recording_data))
     density = calculate_density(
         nr_tracks=len(df_tracks_for_tau),
         area=area,
-        time=100,
-        # concentration=self.concentration,   # ToDO
-        concentration=10,
+        time=get_recording_duration(recording_data),
+        concentration=float(recording_data['Concentration']),
         magnification=1000)
 
+    return tau, r_squared, density
+
+
+def apply_recording_tau_and_density(self, img_no, image_name, result):
+    """
+    Store the Tau and Density of a recording in the viewer and show them if the recording is still on display
+    """
+
+    tau, r_squared, density = result
+
     # Update the Tau and Density values in the Viewer
-    self.list_images[self.img_no]['Tau'] = tau
-    self.list_images[self.img_no]['Density'] = density
+    self.list_images[img_no]['Tau'] = tau
+    self.list_images[img_no]['Density'] = density
+
+    self.df_experiment.loc[image_name, 'Tau'] = tau
+    self.df_experiment.loc[image_name, 'Density'] = density
+    self.df_experiment.loc[image_name, 'R Squared'] = r_squared
 
-    self.df_experiment.loc[self.image_name, 'Tau'] = tau
-    self.df_experiment.loc[self.image_name, 'Density'] = density
-    self.df_experiment.loc[self.image_name, 'R Squared'] = r_squared
+    if image_name != self.image_name:
+        # The user moved on before the calculation finished, the recording was journalled without these values
+        self.edit_journal.record_experiment(self.df_experiment, image_name)
+        return
 
     # Update the Tau information in the Viewer
-    info2 = f"Spots: {self.list_images[self.img_no]['Nr Spots']:,} - Threshold: {self.list_images[self.img_no]['Threshold']} - Tau: {int(tau)}"
+    info2 = f"Spots: {self.list_images[img_no]['Nr Spots']:,} - Threshold: {self.list_images[img_no]['Threshold']} - Tau: {int(tau)}"
     self.text_for_info2.set(info2)
 
 
+def recalc_recording_tau_and_density(self, background=False):
+    """
+    Recalculate the Tau and Density values for the current recording.
+    In the background, only the most recent request is completed and the result is applied on the Tk thread.
+    """
+
+    selected_square_nrs = self.df_squares.loc[self.df_squares['Selected'], 'Square Nr'].to_numpy()
+    df_tracks_for_recording = get_recording_rows(self.df_all_tracks, self.tracks_ranges, self.image_name)
+    recording_data = self.df_experiment.loc[self.image_name].copy()
+    args = (df_tracks_for_recording, selected_square_nrs, self.min_allowable_r_squared, self.nr_of_squares_in_row,
+            recording_data)
+
+    img_no, image_name = self.img_no, self.image_name
+    if background:
+        self.recalc_worker.submit(
+            calculate_recording_tau_and_density, args,
+            lambda result: apply_recording_tau_and_density(self, img_no, image_name, result),
+            key=image_name)
+    else:
+        apply_recording_tau_and_density(self, img_no, image_name, calculate_recording_tau_and_density(*args))
+
+
 # ---------------------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------------------
 
 
 if __name__ == '__main__':
+    set_pandas_options()
     root = tk.Tk()
     root.geometry("1x1")  # Ensure root is visible
 
@@ -1297,7 +1604,7 @@ if __name__ == '__main__':
     if proceed:
         # Initialize RecordingViewer without withdrawing `root`
         root.deiconify()  # Show the root window for RecordingViewer
-        paint_logger.debug(f'Mode: {mode}')
+        paint_logger.debug('Mode: %s', mode)
         paint_logger.info(f'Mode is: {mode} - Directory: {directory}')
 
         # Initialize RecordingViewer, ensuring it does not create a new Tk instance
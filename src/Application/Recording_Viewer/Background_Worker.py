@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from src.Fiji.LoggerConfig import paint_logger
+
+# The time (in milliseconds) a slider drag or keyboard navigation has to rest before the viewer does the expensive
+# update, shared by the Recording Viewer and the Select Squares dialog
+DEBOUNCE_DELAY = 150
+
+
+class LatestRequestWorker:
+    """
+    Runs calculations on a background thread where only the most recent request per key (e.g. per recording) matters.
+    A new request cancels the previous one with the same key if it has not started yet, and the result of a request
+    that has been superseded is discarded. Requests with different keys do not affect each other, so the result for
+    a recording the user has moved away from is still delivered. Completion is detected by polling with Tk's after,
+    so the result callbacks always run on the Tk thread.
+    """
+
+    def __init__(self, widget, poll_interval=50):
+        self.widget = widget
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='viewer-recalc')
+        self._requests = {}  # Key -> (future, on_result) of the most recent request
+        self._polling = False
+
+    def submit(self, function, args, on_result, key=None):
+        """
+        Run function(*args) in the background and call on_result with its return value, unless the request has been
+        superseded by a newer one with the same key by then
+        """
+
+        previous = self._requests.get(key)
+        if previous is not None:
+            previous[0].cancel()
+        self._requests[key] = (self._executor.submit(function, *args), on_result)
+        if not self._polling:
+            self._polling = True
+            self.widget.after(self.poll_interval, self._poll)
+
+    def cancel(self):
+        """
+        Forget the outstanding requests, their results will not be delivered
+        """
+
+        for future, _ in self._requests.values():
+            future.cancel()
+        self._requests = {}
+
+    def _poll(self):
+        done = [(key, future, on_result) for key, (future, on_result) in self._requests.items() if future.done()]
+        for key, _, _ in done:
+            del self._requests[key]
+
+        for key, future, on_result in done:
+            if future.cancelled():
+                continue
+            try:
+                result = future.result()
+            except Exception as e:
+                paint_logger.error(f"Background calculation failed: {e}")
+                continue
+            on_result(result)
+
+        if self._requests:
+            self.widget.after(self.poll_interval, self._poll)
+        else:
+            self._polling = False
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
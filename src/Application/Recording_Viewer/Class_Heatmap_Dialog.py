@@ -175,7 +175,7 @@ class HeatMapDialog:
 
         var = self.image_viewer.heatmap_option.get()
         _, min_val, max_val = get_heatmap_data(
-            self.image_viewer.df_squares, self.image_viewer.df_all_squares,
+            self.image_viewer.df_squares, self.image_viewer.get_heatmap_column_stats(),
             self.image_viewer.heatmap_option.get(), self.image_viewer.heatmap_global_min_max.get())
 
         self.lbl_min.config(text=str(min_val))
@@ -188,7 +188,7 @@ class HeatMapDialog:
 
         var = self.image_viewer.heatmap_option.get()
         _, min_val, max_val = get_heatmap_data(
-            self.image_viewer.df_squares, self.image_viewer.df_all_squares, var,
+            self.image_viewer.df_squares, self.image_viewer.get_heatmap_column_stats(), var,
             self.image_viewer.heatmap_global_min_max.get())
 
         self.lbl_min.config(text=str(min_val))
@@ -1,6 +1,8 @@
 import tkinter as tk
 from tkinter import ttk
 
+from src.Application.Recording_Viewer.Background_Worker import DEBOUNCE_DELAY
+
 
 class SelectSquareDialog:
 
@@ -26,6 +28,10 @@ class SelectSquareDialog:
         self.min_allowable_r_squared = None
         self.neighbour_mode = None
 
+        # The pending (debounced) slider notification and the values that were last sent to the viewer
+        self.pending_filter_change = None
+        self.last_filter_values = None
+
         # Set window properties
         self.select_square_dialog = tk.Toplevel(self.image_viewer.viewer_dialog)
         self.select_square_dialog.title("Select Squares")
@@ -109,6 +115,7 @@ class SelectSquareDialog:
         # Create buttons
         bn_set_neighbours_all = tk.Button(self.frame_buttons, text="Set for All", command=self.on_set_for_all, width=12)
         bn_ok = tk.Button(self.frame_buttons, text="OK", command=self.on_close, width=12)
+        self.lbl_selected_count = ttk.Label(self.frame_buttons, text="")
 
         # Frame layout for buttons
         button_frame = ttk.Frame(self.frame_buttons)
@@ -117,6 +124,7 @@ class SelectSquareDialog:
         # Place buttons side by side with minimal spacing
         bn_set_neighbours_all.grid(column=0, row=0, padx=(0, 5), pady=5)  # Right padding only
         bn_ok.grid(column=1, row=0, padx=(5, 0), pady=5)  # Left padding only
+        self.lbl_selected_count.grid(column=0, row=1, columnspan=2, padx=5, pady=(0, 5))
 
         # Configure button frame to center its contents tightly
         button_frame.columnconfigure(0, weight=0)  # No expansion for button 1
@@ -137,7 +145,9 @@ class SelectSquareDialog:
                                                             text='Max Allowable\nVariability')
         self.sc_max_allowable_variability = tk.Scale(self.frame_max_allowable_variability, from_=1.5, to=10,
                                                      variable=self.max_allowable_variability,
-                                                     orient='vertical', resolution=0.5)
+                                                     orient='vertical', resolution=0.5,
+                                                     command=lambda value: self.schedule_filter_changed(
+                                                         'Max Allowable Variability'))
         self.sc_max_allowable_variability.bind("<ButtonRelease-1>",
                                                lambda event: self.on_filter_changed('Max Allowable Variability'))
         self.lbl_max_allowable_variability_text.grid(column=0, row=0, padx=5, pady=5)
@@ -155,7 +165,8 @@ class SelectSquareDialog:
             self.frame_min_required_density_ratio, text='Min Required\nDensity Ratio', width=10)
         self.sc_min_required_density_ratio = tk.Scale(
             self.frame_min_required_density_ratio, from_=1, to=200, variable=self.min_required_density_ratio,
-            orient='vertical', resolution=1)
+            orient='vertical', resolution=1,
+            command=lambda value: self.schedule_filter_changed('Min Required Density Ratio'))
         self.sc_min_required_density_ratio.bind("<ButtonRelease-1>",
                                                 lambda event: self.on_filter_changed('Min Required Density Ratio'))
         self.lbl_min_required_density_ratio_text.grid(column=0, row=0, padx=5, pady=5)
@@ -173,7 +184,7 @@ class SelectSquareDialog:
                                                      width=10)
         self.sc_min_track_duration = tk.Scale(
             self.frame_min_duration, from_=0, to=200, variable=self.min_track_duration, orient='vertical',
-            resolution=0.1)
+            resolution=0.1, command=lambda value: self.schedule_filter_changed('Min Track Duration'))
         self.sc_min_track_duration.bind("<ButtonRelease-1>", lambda event: self.on_filter_changed('Min Track Duration'))
         self.lbl_min_track_duration_text.grid(row=0, column=0, padx=5, pady=5, sticky=tk.W + tk.E)
         self.sc_min_track_duration.grid(row=1, column=0, padx=5, pady=5, sticky=tk.W + tk.E)
@@ -190,7 +201,7 @@ class SelectSquareDialog:
                                                      width=10)
         self.sc_max_track_duration = tk.Scale(
             self.frame_max_duration, from_=0, to=200, variable=self.max_track_duration, orient='vertical',
-            resolution=0.1)
+            resolution=0.1, command=lambda value: self.schedule_filter_changed('Max Track Duration'))
         self.sc_max_track_duration.bind("<ButtonRelease-1>", lambda event: self.on_filter_changed('Max Track Duration'))
 
         self.lbl_max_track_duration_text.grid(row=0, column=0, padx=5, pady=5, sticky=tk.W + tk.E)
@@ -206,7 +217,8 @@ class SelectSquareDialog:
                                                           width=10)
         self.sc_min_allowable_r_squared = tk.Scale(
             self.frame_min_allowable_r_squared, from_=0, to=1.0, variable=self.min_allowable_r_squared,
-            orient='vertical', resolution=0.01)
+            orient='vertical', resolution=0.01,
+            command=lambda value: self.schedule_filter_changed('Min Allowable R Squared'))
         self.sc_min_allowable_r_squared.bind("<ButtonRelease-1>",
                                              lambda event: self.on_filter_changed('Min Allowable R Squared'))
 
@@ -239,14 +251,8 @@ class SelectSquareDialog:
     # Event Handlers
     # --------------------------------------------------------------------------------------------------------
 
-    def on_filter_changed(self, changed_slider):
-        """
-        Notify the main window about the track duration change, using the callback function provided by the
-        Image Viewer (update_select_squares)
-        """
-
-        self.callback(
-            changed_slider,
+    def get_filter_values(self):
+        return (
             self.sc_min_required_density_ratio.get(),
             self.sc_max_allowable_variability.get(),
             self.sc_min_track_duration.get(),
@@ -254,6 +260,39 @@ class SelectSquareDialog:
             self.sc_min_allowable_r_squared.get(),
             self.neighbour_mode.get())
 
+    def schedule_filter_changed(self, changed_slider):
+        """
+        Called for every intermediate value while a slider is dragged. The notification is postponed until the
+        slider rests, a newer value replaces a pending one.
+        The count is live in Free mode. The Strict and Relaxed neighbour rules take too long to apply on every tick,
+        so the count then follows when the slider rests (in on_filter_changed).
+        """
+
+        if self.neighbour_mode.get() == 'Free':
+            self.update_selected_count()
+        if self.pending_filter_change is not None:
+            self.select_square_dialog.after_cancel(self.pending_filter_change)
+        self.pending_filter_change = self.select_square_dialog.after(
+            DEBOUNCE_DELAY, lambda: self.on_filter_changed(changed_slider))
+
+    def on_filter_changed(self, changed_slider):
+        """
+        Notify the main window about the track duration change, using the callback function provided by the
+        Image Viewer (update_select_squares). Nothing is sent if the values did not change since the last time.
+        """
+
+        if self.pending_filter_change is not None:
+            self.select_square_dialog.after_cancel(self.pending_filter_change)
+            self.pending_filter_change = None
+
+        filter_values = self.get_filter_values()
+        if filter_values == self.last_filter_values:
+            return
+        self.last_filter_values = filter_values
+        self.update_selected_count()  # The neighbour mode buttons come here directly
+
+        self.callback(changed_slider, *filter_values)
+
     def on_set_for_all(self):
         self.callback("Set for All",
                       self.sc_min_required_density_ratio.get(),
@@ -270,6 +309,10 @@ class SelectSquareDialog:
         The callback function (update_select_squares) is called in the ImageViewer dialog
         """
 
+        if self.pending_filter_change is not None:
+            self.select_square_dialog.after_cancel(self.pending_filter_change)
+            self.pending_filter_change = None
+
         self.image_viewer.update_select_squares(
             "Exit",
             self.sc_min_required_density_ratio.get(),
@@ -300,3 +343,19 @@ class SelectSquareDialog:
         self.max_track_duration.set(max_track_duration)
         self.min_allowable_r_squared.set(min_allowable_r_squared)
         self.neighbour_mode.set(neighbour_mode)
+
+        # These values came from the viewer, so they do not have to be sent back
+        if self.pending_filter_change is not None:
+            self.select_square_dialog.after_cancel(self.pending_filter_change)
+            self.pending_filter_change = None
+        self.last_filter_values = self.get_filter_values()
+        self.update_selected_count()
+
+    def update_selected_count(self):
+        """
+        Show how many squares the current slider values and neighbour mode select, this is cheap enough to do for
+        every slider movement
+        """
+
+        count = self.image_viewer.count_selected_squares(*self.get_filter_values())
+        self.lbl_selected_count.config(text=f"{count} squares selected")
@@ -6,6 +6,7 @@ from tkinter import ttk
 from src.Application.Recording_Viewer.Recording_Viewer_Support_Functions import (
     only_one_nr_of_squares_in_row,
     nr_recordings)
+from src.Application.Utilities.Directory_Index import get_out_of_date_experiments
 from src.Application.Utilities.General_Support_Functions import (
     classify_directory,
 )
@@ -135,17 +136,7 @@ class SelectViewerDataDialog:
         return self.proceed, getattr(self, 'directory', None), getattr(self, 'mode', None)
 
     def test_project_up_to_date(self, project_directory):
-        out_of_date = []
-        time_stamp_project = os.path.getmtime(os.path.join(project_directory, 'All Recordings.csv'))
-
-        experiments = os.listdir(project_directory)
-        for experiment in experiments:
-            if not os.path.isdir(os.path.join(project_directory, experiment)):
-                continue
-            experiment_directory = os.path.join(project_directory, experiment)
-            time_stamp_experiment = os.path.getmtime(os.path.join(experiment_directory, 'All Recordings.csv'))
-            if time_stamp_project < time_stamp_experiment:
-                out_of_date.append(experiment)
+        out_of_date = get_out_of_date_experiments(project_directory)
         if out_of_date and len(out_of_date) > 0:
             response = messagebox.askyesnocancel(
                 title='Warning',
@@ -2,6 +2,16 @@ from tkinter import *
 
 import pandas as pd
 
+COLOUR_TABLE = {1: ('red', 'white'),
+                2: ('yellow', 'black'),
+                3: ('green', 'white'),
+                4: ('magenta', 'white'),
+                5: ('cyan', 'black'),
+                6: ('black', 'white')}
+
+NO_TAU_COLOUR = '#4566A5'  # https://www.webfx.com/web-design/color-picker/4566a5
+POOL_TAG = 'squares-pool'
+
 
 def display_selected_squares(self):
     """
@@ -9,165 +19,171 @@ def display_selected_squares(self):
     :return:
     """
 
-    nr_of_squares_in_row = self.nr_of_squares_in_row
-
-    # Clear the screen and reshow the picture
-    self.left_image_canvas.delete("all")
-    self.left_image_canvas.create_image(0, 0, anchor=NW, image=self.list_images[self.img_no]['Left Image'])
-
-    # Bind left buttons for canvas
-    self.left_image_canvas.bind('<Button-1>', lambda e: self.start_rectangle(e))
-    self.left_image_canvas.bind('<ButtonRelease-1>', lambda e: self.close_rectangle(e))
-    self.left_image_canvas.bind('<B1-Motion>', lambda e: self.expand_rectangle_size(e))
-
-    if not self.show_squares or len(self.df_squares) == 0:
-        return
-
-    # If there are no squares, or if squares are not to be shown, you can stop here
-    if len(self.df_squares) == 0:
-        return
-
-    i = 1
-
-    # First draw the squares that are selected
-    for index, row_in_squares in self.df_squares.iterrows():
-        if row_in_squares['Selected']:
-            draw_single_square(
-                self.show_squares_numbers,
-                self.nr_of_squares_in_row,
-                self.left_image_canvas,
-                row_in_squares,
-                self.square_assigned_to_cell,
-                self.provide_information_on_square)
-
-    # Then draw the squares that are in the rectangle drawn by the uses(if any)
-    for square_nr in self.squares_in_rectangle:
-        col_nr = square_nr % nr_of_squares_in_row
-        row_nr = square_nr // nr_of_squares_in_row
-        width = 512 / nr_of_squares_in_row
-        height = 512 / nr_of_squares_in_row
-
-        # Draw the outline without filling the rectangle
-        self.left_image_canvas.create_rectangle(
-            col_nr * width,
-            row_nr * width,
-            col_nr * width + width,
-            row_nr * height + height,
-            outline='white',
-            fill="",
-            width=3)
-
-
-def draw_single_square(
-        show_squares_numbers,
-        nr_of_squares_in_row,
-        canvas,
-        squares_row,
-        square_assigned_to_cell,
-        provide_information_on_square):
+    if self.squares_layer is None:
+        self.squares_layer = SquaresLayer(
+            self.left_image_canvas,
+            self.square_assigned_to_cell,
+            self.provide_information_on_square,
+            (self.start_rectangle, self.close_rectangle, self.expand_rectangle_size))
+
+    self.squares_layer.render(
+        self.image_cache.left_image(self.list_images[self.img_no]),
+        self.df_squares,
+        self.nr_of_squares_in_row,
+        self.show_squares,
+        self.show_squares_numbers,
+        self.squares_in_rectangle)
+
+
+class SquaresLayer:
     """
-    :param show_squares_numbers: a boolean tos specify if a number is shown
-    :param nr_of_squares_in_row: Show the square numbers in the squares
-    :param canvas: the canvas to draw the square on
-    :param squares_row: the record containing the information on the square
-    :param square_assigned_to_cell: A function to call when a square is assigned to a cell
-    :param provide_information_on_square: A function to call when information on a square is requested
-:   return:
+    A persistent pool of canvas items, one set per square of the grid, drawn on top of the recording image.
+    The items are created once per grid size (or after the canvas has been cleared by someone else). A render only
+    reconfigures the items of squares whose appearance changed, hiding the others with state=hidden.
+    Event bindings are set once, when the pool is built.
     """
 
-    colour_table = {1: ('red', 'white'),
-                    2: ('yellow', 'black'),
-                    3: ('green', 'white'),
-                    4: ('magenta', 'white'),
-                    5: ('cyan', 'black'),
-                    6: ('black', 'white')}
-
-    # Extract the information from the record
-    square_nr = squares_row['Square Nr']
-    cell_id = squares_row['Cell Id']
-    label_nr = squares_row['Label Nr']
-    label_nr = 0 if pd.isna(label_nr) else int(squares_row['Label Nr'])
-    col_nr = square_nr % nr_of_squares_in_row
-    row_nr = square_nr // nr_of_squares_in_row
-    width = 512 / nr_of_squares_in_row
-    height = 512 / nr_of_squares_in_row
-
-    square_tag = f'square-{square_nr}'
-    text_tag = f'text-{square_nr}'
+    def __init__(self, canvas, square_assigned_to_cell, provide_information_on_square, rectangle_handlers):
+        self.canvas = canvas
+        self.square_assigned_to_cell = square_assigned_to_cell
+        self.provide_information_on_square = provide_information_on_square
+
+        self.nr_of_squares_in_row = None
+        self.image_item = None
+        self.items = []  # Per square nr: (fill, outline, text, clickable, rectangle selection)
+        self.states = []  # Per square nr: the appearance currently on the canvas, None when hidden
+        self.marked = set()  # The square nrs currently shown as part of the user rectangle selection
+        self.label_nrs = {}  # Square nr -> Label Nr, used by the information binding
+
+        # Bind left buttons for canvas
+        start_rectangle, close_rectangle, expand_rectangle_size = rectangle_handlers
+        canvas.bind('<Button-1>', lambda e: start_rectangle(e))
+        canvas.bind('<ButtonRelease-1>', lambda e: close_rectangle(e))
+        canvas.bind('<B1-Motion>', lambda e: expand_rectangle_size(e))
+
+    def is_valid(self, nr_of_squares_in_row):
+        return (self.nr_of_squares_in_row == nr_of_squares_in_row and
+                self.image_item is not None and
+                self.canvas.type(self.image_item) == 'image')
+
+    def build(self, nr_of_squares_in_row):
+        """
+        Create the image item and the (hidden) items for every square of the grid
+        """
+
+        canvas = self.canvas
+        canvas.delete("all")
+        self.nr_of_squares_in_row = nr_of_squares_in_row
+        self.image_item = canvas.create_image(0, 0, anchor=NW, tags=POOL_TAG)
+        self.items = []
+        self.states = []
+        self.marked = set()
+        self.label_nrs = {}
 
-    if cell_id == -1:  # The square is deleted (for good), stop processing    # ToDo Really? Who sets it to -1?
-        return
-
-    if cell_id != 0:  # The square is assigned to a cell, so it should be filled with the colour of the cell
-        col = colour_table[squares_row['Cell Id']][0]
-        canvas.create_rectangle(
-            col_nr * width,
-            row_nr * width,
-            col_nr * width + width,
-            row_nr * height + height,
-            outline=col,
-            fill=col,
-            width=0,
-            tags=square_tag)
-
-        # Show the cell number in the square
-        if show_squares_numbers:
-            if not pd.isna(squares_row['Label Nr']):
-                canvas.create_text(
-                    col_nr * width + 0.5 * width,
-                    row_nr * width + 0.5 * width,
-                    text=str(label_nr),
-                    font=('Arial', -10),
-                    fill=colour_table[squares_row['Cell Id']][1],
-                    tags=text_tag
-                )
-
-    if label_nr == 0:  # The square is selected but does not have a valid Tau: give it a colour
-        col = colour_table[squares_row['Square Nr'] % 6 + 1][0]
-        canvas.create_rectangle(
-            col_nr * width,
-            row_nr * width,
-            col_nr * width + width,
-            row_nr * height + height,
-            outline='white',
-            fill='#4566A5',  # https://www.webfx.com/web-design/color-picker/4566a5
-            width=0,
-            tags=square_tag)
-
-    # For all the selected squares, assigned to a cell or not draw the outline without filling the rectangle
-    canvas.create_rectangle(
-        col_nr * width,
-        row_nr * width,
-        col_nr * width + width,
-        row_nr * height + height,
-        outline="white",
-        fill="",
-        width=1,
-        tags=square_tag)
-
-    if show_squares_numbers:
-        if cell_id != 0:
-            # The number of a square assigned to a cell should not be overwritten
-            pass
+        width = 512 / nr_of_squares_in_row
+        for square_nr in range(nr_of_squares_in_row * nr_of_squares_in_row):
+            col_nr = square_nr % nr_of_squares_in_row
+            row_nr = square_nr // nr_of_squares_in_row
+            x0, y0 = col_nr * width, row_nr * width
+            x1, y1 = x0 + width, y0 + width
+
+            fill = canvas.create_rectangle(x0, y0, x1, y1, width=0, state=HIDDEN, tags=POOL_TAG)
+            outline = canvas.create_rectangle(
+                x0, y0, x1, y1, outline='white', fill='', width=1, state=HIDDEN, tags=POOL_TAG)
+            text = canvas.create_text(
+                x0 + 0.5 * width, y0 + 0.5 * width, font=('Arial', -10), state=HIDDEN, tags=POOL_TAG)
+
+            # The transparent rectangle is the clickable area of the square
+            clickable = canvas.create_rectangle(x0, y0, x1, y1, outline='', fill='', state=HIDDEN, tags=POOL_TAG)
+            canvas.tag_bind(clickable, '<Button-1>', lambda e, nr=square_nr: self.square_assigned_to_cell(nr))
+            canvas.tag_bind(clickable, '<Button-2>',
+                            lambda e, nr=square_nr: self.provide_information_on_square(e, self.label_nrs.get(nr), nr))
+
+            marker = canvas.create_rectangle(
+                x0, y0, x1, y1, outline='white', fill='', width=3, state=HIDDEN, tags=POOL_TAG)
+
+            self.items.append((fill, outline, text, clickable, marker))
+            self.states.append(None)
+
+    def render(self, image, df_squares, nr_of_squares_in_row, show_squares, show_squares_numbers,
+               squares_in_rectangle):
+        """
+        Bring the canvas in line with the squares, touching only the items that need to change
+        """
+
+        if not self.is_valid(nr_of_squares_in_row):
+            self.build(nr_of_squares_in_row)
+
+        # Remove anything drawn on the canvas by others, e.g. a recording image placed on top of the pool
+        self.canvas.delete(f'!{POOL_TAG}')
+        self.canvas.itemconfigure(self.image_item, image=image)
+
+        nr_of_squares = len(self.items)
+        new_states = [None] * nr_of_squares
+        self.label_nrs = {}
+        if show_squares and len(df_squares) > 0:
+            for square_nr, selected, cell_id, label_nr in zip(df_squares['Square Nr'], df_squares['Selected'],
+                                                              df_squares['Cell Id'], df_squares['Label Nr']):
+                square_nr = int(square_nr)
+                if not selected or not 0 <= square_nr < nr_of_squares:
+                    continue
+                self.label_nrs[square_nr] = label_nr
+                new_states[square_nr] = square_appearance(cell_id, label_nr, show_squares_numbers)
+
+        for square_nr, (old_state, new_state) in enumerate(zip(self.states, new_states)):
+            if old_state != new_state:
+                self.update_square(square_nr, new_state)
+        self.states = new_states
+
+        # Then show the squares that are in the rectangle drawn by the user (if any)
+        marked = set(squares_in_rectangle) if show_squares else set()
+        for square_nr in marked.symmetric_difference(self.marked):
+            if 0 <= square_nr < nr_of_squares:
+                self.canvas.itemconfigure(self.items[square_nr][4], state=NORMAL if square_nr in marked else HIDDEN)
+        self.marked = marked
+
+    def update_square(self, square_nr, state):
+        canvas = self.canvas
+        fill, outline, text, clickable, marker = self.items[square_nr]
+        if state is None:
+            for item in (fill, outline, text, clickable):
+                canvas.itemconfigure(item, state=HIDDEN)
+            return
+
+        fill_colour, label, text_colour = state
+        if fill_colour is None:
+            canvas.itemconfigure(fill, state=HIDDEN)
         else:
-            if not pd.isna(squares_row['Label Nr']):
-                canvas.create_text(
-                    col_nr * width + 0.5 * width,
-                    row_nr * width + 0.5 * width,
-                    text=str(label_nr),
-                    font=('Arial', -10),
-                    fill='white',
-                    tags=text_tag)
-
-    # Always create a transparent rectangle (clickable area) and bind events to the it
-    invisible_rect = canvas.create_rectangle(
-        col_nr * width,
-        row_nr * width,
-        col_nr * width + width,
-        row_nr * height + height,
-        outline="",
-        fill="",
-        tags=f"invisible-{square_nr}")
-    canvas.tag_bind(invisible_rect, '<Button-1>', lambda e: square_assigned_to_cell(square_nr))
-    canvas.tag_bind(invisible_rect, '<Button-2>',
-                    lambda e: provide_information_on_square(e, squares_row['Label Nr'], square_nr))
+            canvas.itemconfigure(fill, fill=fill_colour, outline=fill_colour, state=NORMAL)
+        canvas.itemconfigure(outline, state=NORMAL)
+        if label is None:
+            canvas.itemconfigure(text, state=HIDDEN)
+        else:
+            canvas.itemconfigure(text, text=label, fill=text_colour, state=NORMAL)
+        canvas.itemconfigure(clickable, state=NORMAL)
+
+
+def square_appearance(cell_id, label_nr, show_squares_numbers):
+    """
+    Determine how a selected square is drawn
+    :param cell_id: The cell the square is assigned to, 0 if none
+    :param label_nr: The label of the square, NaN if the square does not have a valid Tau
+    :param show_squares_numbers: Show the label in the square
+    :return: A (fill colour, label text, text colour) tuple, or None if the square is not drawn at all
+    """
+
+    if cell_id == -1:  # The square is deleted (for good), stop processing    # ToDo Really? Who sets it to -1?
+        return None
+
+    has_label = not pd.isna(label_nr)
+    if not has_label or int(label_nr) == 0:  # The square is selected but does not have a valid Tau: give it a colour
+        fill_colour = NO_TAU_COLOUR
+    elif cell_id != 0:  # The square is assigned to a cell, so it should be filled with the colour of the cell
+        fill_colour = COLOUR_TABLE[cell_id][0]
+    else:
+        fill_colour = None
+
+    if show_squares_numbers and has_label:
+        text_colour = COLOUR_TABLE[cell_id][1] if cell_id != 0 else 'white'
+        return fill_colour, str(int(label_nr)), text_colour
+    return fill_colour, None, None
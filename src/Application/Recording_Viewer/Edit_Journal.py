@@ -0,0 +1,207 @@
+"""
+Dirty tracking and an append-only journal of the edits made in the Recording Viewer.
+
+Every time the edits of a recording are folded into the project data, a compact record with the selection
+parameters, exclusion, Tau/Density and the per-square Selected, Label Nr and Cell Id values is appended to a
+journal file next to the data. On a normal exit only the files that contain dirty data are rewritten and the
+journal is removed. If the viewer did not exit normally, the journal is found at the next start and can be
+replayed onto the freshly loaded data.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.Fiji.LoggerConfig import paint_logger
+
+JOURNAL_FILE = '.Recording Viewer Journal.jsonl'
+
+# The parts of the data that can become dirty and the file each of them is saved to
+SQUARES = 'All Squares.csv'
+TRACKS = 'All Tracks.csv'
+RECORDINGS = 'All Recordings.csv'
+
+JOURNAL_EXPERIMENT_COLUMNS = [
+    'Min Required Density Ratio', 'Max Allowable Variability', 'Min Allowable R Squared', 'Neighbour Mode',
+    'Exclude', 'Tau', 'Density', 'R Squared']
+JOURNAL_SQUARES_COLUMNS = ['Selected', 'Label Nr', 'Cell Id']
+
+
+def _to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} can not be journalled")
+
+
+def _clean(values):
+    return [None if pd.isna(value) else value for value in values]
+
+
+def _to_column_dtype(values, dtype):
+    # Journalled values are plain JSON values with None for missing values, restore the dtype of the column
+    try:
+        return pd.Series(values, dtype=dtype)
+    except (TypeError, ValueError):
+        return pd.Series(values, dtype=object)
+
+
+class EditJournal:
+    """
+    Keeps track of which recordings and files are dirty and journals the edits to disk
+    """
+
+    def __init__(self, directory):
+        self.journal_path = os.path.join(directory, JOURNAL_FILE)
+        self.dirty_recordings = set()
+        self.dirty_files = set()
+
+    def is_dirty(self):
+        return len(self.dirty_files) > 0
+
+    def mark_dirty(self, recording_name, *files):
+        if recording_name is not None:
+            self.dirty_recordings.add(recording_name)
+        self.dirty_files.update(files)
+
+    def exists(self):
+        return os.path.isfile(self.journal_path)
+
+    def _append(self, record):
+        try:
+            with open(self.journal_path, 'a') as journal:
+                journal.write(json.dumps(record, default=_to_json) + '\n')
+        except OSError as e:
+            paint_logger.error(f"Could not write to the edit journal {self.journal_path}: {e}")
+
+    def record_recording(self, df_experiment, df_squares, recording_name, tracks_changed=False):
+        """
+        Journal the current state of the user editable fields of a single recording
+        :param df_experiment: The experiment dataframe, indexed on 'Ext Recording Name'
+        :param df_squares: The squares of the recording
+        :param recording_name: The recording
+        :param tracks_changed: Whether the Label Nr of the tracks of this recording changed
+        """
+
+        experiment_columns = [col for col in JOURNAL_EXPERIMENT_COLUMNS if col in df_experiment.columns]
+        squares_columns = [col for col in JOURNAL_SQUARES_COLUMNS if col in df_squares.columns]
+        record = {
+            'Recording': recording_name,
+            'Experiment': dict(zip(experiment_columns,
+                                   _clean(df_experiment.loc[recording_name, experiment_columns].tolist()))),
+            'Squares': {col: _clean(df_squares[col].tolist()) for col in ['Unique Key'] + squares_columns}
+        }
+        self._append(record)
+
+        self.mark_dirty(recording_name, RECORDINGS, SQUARES)
+        if tracks_changed:
+            self.mark_dirty(recording_name, TRACKS)
+
+    def record_experiment(self, df_experiment, recording_name):
+        """
+        Journal the experiment fields of a recording only, e.g. after it was excluded
+        """
+
+        experiment_columns = [col for col in JOURNAL_EXPERIMENT_COLUMNS if col in df_experiment.columns]
+        record = {
+            'Recording': recording_name,
+            'Experiment': dict(zip(experiment_columns,
+                                   _clean(df_experiment.loc[recording_name, experiment_columns].tolist())))
+        }
+        self._append(record)
+        self.mark_dirty(recording_name, RECORDINGS)
+
+    def record_all_recordings(self, df_experiment, settings):
+        """
+        Journal selection parameters that were applied to all recordings
+        """
+
+        self._append({'Recording': None, 'Experiment': settings})
+        self.mark_dirty(None, RECORDINGS)
+        self.dirty_recordings.update(df_experiment.index)
+
+    def read(self):
+        """
+        Read the journal, skipping a possibly incomplete last line
+        :return: The list of journal records
+        """
+
+        records = []
+        try:
+            with open(self.journal_path) as journal:
+                for line in journal:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        paint_logger.warning(f"Skipped an incomplete record in {self.journal_path}")
+        except OSError:
+            return []
+        return records
+
+    def clear(self):
+        """
+        Remove the journal and forget the dirty state, called after a save or when the changes are discarded
+        """
+
+        if self.exists():
+            try:
+                os.remove(self.journal_path)
+            except OSError as e:
+                paint_logger.error(f"Could not remove the edit journal {self.journal_path}: {e}")
+        self.dirty_recordings.clear()
+        self.dirty_files.clear()
+
+    def save(self, directory, df_all_squares, df_all_tracks, df_experiment):
+        """
+        Rewrite only the files that hold dirty data and then remove the journal
+        :return: The list of files that were written
+        """
+
+        frames = {SQUARES: df_all_squares, TRACKS: df_all_tracks, RECORDINGS: df_experiment}
+        written = []
+        for file_name, df in frames.items():
+            if file_name in self.dirty_files:
+                df.to_csv(os.path.join(directory, file_name), index=False)
+                written.append(file_name)
+        paint_logger.debug("Saved %s for %d changed recordings", ', '.join(written), len(self.dirty_recordings))
+        self.clear()
+        return written
+
+
+def replay_journal(records, df_experiment, df_all_squares, squares_ranges):
+    """
+    Apply journal records, in order, to freshly loaded data
+    :param records: The journal records, as returned by EditJournal.read
+    :param df_experiment: The experiment dataframe, indexed on 'Ext Recording Name'
+    :param df_all_squares: All squares, sorted on recording and indexed on 'Unique Key'
+    :param squares_ranges: The recording -> (start, stop) row ranges of df_all_squares
+    :return: The set of recordings for which square values were replayed
+    """
+
+    replayed = set()
+    for record in records:
+        recording_name = record['Recording']
+        if recording_name is not None and recording_name not in df_experiment.index:
+            paint_logger.warning(f"Journal record for unknown recording '{recording_name}' skipped")
+            continue
+
+        rows = df_experiment.index if recording_name is None else [recording_name]
+        for col, value in record.get('Experiment', {}).items():
+            if col in df_experiment.columns:
+                df_experiment.loc[rows, col] = value
+
+        squares = record.get('Squares')
+        if squares is None or recording_name not in squares_ranges:
+            continue
+        start, stop = squares_ranges[recording_name]
+        positions = df_all_squares.index[start:stop].get_indexer(squares['Unique Key'])
+        found = positions >= 0
+        for col, values in squares.items():
+            if col == 'Unique Key' or col not in df_all_squares.columns:
+                continue
+            values = _to_column_dtype(values, df_all_squares[col].dtype)[found]
+            df_all_squares.iloc[start + positions[found], df_all_squares.columns.get_loc(col)] = values.to_numpy()
+        replayed.add(recording_name)
+
+    return replayed
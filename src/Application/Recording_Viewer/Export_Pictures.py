@@ -0,0 +1,148 @@
+"""
+Off-screen rendering of the Recording Viewer pictures.
+
+The TrackMate image of a recording and the overlay of its selected squares are drawn directly with PIL from the
+squares data, so no canvas, PostScript or Ghostscript round trip is needed. Recordings are rendered in a
+process pool and the pages are appended to the PDF one at a time, in recording order, so only the pages that are
+in flight are held in memory.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageDraw, ImageFont
+
+from src.Application.Recording_Viewer.Display_Selected_Squares import square_appearance
+from src.Application.Recording_Viewer.Select_Squares import select_squares_with_parameters
+from src.Fiji.LoggerConfig import paint_logger
+
+PICTURE_SIZE = 512
+PDF_RESOLUTION = 200.0
+
+
+def make_export_job(record, df_squares, nr_of_squares_in_row, squares_dir, show_squares, show_squares_numbers,
+                    only_valid_tau):
+    """
+    Collect everything needed to render one recording in a worker process
+    :param record: The entry of the recording in the viewer's list_images
+    :param df_squares: The squares of the recording
+    :return: A dictionary that can be sent to a worker process
+    """
+
+    return {
+        'Image Name': record['Left Image Name'],
+        'Image Path': record['Left Image Path'],
+        'Squares': df_squares[['Square Nr', 'Row Nr', 'Col Nr', 'Density Ratio', 'Variability', 'Max Track Duration',
+                               'R Squared', 'Tau', 'Cell Id', 'Label Nr']].copy(),
+        'Select Parameters': {
+            'min_required_density_ratio': record['Min Required Density Ratio'],
+            'max_allowable_variability': record['Max Allowable Variability'],
+            'min_track_duration': 0,
+            'max_track_duration': 200,
+            'min_allowable_r_squared': record['Min Allowable R Squared'],
+            'neighbour_mode': record['Neighbour Mode']},
+        'Nr of Squares in Row': nr_of_squares_in_row,
+        'Squares Dir': squares_dir,
+        'Show Squares': show_squares,
+        'Show Squares Numbers': show_squares_numbers,
+        'Only Valid Tau': only_valid_tau}
+
+
+def render_recording_picture(image_path, df_squares, nr_of_squares_in_row, show_squares=True,
+                             show_squares_numbers=True):
+    """
+    Draw the TrackMate image with and without the selected squares
+    :param image_path: The TrackMate image, None if there is none
+    :param df_squares: The squares of the recording, with the 'Selected' flag set
+    :param nr_of_squares_in_row: The size of the grid
+    :return: A tuple with the plain picture and the picture with the squares drawn on top
+    """
+
+    if image_path is None:
+        picture = Image.new('RGB', (PICTURE_SIZE, PICTURE_SIZE), (235, 235, 235))
+    else:
+        with Image.open(image_path) as img:
+            picture = img.convert('RGB')
+        if picture.size != (PICTURE_SIZE, PICTURE_SIZE):
+            picture = picture.resize((PICTURE_SIZE, PICTURE_SIZE))
+
+    squares_picture = picture.copy()
+    if not show_squares or len(df_squares) == 0:
+        return picture, squares_picture
+
+    draw = ImageDraw.Draw(squares_picture)
+    font = ImageFont.load_default()
+    width = PICTURE_SIZE / nr_of_squares_in_row
+    df_selected = df_squares[df_squares['Selected']]
+    for square_nr, cell_id, label_nr in zip(df_selected['Square Nr'], df_selected['Cell Id'],
+                                            df_selected['Label Nr']):
+        appearance = square_appearance(cell_id, label_nr, show_squares_numbers)
+        if appearance is None:
+            continue
+        fill_colour, label, text_colour = appearance
+
+        square_nr = int(square_nr)
+        x0 = (square_nr % nr_of_squares_in_row) * width
+        y0 = (square_nr // nr_of_squares_in_row) * width
+        box = [x0, y0, x0 + width, y0 + width]
+        draw.rectangle(box, fill=fill_colour, outline='white', width=1)
+        if label is not None:
+            draw.text((x0 + 0.5 * width, y0 + 0.5 * width), label, fill=text_colour, font=font, anchor='mm')
+
+    return picture, squares_picture
+
+
+def _render_export_job(job):
+    """
+    Worker process entry: select the squares, render both pictures and write them as png
+    :return: The paths of the two png files
+    """
+
+    df_squares = job['Squares']
+    select_squares_with_parameters(df_squares, job['Select Parameters'], job['Nr of Squares in Row'],
+                                   only_valid_tau=job['Only Valid Tau'])
+    picture, squares_picture = render_recording_picture(
+        job['Image Path'], df_squares, job['Nr of Squares in Row'], job['Show Squares'], job['Show Squares Numbers'])
+
+    picture_path = os.path.join(job['Squares Dir'], job['Image Name'] + '.png')
+    squares_picture_path = os.path.join(job['Squares Dir'], job['Image Name'] + '-squares.png')
+    picture.save(picture_path, 'png')
+    squares_picture.save(squares_picture_path, 'png')
+    return picture_path, squares_picture_path
+
+
+def append_pdf_page(pdf_path, image_path, first_page):
+    """
+    Add a single page to the pdf, the first page creates (or overwrites) the file
+    """
+
+    with Image.open(image_path) as img:
+        img.convert('RGB').save(pdf_path, 'PDF', resolution=PDF_RESOLUTION, append=not first_page)
+
+
+def write_pdf_from_pngs(png_files, pdf_path):
+    """
+    Write the png files to a pdf, one page at a time
+    """
+
+    for i, png_file in enumerate(png_files):
+        append_pdf_page(pdf_path, png_file, first_page=(i == 0))
+
+
+def export_pictures(jobs, pdf_path, max_workers=None):
+    """
+    Render all recordings in a process pool and stream the pages into the pdf in recording order
+    :param jobs: The export jobs, as made by make_export_job
+    :param pdf_path: The pdf to write
+    :param max_workers: The number of worker processes, defaults to the number of CPUs
+    :return: The number of recordings exported
+    """
+
+    nr_exported = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for paths in executor.map(_render_export_job, jobs):
+            for path in paths:
+                append_pdf_page(pdf_path, path, first_page=(nr_exported == 0 and path == paths[0]))
+            nr_exported += 1
+            paint_logger.debug("Exported %s to %s", os.path.basename(paths[0]), pdf_path)
+    return nr_exported
@@ -1,16 +1,130 @@
 import os
 import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import *
 
 from PIL import Image, ImageTk
 
+from src.Application.Utilities.Thumbnails import get_up_to_date_thumbnail
 from src.Fiji.LoggerConfig import paint_logger
 
+# The number of decoded images held in memory and the number of recordings on either side of the current one
+# that are decoded in the background
+IMAGE_CACHE_SIZE = 24
+PREFETCH_DISTANCE = 2
+
+
+class ImageCache:
+    """
+    Decodes the TrackMate and Brightfield images on demand and keeps a bounded LRU of them.
+    PIL decoding of neighbouring recordings is done on a background thread. The ImageTk.PhotoImage objects
+    are only created on the Tk thread, when an image is actually displayed.
+    """
+
+    def __init__(self, max_size=IMAGE_CACHE_SIZE):
+        self.max_size = max_size
+        self._photo_images = OrderedDict()  # Path -> ImageTk.PhotoImage, only touched on the Tk thread
+        self._decoded_images = OrderedDict()  # Path -> PIL Image, filled by the prefetch thread
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-prefetch')
+        self._placeholder = None
+
+    def left_image(self, record):
+        return self.get(record['Left Image Path'])
+
+    def right_image(self, record):
+        return self.get(record['Right Image Path'])
+
+    def get(self, image_path):
+        """
+        Return the PhotoImage for a path, decoding it now if the prefetch thread has not done so yet.
+        Must be called from the Tk thread.
+        """
+
+        if image_path is None:
+            return self._get_placeholder()
+
+        photo_image = self._photo_images.get(image_path)
+        if photo_image is not None:
+            self._photo_images.move_to_end(image_path)
+            return photo_image
+
+        with self._lock:
+            img = self._decoded_images.pop(image_path, None)
+        if img is None:
+            img = _decode_image(image_path)
+        if img is None:
+            return self._get_placeholder()
+
+        photo_image = ImageTk.PhotoImage(img)
+        self._photo_images[image_path] = photo_image
+        while len(self._photo_images) > self.max_size:
+            self._photo_images.popitem(last=False)
+        return photo_image
+
+    def prefetch(self, records):
+        """
+        Decode the images of the specified recordings in the background, so they are ready when navigated to
+        """
+
+        for record in records:
+            for image_path in (record['Left Image Path'], record['Right Image Path']):
+                if image_path is None or image_path in self._photo_images:
+                    continue
+                with self._lock:
+                    if image_path in self._decoded_images or image_path in self._pending:
+                        continue
+                    self._pending.add(image_path)
+                self._executor.submit(self._prefetch_image, image_path)
+
+    def _prefetch_image(self, image_path):
+        img = _decode_image(image_path)
+        with self._lock:
+            self._pending.discard(image_path)
+            if img is not None:
+                self._decoded_images[image_path] = img
+                while len(self._decoded_images) > self.max_size:
+                    self._decoded_images.popitem(last=False)
+
+    def _get_placeholder(self):
+        if self._placeholder is None:
+            self._placeholder = ImageTk.PhotoImage(Image.new('RGB', (512, 512), (235, 235, 235)))
+        return self._placeholder
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _decode_image(image_path):
+    # The 512 pixel thumbnail has the size of the display and decodes much faster than a TrackMate capture
+    image_path = get_up_to_date_thumbnail(image_path, 512) or image_path
+    try:
+        img = Image.open(image_path)
+        img.load()
+        return img
+    except Exception as e:
+        paint_logger.error(f"Could not read image {image_path}: {e}")
+        return None
+
+
+def prefetch_neighbouring_images(self):
+    """
+    Ask the image cache to decode the recordings around the current one in the background
+    """
+
+    first = max(self.img_no - PREFETCH_DISTANCE, 0)
+    last = min(self.img_no + PREFETCH_DISTANCE + 1, len(self.list_images))
+    self.image_cache.prefetch(self.list_images[first:last])
+
 
 def get_images(self, initial=False):
     """
     Retrieve the images to be displayed (for the left and right frame) from disk.
     A list with all necessary attributes for each image is created.
+    Only the image paths are determined here, the images themselves are decoded by the ImageCache when needed.
     """
 
     list_images = []
@@ -21,18 +135,15 @@ def get_images(self, initial=False):
         recording_name = experiment_row['Recording Name']
         experiment = str(experiment_row['Experiment Name'])
 
-        try:
-            left_image_dir = os.path.join(
-                self.user_specified_directory,
-                'TrackMate Images' if self.user_specified_mode == 'Experiment' else os.path.join(experiment,
-                                                                                                 'TrackMate Images')
-            )
-            left_img = ImageTk.PhotoImage(Image.open(os.path.join(left_image_dir, ext_recording_name + '.jpg')))
-            valid = True
-        except:
-            valid = False
-            left_img = Image.new('RGB', (512, 512), "rgb(235,235,235)")
-            left_img = ImageTk.PhotoImage(left_img)
+        left_image_dir = os.path.join(
+            self.user_specified_directory,
+            'TrackMate Images' if self.user_specified_mode == 'Experiment' else os.path.join(experiment,
+                                                                                             'TrackMate Images')
+        )
+        left_image_path = os.path.join(left_image_dir, ext_recording_name + '.jpg')
+        valid = os.path.isfile(left_image_path)
+        if not valid:
+            left_image_path = None
             error_count += 1
 
         # Retrieve Tau from the experiments_squares file, defaults to 0
@@ -44,15 +155,15 @@ def get_images(self, initial=False):
             'Brightfield Images' if self.user_specified_mode == 'Experiment' else os.path.join(experiment,
                                                                                                'Brightfield Images')
         )
-        right_valid, right_img = get_corresponding_bf(bf_image_dir, ext_recording_name, recording_name)
+        right_valid, right_image_path = get_corresponding_bf(bf_image_dir, ext_recording_name, recording_name)
 
         record = {
             "Left Image Name": experiment_row['Ext Recording Name'],
-            "Left Image": left_img,
+            "Left Image Path": left_image_path,
             "Left Valid": valid,
 
             "Right Image Name": ext_recording_name,
-            "Right Image": right_img,
+            "Right Image Path": right_image_path,
             "Right Valid": right_valid,
 
             "Cell Type": experiment_row['Cell Type'],
@@ -87,7 +198,7 @@ def get_images(self, initial=False):
 
 def get_corresponding_bf(bf_dir, ext_recording_name, recording_name):
     """
-    Retrieve the corresponding BF image for the given image name
+    Retrieve the path of the corresponding BF image for the given image name
     """
 
     if not os.path.exists(bf_dir):
@@ -106,10 +217,10 @@ def get_corresponding_bf(bf_dir, ext_recording_name, recording_name):
             break
 
     if recording_name:
-        img = ImageTk.PhotoImage(Image.open(os.path.join(bf_dir, recording_name)))
+        image_path = os.path.join(bf_dir, recording_name)
         valid = True
     else:
-        img = ImageTk.PhotoImage(Image.new('RGB', (512, 512), (235, 235, 235)))
+        image_path = None
         valid = False
 
-    return valid, img
+    return valid, image_path
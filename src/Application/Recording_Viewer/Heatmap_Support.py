@@ -1,6 +1,8 @@
 import sys
+from functools import lru_cache
 
-import matplotlib.pyplot as plt
+import numpy as np
+from PIL import Image
 
 from src.Fiji.LoggerConfig import paint_logger
 
@@ -12,33 +14,67 @@ heatmap_modes = {
     5: 'Total Track Duration'
 }
 
+HEATMAP_COLORMAP = 'Blues'
+HEATMAP_LEVELS = 20
+HEATMAP_SIZE = 512
+
 
 # Function to convert RGB to HEX format
 def _rgb_to_hex(rgb):
     return '#{:02x}{:02x}{:02x}'.format(int(rgb[0] * 255), int(rgb[1] * 255), int(rgb[2] * 255))
 
 
-# Generate colors from a colormap
+def _get_colormap(cmap_name):
+    # matplotlib is only needed for its colormaps, it is imported when the first heatmap is drawn, without pyplot
+    import matplotlib
+    return matplotlib.colormaps[cmap_name]
+
+
+# Generate colors from a colormap, the result is cached as the colormap does not change
+@lru_cache(maxsize=None)
 def get_colormap_colors(cmap_name, num_colors):
-    cmap = plt.get_cmap(cmap_name)
-    return [_rgb_to_hex(cmap(i / num_colors)) for i in range(num_colors)]
+    cmap = _get_colormap(cmap_name)
+    return tuple(_rgb_to_hex(cmap(i / num_colors)) for i in range(num_colors))
+
+
+@lru_cache(maxsize=None)
+def get_colormap_lut(cmap_name, num_colors):
+    """
+    Return the colormap as a lookup table of num_colors RGB values (uint8), with the same colours
+    as get_colormap_colors
+    """
+
+    cmap = _get_colormap(cmap_name)
+    lut = np.array([cmap(i / num_colors)[:3] for i in range(num_colors)])
+    return (lut * 255).astype(np.uint8)
 
 
-def get_color_index(value, var_max, var_min, nr_levels):
-    var = max(value, 0)
-    if var_max == var_min:
-        return 0
+def get_column_stats(df_all_squares):
+    """
+    Return the min and max of every heatmap column of All Squares, computed in one pass. The viewer keeps the result
+    until the squares change.
+    :param df_all_squares: The All Squares dataframe
+    :return: A dictionary with column name as key and a (min, max) tuple as value
+    """
 
-    # Normalize the value to an index in the range of the color index (0-19)
-    index = int((value - var_min) / (var_max - var_min) * (nr_levels - 1))
+    columns = [col for col in heatmap_modes.values() if col in df_all_squares.columns]
+    mins = df_all_squares[columns].min()
+    maxs = df_all_squares[columns].max()
+    return {col: (mins[col], maxs[col]) for col in columns}
 
-    return index
 
+def get_heatmap_data(df_squares, column_stats, heatmap_mode, experiment_min_max=True):
+    """
+    :param df_squares: The squares of the recording
+    :param column_stats: The min and max of the columns of All Squares, as returned by get_column_stats
+    :param heatmap_mode: One of the keys of heatmap_modes
+    :param experiment_min_max: Scale to the min and max of All Squares rather than those of the recording
+    :return: A tuple with the heatmap data, the min and the max
+    """
 
-def get_heatmap_data(df_squares, df_all_squares, heatmap_mode, experiment_min_max=True):
     global heatmap_modes
 
-    if df_all_squares.empty or df_squares.empty:
+    if column_stats is None or df_squares.empty:
         paint_logger.error("Function 'display_heatmap' failed - No data available")
         sys.exit()
 
@@ -53,8 +89,7 @@ def get_heatmap_data(df_squares, df_all_squares, heatmap_mode, experiment_min_ma
             return df_heatmap_data, min_val, max_val
 
         if experiment_min_max:
-            min_val = df_all_squares[column_name].min()
-            max_val = df_all_squares[column_name].max()
+            min_val, max_val = column_stats[column_name]
         else:
             min_val = df_squares[column_name].min()
             max_val = df_squares[column_name].max()
@@ -73,3 +108,37 @@ def get_heatmap_data(df_squares, df_all_squares, heatmap_mode, experiment_min_ma
         sys.exit()
 
     return df_heatmap_data, min_val, max_val
+
+
+def get_heatmap_image(df_heatmap_data, nr_of_squares_in_row, min_val, max_val):
+    """
+    Render the heatmap as a single image. The values of all squares are mapped to colour indices in one
+    vectorised step and looked up in the colour table, squares without data are left transparent.
+    :param df_heatmap_data: The heatmap data as returned by get_heatmap_data, indexed on 'Square Nr'
+    :param nr_of_squares_in_row: The size of the grid
+    :param min_val: The value that maps to the first colour
+    :param max_val: The value that maps to the last colour
+    :return: A HEATMAP_SIZE x HEATMAP_SIZE RGBA PIL image
+    """
+
+    lut = get_colormap_lut(HEATMAP_COLORMAP, HEATMAP_LEVELS)
+    nr_of_squares = nr_of_squares_in_row * nr_of_squares_in_row
+
+    square_nrs = df_heatmap_data.index.to_numpy(dtype=int)
+    values = df_heatmap_data['Value'].to_numpy(dtype=float)
+    in_grid = (square_nrs >= 0) & (square_nrs < nr_of_squares)
+    square_nrs, values = square_nrs[in_grid], values[in_grid]
+
+    # Normalise the values to an index in the colour table
+    if max_val == min_val:
+        color_index = np.zeros(len(values), dtype=int)
+    else:
+        color_index = ((values - min_val) / (max_val - min_val) * (HEATMAP_LEVELS - 1)).astype(int)
+        color_index = np.clip(color_index, 0, HEATMAP_LEVELS - 1)
+
+    grid = np.zeros((nr_of_squares, 4), dtype=np.uint8)
+    grid[square_nrs, :3] = lut[color_index]
+    grid[square_nrs, 3] = 255
+
+    image = Image.fromarray(grid.reshape(nr_of_squares_in_row, nr_of_squares_in_row, 4), 'RGBA')
+    return image.resize((HEATMAP_SIZE, HEATMAP_SIZE), Image.NEAREST)
@@ -0,0 +1,69 @@
+"""
+Background loading of the large tables of the Recording Viewer.
+
+The viewer shows the first recording as soon as 'All Recordings.csv' has been read. 'All Squares.csv' and
+'All Tracks.csv' are then read on a background thread by load_project_tables, which reports each stage through
+a queue. The viewer drains the queue on the Tk thread with after, so no Tk call is made from the loader thread.
+"""
+
+import os
+import queue
+import threading
+
+import pandas as pd
+
+from src.Application.Recording_Viewer.Recording_Viewer_Support_Functions import (
+    sort_on_recording,
+    build_recording_ranges)
+from src.Application.Utilities.General_Support_Functions import read_squares_from_file
+
+# The messages the loader puts on the queue
+LOAD_PROGRESS = 'Progress'
+LOAD_SQUARES = 'Squares'
+LOAD_TRACKS = 'Tracks'
+LOAD_ERROR = 'Error'
+
+
+def load_project_tables(directory, message_queue):
+    """
+    Read All Squares and All Tracks, sort them on recording and build their row range indexes.
+    Each stage is reported on the message queue as a (message, ...) tuple.
+    :param directory: The Experiment or Project directory
+    :param message_queue: The queue the viewer polls
+    """
+
+    try:
+        message_queue.put((LOAD_PROGRESS, "Loading squares (1/2)"))
+        squares_file_path = os.path.join(directory, 'All Squares.csv')
+        if not os.path.isfile(squares_file_path):
+            message_queue.put((LOAD_ERROR, "No 'All Squares.csv' file, Did you select an image directory?"))
+            return
+        df_all_squares = sort_on_recording(read_squares_from_file(squares_file_path))
+        message_queue.put((LOAD_SQUARES, df_all_squares, build_recording_ranges(df_all_squares)))
+
+        message_queue.put((LOAD_PROGRESS, "Loading tracks (2/2)"))
+        tracks_file_path = os.path.join(directory, 'All Tracks.csv')
+        if not os.path.isfile(tracks_file_path):
+            message_queue.put((LOAD_ERROR, "No 'All Tracks' file, Did you select an image directory?"))
+            return
+        df_all_tracks = pd.read_csv(tracks_file_path)
+        if 'Unique Key' not in df_all_tracks.columns:
+            message_queue.put((LOAD_ERROR, "No 'Unique Key' in the All Tracks file. Did you run Generate Squares?"))
+            return
+        df_all_tracks.set_index('Unique Key', inplace=True, drop=False)
+        df_all_tracks = sort_on_recording(df_all_tracks)
+        message_queue.put((LOAD_TRACKS, df_all_tracks, build_recording_ranges(df_all_tracks)))
+    except Exception as e:
+        message_queue.put((LOAD_ERROR, f"Loading the project data failed: {e}"))
+
+
+def start_loading_project_tables(directory):
+    """
+    Start the background loader
+    :return: The queue on which the loader reports
+    """
+
+    message_queue = queue.Queue()
+    loader = threading.Thread(target=load_project_tables, args=(directory, message_queue), daemon=True)
+    loader.start()
+    return message_queue
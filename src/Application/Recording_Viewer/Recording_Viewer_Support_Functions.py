@@ -2,62 +2,112 @@ import os
 import shutil
 from tkinter import *
 
+import numpy as np
 import pandas as pd
-from PIL import Image
 
-pd.options.mode.copy_on_write = True
 
+# The width of the recording on the canvas in pixels, to convert square coordinates to canvas coordinates
+RECORDING_SIZE_PIXELS = 512
 
-def save_as_png(canvas, file_name, size_pixels=(512, 512)):
-    canvas.config(width=size_pixels[0], height=size_pixels[1])
 
-    # First save as a postscript file
-    canvas.postscript(file=file_name + '.ps', colormode='color')
+def get_square_pixel_bounds(df_squares, recording_size):
+    """
+    Convert the square coordinates of a recording from micrometers to pixels, in one step
+    :param df_squares: The squares of the recording
+    :param recording_size: The width of the recording in micrometers (see calc_recording_size)
+    :return: A tuple with the array of square numbers and an (n, 4) array with the x0, y0, x1, y1 pixel bounds
+    """
+
+    bounds = df_squares[['X0', 'Y0', 'X1', 'Y1']].to_numpy(dtype=float) / recording_size * RECORDING_SIZE_PIXELS
+    return df_squares['Square Nr'].to_numpy(dtype=int), bounds
+
+
+def find_squares_in_rectangle(square_nrs, bounds, candidates, xr0, yr0, xr1, yr1):
+    """
+    Find the squares that lie completely within the rectangle the user drew
+    :param square_nrs: The square numbers, as returned by get_square_pixel_bounds
+    :param bounds: The pixel bounds, as returned by get_square_pixel_bounds
+    :param candidates: A boolean mask of the squares that may be picked (the selected squares)
+    :param xr0, yr0, xr1, yr1: The corners of the rectangle in pixels, in the order they were drawn
+    :return: The set of square numbers in the rectangle
+    """
+
+    # A rectangle without width or height contains nothing
+    if xr0 == xr1 or yr0 == yr1:
+        return set()
+
+    left, right = min(xr0, xr1), max(xr0, xr1)
+    top, bottom = min(yr0, yr1), max(yr0, yr1)
+    inside = (candidates &
+              (bounds[:, 0] >= left) & (bounds[:, 2] <= right) &
+              (bounds[:, 1] >= top) & (bounds[:, 3] <= bottom))
+    return set(square_nrs[inside].tolist())
+
+
+def sort_on_recording(df):
+    """
+    Sort a squares or tracks dataframe on 'Ext Recording Name', keeping the original order within a recording,
+    so that the rows of every recording form one contiguous block
+    """
+
+    if df['Ext Recording Name'].is_monotonic_increasing:
+        return df
+    return df.sort_values(by='Ext Recording Name', kind='stable')
+
+
+def build_recording_ranges(df):
+    """
+    Build an index from recording name to the (start, stop) row positions of that recording.
+    The dataframe needs to be sorted on 'Ext Recording Name' (see sort_on_recording).
+    :param df: The squares or tracks dataframe
+    :return: A dictionary with the recording name as key and a (start, stop) tuple as value
+    """
 
-    # Open the PostScript file with PIL
-    img = Image.open(file_name + '.ps')
-    img = img.resize(size_pixels)
+    names = df['Ext Recording Name'].to_numpy()
+    if len(names) == 0:
+        return {}
+    boundaries = np.flatnonzero(names[1:] != names[:-1]) + 1
+    starts = np.concatenate(([0], boundaries))
+    stops = np.concatenate((boundaries, [len(names)]))
+    return {names[start]: (int(start), int(stop)) for start, stop in zip(starts, stops)}
 
-    # Save as TIFF
-    img.save(file_name + '.tiff', 'TIFF')
 
-    # Then let PIL convert to a png file
-    img = Image.open(file_name + '.ps')
-    img.save(f"{file_name}.png", 'png')
+def get_recording_rows(df, recording_ranges, recording_name):
+    """
+    Return the rows of a single recording as an O(1) positional slice
+    """
+
+    start, stop = recording_ranges.get(recording_name, (0, 0))
+    return df.iloc[start:stop]
 
 
-def test_if_square_is_in_rectangle(x0, y0, x1, y1, xr0, yr0, xr1, yr1):
+def update_recording_rows(df, recording_ranges, recording_name, df_update):
     """
-    Test if the square is in the rectangle specified by the user.
-    Note these are different unit systems
-    The coordinates from the squares are in micrometers
-    The coordinates from the rectangle are in pixels
-    One or the other needs to be converted before you can compare
-    :param x0:
-    :param y0:
-    :param x1:
-    :param y1:
-    :param xr0:
-    :param yr0:
-    :param xr1:
-    :param yr1:
-    :return:
+    The equivalent of df.update(df_update), but restricted to the rows of a single recording.
+    Only the columns present in both dataframes are written back.
     """
 
-    # Convert square coordinates from micrometers to pixels
-    x0, y0, x1, y1 = [coord / 82.0864 * 512 for coord in [x0, y0, x1, y1]]
+    start, stop = recording_ranges.get(recording_name, (0, 0))
+    if start == stop:
+        return
+    df_recording = df.iloc[start:stop].copy()
+    df_recording.update(df_update)
+    for column in df_update.columns:
+        if column in df.columns:
+            df.iloc[start:stop, df.columns.get_loc(column)] = df_recording[column].to_numpy()
 
-    # Determine if the square is within the rectangle
-    if xr0 < xr1 and yr0 < yr1:
-        return x0 >= xr0 and x1 <= xr1 and y0 >= yr0 and y1 <= yr1
-    elif xr0 < xr1 and yr0 > yr1:
-        return x0 >= xr0 and x1 <= xr1 and y0 >= yr1 and y1 <= yr0
-    elif xr0 > xr1 and yr0 > yr1:
-        return x0 >= xr1 and x1 <= xr0 and y0 >= yr1 and y1 <= yr0
-    elif xr0 > xr1 and yr0 < yr1:
-        return x0 >= xr1 and x1 <= xr0 and y0 >= yr0 and y1 <= yr1
 
-    return False
+def labels_changed(old_labels, new_labels):
+    """
+    Check if any of the labels differs, treating missing labels as equal
+    :param old_labels: The current labels, a series indexed like new_labels
+    :param new_labels: The new labels
+    :return: True if at least one label changed
+    """
+
+    old = pd.to_numeric(old_labels, errors='coerce').to_numpy(dtype=float)
+    new = pd.to_numeric(new_labels.reindex(old_labels.index), errors='coerce').to_numpy(dtype=float)
+    return not np.array_equal(old, new, equal_nan=True)
 
 
 def only_one_nr_of_squares_in_row(directory):
@@ -2,9 +2,14 @@
 # There are two ways to run the select squares files, either by calling  select_squares_with_parameters or by calling
 # select_squares.
 #
-# Both functions call select_squares_actual which is the main function that selects squares based on defined conditions
+# select_squares_with_parameters calls select_squares_actual, which evaluates the conditions on the dataframe.
+# select_squares, used by the Recording Viewer, evaluates them with the ThresholdIndex of the recording.
+# Both then apply the neighbour rules.
 # -------------------------------------------------------------------------------------------------------------
 
+from src.Application.Recording_Viewer.Threshold_Index import ThresholdIndex
+
+
 def select_squares_with_parameters(df_squares, select_parameters, nr_of_squares_in_row, only_valid_tau):
     """
     Wrapper function to select squares based on defined conditions for density, variability, and track duration,
@@ -27,18 +32,51 @@ def select_squares(self, only_valid_tau=True):
     """
     Wrapper function to select squares based on defined conditions for density, variability, and track duration,
     No need to pass on individual parameters.
+    The thresholds are evaluated with the (cached) threshold index of the recording.
     """
 
-    _select_squares_actual(
-        self.df_squares,
+    selected = get_threshold_index(self).select(
         self.min_required_density_ratio,
         self.max_allowable_variability,
         self.min_track_duration,
         self.max_track_duration,
         self.min_allowable_r_squared,
-        self.neighbour_mode,
-        self.nr_of_squares_in_row,
         only_valid_tau=only_valid_tau)
+    self.df_squares['Selected'] = selected
+    _apply_neighbour_mode(self.df_squares, self.neighbour_mode, self.nr_of_squares_in_row)
+
+
+def count_selected_squares(self, min_required_density_ratio, max_allowable_variability, min_track_duration,
+                           max_track_duration, min_allowable_r_squared, neighbour_mode, only_valid_tau=True):
+    """
+    Return the number of squares of the current recording that would be selected with these values, after the
+    neighbour rules. The squares of the recording are not changed.
+    """
+
+    threshold_index = get_threshold_index(self)
+    if neighbour_mode == 'Free':
+        return threshold_index.count(min_required_density_ratio, max_allowable_variability, min_track_duration,
+                                     max_track_duration, min_allowable_r_squared, only_valid_tau=only_valid_tau)
+
+    # The neighbour rules are applied to a copy with just the grid positions
+    df_squares = self.df_squares[['Square Nr', 'Row Nr', 'Col Nr']].copy()
+    df_squares['Selected'] = threshold_index.select(
+        min_required_density_ratio, max_allowable_variability, min_track_duration, max_track_duration,
+        min_allowable_r_squared, only_valid_tau=only_valid_tau)
+    _apply_neighbour_mode(df_squares, neighbour_mode, self.nr_of_squares_in_row)
+    return int(df_squares['Selected'].sum())
+
+
+def get_threshold_index(self):
+    """
+    Return the threshold index of the current recording, building it the first time the recording is shown
+    """
+
+    threshold_index = self.threshold_indexes.get(self.image_name)
+    if threshold_index is None or not threshold_index.matches(self.df_squares):
+        threshold_index = ThresholdIndex(self.df_squares)
+        self.threshold_indexes[self.image_name] = threshold_index
+    return threshold_index
 
 
 def _select_squares_actual(
@@ -71,6 +109,14 @@ def _select_squares_actual(
         )
 
     # Eliminate isolated squares based on neighborhood rules
+    _apply_neighbour_mode(df_squares, neighbour_mode, nr_of_squares_in_row)
+
+
+def _apply_neighbour_mode(df_squares, neighbour_mode, nr_of_squares_in_row):
+    """
+    Deselect the squares that do not satisfy the neighbour rules
+    """
+
     df_squares.set_index('Square Nr', inplace=True, drop=False)
     if neighbour_mode == 'Free':
         pass
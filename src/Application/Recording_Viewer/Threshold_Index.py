@@ -0,0 +1,92 @@
+import numpy as np
+
+# The threshold columns with the direction of the test: squares pass if their value is >= (min) or <= (max)
+THRESHOLD_COLUMNS = {
+    'Density Ratio': 'min',
+    'Variability': 'max',
+    'Max Track Duration': 'range',
+    'R Squared': 'min'}
+
+
+class ThresholdIndex:
+    """
+    A selection index for the squares of one recording.
+    For every threshold column the values are sorted once, so the squares that pass a threshold are found with a
+    binary search. The sets of passing squares are kept as boolean masks (bitsets) and intersected.
+    The threshold columns are not changed in the viewer, so the index stays valid for the recording.
+    """
+
+    def __init__(self, df_squares):
+        self.square_nrs = df_squares['Square Nr'].to_numpy()
+        self.nr_of_squares = len(self.square_nrs)
+        self.valid_tau = (df_squares['Tau'] > 0).to_numpy() if 'Tau' in df_squares.columns else \
+            np.ones(self.nr_of_squares, dtype=bool)
+
+        # Per column: the finite values in ascending order and the positions of those squares
+        self.sorted_values = {}
+        self.sorted_positions = {}
+        for column in THRESHOLD_COLUMNS:
+            values = df_squares[column].to_numpy(dtype=float)
+            positions = np.flatnonzero(~np.isnan(values))
+            order = np.argsort(values[positions], kind='stable')
+            self.sorted_positions[column] = positions[order]
+            self.sorted_values[column] = values[positions[order]]
+
+    def matches(self, df_squares):
+        """
+        Check that the index was built for these squares, in this order
+        """
+
+        return (len(df_squares) == self.nr_of_squares and
+                np.array_equal(df_squares['Square Nr'].to_numpy(), self.square_nrs))
+
+    def _at_least(self, column, threshold):
+        mask = np.zeros(self.nr_of_squares, dtype=bool)
+        start = np.searchsorted(self.sorted_values[column], threshold, side='left')
+        mask[self.sorted_positions[column][start:]] = True
+        return mask
+
+    def _at_most(self, column, threshold):
+        mask = np.zeros(self.nr_of_squares, dtype=bool)
+        stop = np.searchsorted(self.sorted_values[column], threshold, side='right')
+        mask[self.sorted_positions[column][:stop]] = True
+        return mask
+
+    def _between(self, column, low, high):
+        mask = np.zeros(self.nr_of_squares, dtype=bool)
+        start = np.searchsorted(self.sorted_values[column], low, side='left')
+        stop = np.searchsorted(self.sorted_values[column], high, side='right')
+        if start < stop:
+            mask[self.sorted_positions[column][start:stop]] = True
+        return mask
+
+    def _masks(self, min_required_density_ratio, max_allowable_variability, min_track_duration, max_track_duration,
+               min_allowable_r_squared):
+        return {
+            'Density Ratio': self._at_least('Density Ratio', min_required_density_ratio),
+            'Variability': self._at_most('Variability', max_allowable_variability),
+            'Max Track Duration': self._between('Max Track Duration', min_track_duration, max_track_duration),
+            'R Squared': self._at_least('R Squared', min_allowable_r_squared)}
+
+    def select(self, min_required_density_ratio, max_allowable_variability, min_track_duration, max_track_duration,
+               min_allowable_r_squared, only_valid_tau=True):
+        """
+        Return a boolean mask, in the order of the squares the index was built from, of the squares that pass all
+        thresholds. The neighbour rules are not applied here.
+        """
+
+        selected = self.valid_tau.copy() if only_valid_tau else np.ones(self.nr_of_squares, dtype=bool)
+        for mask in self._masks(min_required_density_ratio, max_allowable_variability, min_track_duration,
+                                max_track_duration, min_allowable_r_squared).values():
+            selected &= mask
+        return selected
+
+    def count(self, min_required_density_ratio, max_allowable_variability, min_track_duration, max_track_duration,
+              min_allowable_r_squared, only_valid_tau=True):
+        """
+        Return the number of squares that pass all thresholds
+        """
+
+        return int(np.count_nonzero(self.select(
+            min_required_density_ratio, max_allowable_variability, min_track_duration, max_track_duration,
+            min_allowable_r_squared, only_valid_tau)))
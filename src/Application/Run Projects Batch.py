@@ -9,7 +9,9 @@ from src.Application.Compile_Project.Compile_Project import compile_project_outp
 from src.Application.Compile_Project.Copy_TM_Data_From_Source import copy_tm_data_from_paint_source_with_images
 from src.Application.Generate_Squares.Generate_Squares import process_project
 from src.Application.Generate_Squares.Generate_Squares_Support_Functions import pack_select_parameters
-from src.Application.Utilities.General_Support_Functions import format_time_nicely
+from src.Application.Utilities.General_Support_Functions import (
+    format_time_nicely,
+    set_pandas_options)
 from src.Application.Utilities.Set_Directory_Tree_Timestamp import (
     set_directory_tree_timestamp,
     get_timestamp_from_string)
@@ -125,6 +127,8 @@ def process_json_configuration_block(paint_source_dir,
 
 
 def main():
+    set_pandas_options()
+
     # Load the configuration file
 
     conf_file = '../Config/Process Project.json'
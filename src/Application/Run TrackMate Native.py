@@ -0,0 +1,44 @@
+import argparse
+import sys
+
+from src.Application.TrackMate_Coordinator.TrackMate_Coordinator import read_batch_file
+from src.Application.TrackMate_Native.TrackMate_Native import run_trackmate_native
+from src.Application.Utilities.General_Support_Functions import set_pandas_options
+from src.Fiji.LoggerConfig import (
+    paint_logger,
+    paint_logger_change_file_handler_name)
+
+paint_logger_change_file_handler_name('Run TrackMate Native.log')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Detect and track the spots in the recordings of one experiment, or of the experiments in a '
+                    'batch file, without Fiji')
+    parser.add_argument('--batch-file', help='A Run TrackMate Batch file with Source, Destination and Process')
+    parser.add_argument('--images-directory', help='The directory with the recordings of a single experiment')
+    parser.add_argument('--experiment-directory', help='The directory with the Experiment Info file')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='The number of processes (default: number of CPUs)')
+    args = parser.parse_args()
+    set_pandas_options()
+
+    if args.batch_file:
+        experiments = read_batch_file(args.batch_file)
+    elif args.images_directory and args.experiment_directory:
+        experiments = [{'Recording Source Directory': args.images_directory,
+                        'Experiment Directory': args.experiment_directory}]
+    else:
+        parser.error('Specify a batch file, or an images and an experiment directory')
+        return
+
+    if not experiments:
+        paint_logger.error("No experiments to process")
+        sys.exit(1)
+
+    if not run_trackmate_native(experiments, args.workers):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
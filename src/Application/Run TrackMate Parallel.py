@@ -0,0 +1,50 @@
+import argparse
+import sys
+
+from src.Application.TrackMate_Coordinator.TrackMate_Coordinator import (
+    run_trackmate_parallel,
+    read_batch_file,
+    DEFAULT_THREADS_PER_WORKER,
+    DEFAULT_RECORDINGS_PER_JOB)
+from src.Fiji.LoggerConfig import (
+    paint_logger,
+    paint_logger_change_file_handler_name)
+
+paint_logger_change_file_handler_name('Run TrackMate Parallel.log')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run TrackMate on the recordings of one experiment, or of the experiments in a batch file, '
+                    'with several headless Fiji workers')
+    parser.add_argument('--batch-file', help='A Run TrackMate Batch file with Source, Destination and Process')
+    parser.add_argument('--images-directory', help='The directory with the recordings of a single experiment')
+    parser.add_argument('--experiment-directory', help='The directory with the Experiment Info file')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='The number of Fiji processes (default: number of CPUs / threads)')
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS_PER_WORKER,
+                        help='The number of TrackMate threads per Fiji process')
+    parser.add_argument('--recordings-per-job', type=int, default=DEFAULT_RECORDINGS_PER_JOB,
+                        help='The number of recordings a worker processes in one Fiji run')
+    parser.add_argument('--fiji', default=None, help="The Fiji.app directory (default: 'Fiji Path' in Paint.json)")
+    args = parser.parse_args()
+
+    if args.batch_file:
+        experiments = read_batch_file(args.batch_file)
+    elif args.images_directory and args.experiment_directory:
+        experiments = [{'Recording Source Directory': args.images_directory,
+                        'Experiment Directory': args.experiment_directory}]
+    else:
+        parser.error('Specify a batch file, or an images and an experiment directory')
+        return
+
+    if not experiments:
+        paint_logger.error("No experiments to process")
+        sys.exit(1)
+
+    if not run_trackmate_parallel(experiments, args.workers, args.threads, args.recordings_per_job, args.fiji):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
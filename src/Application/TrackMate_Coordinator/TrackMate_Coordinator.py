@@ -0,0 +1,328 @@
+"""
+Run TrackMate on many recordings at the same time, with several headless Fiji worker processes.
+
+The coordinator splits the recordings to process of one or more experiments into jobs of a few recordings. A pool of
+N workers takes the jobs from the queue; each worker is a headless Fiji running Run_TrackMate.py in job mode, with a
+bounded number of TrackMate threads. When all jobs of an experiment are done, the coordinator writes its
+All Recordings and All Tracks files, in Experiment Info order, and converts the bright field images.
+The Fiji-free backend in TrackMate_Native completes its experiments with the same functions.
+"""
+
+import csv
+import math
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from src.Application.Process_Projects.Convert_BF_from_nd2_to_jpg import convert_bf_images
+from src.Application.Utilities.General_Support_Functions import format_time_nicely
+from src.Application.Utilities.Thumbnails import make_thumbnails_for_directory
+from src.Fiji.DirectoriesAndLocations import (
+    get_experiment_info_file_path,
+    get_experiment_tm_file_path)
+from src.Fiji.LoggerConfig import paint_logger
+from src.Fiji.PaintConfig import get_paint_attribute
+
+# The columns Run TrackMate adds to those of the Experiment Info file, as in Run_TrackMate.py
+TRACKMATE_COLUMNS = ['Nr Spots', 'Nr Tracks', 'Run Time', 'Ext Recording Name', 'Recording Size', 'Time Stamp',
+                     'Frame Interval']
+
+DEFAULT_THREADS_PER_WORKER = 2
+DEFAULT_RECORDINGS_PER_JOB = 4
+
+
+def get_fiji_executable(fiji_app):
+    """
+    Determine the Fiji launcher in the Fiji installation
+    :param fiji_app: The Fiji.app directory
+    :return: The path of the launcher
+    """
+
+    if platform.system() == "Darwin":
+        return os.path.join(fiji_app, 'Contents', 'MacOS', 'ImageJ-macosx')
+    elif platform.system() == "Windows":
+        return os.path.join(fiji_app, 'ImageJ-win64.exe')
+    else:
+        return os.path.join(fiji_app, 'ImageJ-linux64')
+
+
+def get_worker_script(fiji_app):
+    """
+    The Run_TrackMate.py script as installed in Fiji by 'Install Paint TrackMate'
+    """
+
+    return os.path.join(fiji_app, 'Plugins', 'GlycoPaint', 'Run_TrackMate.py')
+
+
+def make_jobs(experiment_nr, recording_source_directory, experiment_directory, jobs_directory, recordings_per_job):
+    """
+    Split the recordings to process of an experiment into jobs
+    :param experiment_nr: A sequence number of the experiment, to give the job files unique names
+    :param recording_source_directory: The directory with the recordings
+    :param experiment_directory: The experiment directory with the Experiment Info file
+    :param jobs_directory: The directory where the job and status files are written
+    :param recordings_per_job: The maximum number of recordings in a job
+    :return: A tuple with the Experiment Info column names, all Experiment Info rows and the list of jobs
+    """
+
+    with open(get_experiment_info_file_path(experiment_directory), mode='r') as experiment_info_file:
+        csv_reader = csv.DictReader(experiment_info_file)
+        fieldnames = csv_reader.fieldnames
+        rows = list(csv_reader)
+
+    rows_to_process = [row for row in rows if 'y' in row['Process'].lower()]
+    nr_of_jobs = math.ceil(len(rows_to_process) / recordings_per_job)
+
+    jobs = []
+    for job_nr in range(nr_of_jobs):
+        job_rows = rows_to_process[job_nr * recordings_per_job:(job_nr + 1) * recordings_per_job]
+        job_name = f"Run TrackMate Job {experiment_nr}-{job_nr + 1}"
+        job_file_path = os.path.join(jobs_directory, job_name + '.csv')
+        with open(job_file_path, mode='w', newline='') as job_file:
+            writer = csv.DictWriter(job_file, fieldnames)
+            writer.writeheader()
+            writer.writerows(job_rows)
+        jobs.append({
+            'Job Name': job_name,
+            'Job File': job_file_path,
+            'Status File': os.path.join(jobs_directory, job_name + ' Status.csv'),
+            'Log File': os.path.join(jobs_directory, job_name + ' Output.log'),
+            'Recording Source Directory': recording_source_directory,
+            'Experiment Directory': experiment_directory,
+            'Nr Recordings': len(job_rows)})
+    return fieldnames, rows, jobs
+
+
+def run_worker(job, fiji_executable, worker_script, nr_threads):
+    """
+    Run one job in a headless Fiji process and wait for it to finish
+    :return: The return code of the Fiji process
+    """
+
+    command = [fiji_executable, '--headless', '--console', worker_script,
+               '--images-directory', job['Recording Source Directory'],
+               '--experiment-directory', job['Experiment Directory'],
+               '--job-file', job['Job File'],
+               '--status-file', job['Status File'],
+               '--threads', str(nr_threads)]
+    with open(job['Log File'], 'w') as log_file:
+        result = subprocess.run(command, stdout=log_file, stderr=subprocess.STDOUT)
+    return result.returncode
+
+
+def read_job_results(jobs):
+    """
+    Read the status files of the jobs of an experiment
+    :return: A dictionary with, per Recording Name, the result rows (one per threshold)
+    """
+
+    results = {}
+    for job in jobs:
+        if not os.path.isfile(job['Status File']):
+            continue
+        with open(job['Status File'], mode='r') as status_file:
+            for row in csv.DictReader(status_file):
+                results.setdefault(row['Recording Name'], []).append(row)
+    return results
+
+
+def concatenate_recording_files(experiment_directory, keywords, output_file_name, create_empty=True):
+    """
+    Concatenate the tracks (or spots) files of the recordings and remove them, as Run_TrackMate.py does
+    """
+
+    matching_files = sorted(
+        os.path.join(experiment_directory, filename) for filename in os.listdir(experiment_directory)
+        if filename.endswith('.csv') and all(keyword in filename.lower() for keyword in keywords))
+    if not matching_files and not create_empty:
+        return
+
+    with open(os.path.join(experiment_directory, output_file_name), 'w', newline='') as outfile:
+        writer = None
+        for filename in matching_files:
+            with open(filename, 'r') as infile:
+                reader = csv.reader(infile)
+                header = next(reader)
+                if writer is None:
+                    writer = csv.writer(outfile)
+                    writer.writerow(header)
+                writer.writerows(reader)
+
+    for filename in matching_files:
+        os.remove(filename)
+
+
+def complete_experiment(experiment, fieldnames, rows, jobs):
+    """
+    Write All Recordings and All Tracks of an experiment when all its jobs are done and convert the BF images
+    :return: The number of recordings that were processed successfully
+    """
+
+    return write_experiment_results(experiment, fieldnames, rows, read_job_results(jobs))
+
+
+def write_experiment_results(experiment, fieldnames, rows, results):
+    """
+    Write All Recordings, in Experiment Info order, and All Tracks and All Spots of an experiment from the results of
+    its recordings, make the thumbnails of the TrackMate images and convert the BF images
+    :param results: A dictionary with, per Recording Name, the result rows (one per threshold)
+    :return: The number of recordings that were processed successfully
+    """
+
+    nr_processed = nr_failed = 0
+    with open(get_experiment_tm_file_path(experiment['Experiment Directory']), mode='w', newline='') as tm_file:
+        writer = csv.DictWriter(tm_file, fieldnames + TRACKMATE_COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            if 'y' not in row['Process'].lower():
+                writer.writerow(row)
+                continue
+
+            result_rows = results.get(row['Recording Name'])
+            if not result_rows:
+                # The worker died before it reported on this recording
+                paint_logger.error(f"No TrackMate results for recording {row['Recording Name']}")
+                nr_failed += 1
+                writer.writerow(row)
+                continue
+
+            if all(str(result_row.get('Nr Spots', '')) not in ('', '-1') for result_row in result_rows):
+                nr_processed += 1
+            else:
+                nr_failed += 1
+            writer.writerows(result_rows)
+
+    concatenate_recording_files(experiment['Experiment Directory'], ["threshold", "track"], "All Tracks.csv")
+    concatenate_recording_files(experiment['Experiment Directory'], ["threshold", "spots"], "All Spots.csv",
+                                create_empty=False)
+    make_thumbnails_for_directory(os.path.join(experiment['Experiment Directory'], 'TrackMate Images'))
+    convert_bf_images(experiment['Recording Source Directory'], experiment['Experiment Directory'], force=True)
+
+    paint_logger.info(f"Experiment {experiment['Experiment Directory']}: {nr_processed} recordings processed, "
+                      f"{nr_failed} not found or failed")
+    return nr_processed
+
+
+def prepare_trackmate_images_directory(experiment_directory):
+    image_dir = os.path.join(experiment_directory, 'TrackMate Images')
+    if not os.path.exists(image_dir):
+        os.mkdir(image_dir)
+    else:
+        for filename in os.listdir(image_dir):
+            file_path = os.path.join(image_dir, filename)
+            if os.path.isfile(file_path):
+                os.remove(file_path)
+
+
+def run_trackmate_parallel(experiments, nr_workers=None, nr_threads=DEFAULT_THREADS_PER_WORKER,
+                           recordings_per_job=DEFAULT_RECORDINGS_PER_JOB, fiji_app=None):
+    """
+    Run TrackMate on the recordings of the experiments with a pool of headless Fiji workers
+    :param experiments: A list of dictionaries with 'Recording Source Directory' and 'Experiment Directory'
+    :param nr_workers: The number of Fiji processes, by default the number of CPUs divided by nr_threads
+    :param nr_threads: The number of TrackMate threads in each Fiji process
+    :param recordings_per_job: The maximum number of recordings a worker processes in one Fiji run
+    :param fiji_app: The Fiji.app directory, by default the 'Fiji Path' of the Paint configuration
+    :return: True if all jobs completed
+    """
+
+    fiji_app = fiji_app or get_paint_attribute('Paint', 'Fiji Path')
+    fiji_executable = get_fiji_executable(fiji_app)
+    worker_script = get_worker_script(fiji_app)
+    for path in (fiji_executable, worker_script):
+        if not os.path.isfile(path):
+            paint_logger.error(f"Fiji file {path} not found. Is 'Fiji Path' set and Paint TrackMate installed?")
+            return False
+
+    if nr_workers is None:
+        nr_workers = max(1, (os.cpu_count() or 1) // nr_threads)
+
+    time_stamp = time.time()
+    jobs_directory = tempfile.mkdtemp(prefix='Paint TrackMate Jobs ')
+
+    # Prepare all experiments first, so jobs of different experiments can run side by side
+    experiment_jobs = []
+    all_jobs = []
+    for experiment_nr, experiment in enumerate(experiments):
+        experiment_directory = experiment['Experiment Directory']
+        if not os.path.isfile(get_experiment_info_file_path(experiment_directory)):
+            paint_logger.error(f"The file '{get_experiment_info_file_path(experiment_directory)}' does not exist.")
+            continue
+        prepare_trackmate_images_directory(experiment_directory)
+        fieldnames, rows, jobs = make_jobs(experiment_nr + 1, experiment['Recording Source Directory'],
+                                           experiment_directory, jobs_directory, recordings_per_job)
+        if not jobs:
+            paint_logger.warning(f"No recordings selected for processing in {experiment_directory}")
+            continue
+        experiment_jobs.append((experiment, fieldnames, rows, jobs))
+        all_jobs.extend(jobs)
+
+    nr_recordings = sum(job['Nr Recordings'] for job in all_jobs)
+    paint_logger.info(f"Processing {nr_recordings} recordings in {len(all_jobs)} jobs with {nr_workers} Fiji "
+                      f"workers of {nr_threads} threads each")
+
+    # Complete an experiment as soon as its last job is done
+    remaining = {id(jobs): len(jobs) for _, _, _, jobs in experiment_jobs}
+    job_experiment = {job['Job File']: entry for entry in experiment_jobs for job in entry[3]}
+    all_completed = True
+
+    with ThreadPoolExecutor(max_workers=nr_workers) as executor:
+        futures = {executor.submit(run_worker, job, fiji_executable, worker_script, nr_threads): job
+                   for job in all_jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                return_code = future.result()
+            except Exception as e:
+                return_code = -1
+                paint_logger.error(f"{job['Job Name']} could not be started: {e}")
+            if return_code != 0:
+                all_completed = False
+                paint_logger.error(f"{job['Job Name']} ended with return code {return_code}, see {job['Log File']}")
+            else:
+                paint_logger.info(f"{job['Job Name']} completed ({job['Nr Recordings']} recordings)")
+
+            experiment, fieldnames, rows, jobs = job_experiment[job['Job File']]
+            remaining[id(jobs)] -= 1
+            if remaining[id(jobs)] == 0:
+                complete_experiment(experiment, fieldnames, rows, jobs)
+
+    if all_completed:
+        shutil.rmtree(jobs_directory, ignore_errors=True)
+    else:
+        paint_logger.warning(f"The job files and worker output are kept in {jobs_directory}")
+
+    run_time = round(time.time() - time_stamp, 1)
+    paint_logger.info(f"Processing completed in {format_time_nicely(run_time)}.")
+    return all_completed
+
+
+def read_batch_file(batch_file_path):
+    """
+    Read the experiments to process from a Run TrackMate Batch file, with the same interpretation of the
+    Source, Destination and Image columns as Run_TrackMate_Batch.py
+    :return: The list of experiments
+    """
+
+    experiments = []
+    with open(batch_file_path, mode='r') as batch_file:
+        csv_reader = csv.DictReader(batch_file)
+        required_columns = ['Source', 'Destination', 'Process']
+        if not all(col in csv_reader.fieldnames for col in required_columns):
+            paint_logger.error(f"Error: Missing one or more required columns: {required_columns}")
+            return experiments
+        for row in csv_reader:
+            if 'y' not in row['Process'].lower():
+                continue
+            experiment_directory = os.path.join(row['Source'], row['Image'])
+            recording_source_directory = os.path.join(row['Destination'], row['Image'])
+            if not os.path.exists(experiment_directory) or not os.path.exists(recording_source_directory):
+                paint_logger.error(f"Error: The directories of '{row['Image']}' do not exist.")
+                continue
+            experiments.append({'Recording Source Directory': recording_source_directory,
+                                'Experiment Directory': experiment_directory})
+    return experiments
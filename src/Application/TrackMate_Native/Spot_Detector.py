@@ -0,0 +1,115 @@
+"""
+Laplacian of Gaussian spot detection, following the TrackMate LoG detector.
+
+The frame is optionally median filtered (3x3), filtered with a LoG kernel of sigma = radius / sqrt(2) pixels and
+scaled by sigma^2, so that the quality of a spot is the height of the negated, scale normalised LoG response.
+Spots are the local maxima (3x3 neighbourhood) with a quality above the threshold.
+
+TrackMate calculates the LoG in the Fourier domain with its own normalisation, so the quality values are close to, but
+not exactly the same as, those of TrackMate. Use the validation harness to check a threshold before relying on it.
+"""
+
+import numpy as np
+from scipy import ndimage
+
+SPOT_COLUMNS = ['Frame', 'X', 'Y', 'Quality']
+
+
+def get_log_sigma(radius, pixel_size):
+    """
+    The sigma of the LoG filter, in pixels, for spots of the specified radius in a 2D image
+    :param radius: The expected spot radius, in micrometer
+    :param pixel_size: The pixel size, in micrometer
+    :return: The sigma in pixels
+    """
+
+    return radius / pixel_size / np.sqrt(2)
+
+
+def filter_frame(frame, sigma, do_median_filtering=False):
+    """
+    Calculate the spot quality image of a frame
+    :return: The negated, scale normalised LoG response, as float32
+    """
+
+    frame = np.asarray(frame, dtype=np.float32)
+    if do_median_filtering:
+        frame = ndimage.median_filter(frame, size=3)
+    return -ndimage.gaussian_laplace(frame, sigma) * (sigma * sigma)
+
+
+def refine_subpixel(quality_image, rows, columns):
+    """
+    Refine the position of the maxima by fitting a parabola through the maximum and its two neighbours, per axis
+    :return: A tuple with the refined rows and columns (float)
+    """
+
+    max_row, max_column = quality_image.shape[0] - 1, quality_image.shape[1] - 1
+    rows = rows.astype(float)
+    columns = columns.astype(float)
+    inner = (rows > 0) & (rows < max_row) & (columns > 0) & (columns < max_column)
+    r = rows[inner].astype(int)
+    c = columns[inner].astype(int)
+
+    centre = quality_image[r, c]
+    for positions, before, after in ((rows, quality_image[r - 1, c], quality_image[r + 1, c]),
+                                     (columns, quality_image[r, c - 1], quality_image[r, c + 1])):
+        curvature = before - 2 * centre + after
+        offset = np.divide(before - after, 2 * curvature, out=np.zeros_like(curvature), where=curvature < 0)
+        positions[inner] += np.clip(offset, -0.5, 0.5)
+    return rows, columns
+
+
+def detect_spots_in_frame(frame, sigma, threshold, do_median_filtering=False, do_subpixel_localization=False):
+    """
+    Detect the spots in a single frame
+    :param frame: The 2D image
+    :param sigma: The LoG sigma, in pixels
+    :param threshold: Only maxima with a quality above the threshold are spots
+    :return: A tuple with the row, column (pixels) and quality arrays of the spots
+    """
+
+    quality_image = filter_frame(frame, sigma, do_median_filtering)
+    local_max = ndimage.maximum_filter(quality_image, size=3, mode='nearest') == quality_image
+    rows, columns = np.nonzero(local_max & (quality_image > threshold))
+    quality = quality_image[rows, columns]
+    if do_subpixel_localization:
+        rows, columns = refine_subpixel(quality_image, rows, columns)
+    return rows, columns, quality
+
+
+def detect_spots(frames, pixel_size, radius, threshold, do_median_filtering=False, do_subpixel_localization=False):
+    """
+    Detect the spots in all frames of a recording
+    :param frames: An iterable of 2D frames
+    :param pixel_size: The pixel size, in micrometer
+    :param radius: The expected spot radius, in micrometer
+    :param threshold: The quality threshold
+    :return: A dictionary with the 'Frame', 'X', 'Y' (micrometer) and 'Quality' arrays of the spots, ordered on frame
+    """
+
+    sigma = get_log_sigma(radius, pixel_size)
+    frame_nrs, xs, ys, qualities = [], [], [], []
+    for frame_nr, frame in enumerate(frames):
+        rows, columns, quality = detect_spots_in_frame(
+            frame, sigma, threshold, do_median_filtering, do_subpixel_localization)
+        frame_nrs.append(np.full(len(quality), frame_nr, dtype=np.int64))
+        xs.append(columns * pixel_size)
+        ys.append(rows * pixel_size)
+        qualities.append(quality)
+
+    if not frame_nrs:
+        return {column: np.empty(0) for column in SPOT_COLUMNS}
+    return {'Frame': np.concatenate(frame_nrs),
+            'X': np.concatenate(xs).astype(float),
+            'Y': np.concatenate(ys).astype(float),
+            'Quality': np.concatenate(qualities).astype(float)}
+
+
+def select_spots(spots, threshold):
+    """
+    The spots with a quality above a (higher) threshold, for threshold sweeps with a single detection
+    """
+
+    keep = spots['Quality'] > threshold
+    return {column: values[keep] for column, values in spots.items()}
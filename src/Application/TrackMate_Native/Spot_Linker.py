@@ -0,0 +1,210 @@
+"""
+Linking of spots into tracks with a sparse LAP tracker, following the TrackMate SparseLAPTracker (Jaqaman et al.).
+
+Linking is done in two steps:
+- Frame to frame: the spots of consecutive frames are linked within LINKING_MAX_DISTANCE, with the squared distance
+  as cost. The alternative (no link) cost is ALTERNATIVE_LINKING_COST_FACTOR times the highest cost of the frame pair.
+  This gives track segments.
+- Gap closing: the end of a segment is linked to the start of a segment that starts at most MAX_FRAME_GAP frames
+  later, within GAP_CLOSING_MAX_DISTANCE. The alternative cost is ALTERNATIVE_LINKING_COST_FACTOR times the
+  CUTOFF_PERCENTILE percentile of the costs.
+Track splitting and merging are not supported; Paint runs TrackMate with both disabled.
+
+Each LAP is sparse: only pairs within the maximum distance are candidates. The candidate graph is split into its
+connected components and every component is solved as a small dense assignment problem.
+"""
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+
+def solve_sparse_lap(sources, targets, costs, nr_sources, nr_targets, alternative_cost):
+    """
+    Solve the linking LAP for candidate links between sources and targets
+    :param sources: The source index of every candidate link
+    :param targets: The target index of every candidate link
+    :param costs: The cost of every candidate link
+    :param alternative_cost: The cost of not linking a source, or a target
+    :return: A tuple with the source and target indexes of the links in the solution
+    """
+
+    if len(costs) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    # Split the bipartite candidate graph in independent sub problems
+    nr_nodes = nr_sources + nr_targets
+    graph = coo_matrix((np.ones(len(costs)), (sources, nr_sources + targets)), shape=(nr_nodes, nr_nodes))
+    _, labels = connected_components(graph, directed=False)
+    edge_components = labels[sources]
+    order = np.argsort(edge_components, kind='stable')
+    boundaries = np.flatnonzero(np.diff(edge_components[order])) + 1
+
+    linked_sources, linked_targets = [], []
+    for edges in np.split(order, boundaries):
+        component_sources, source_index = np.unique(sources[edges], return_inverse=True)
+        component_targets, target_index = np.unique(targets[edges], return_inverse=True)
+        component_costs = costs[edges]
+        m, k = len(component_sources), len(component_targets)
+
+        # The augmented cost matrix of Jaqaman et al.: links top left, no-link alternatives on the diagonals of the
+        # top right and bottom left blocks and the transposed links, at the lowest cost, bottom right
+        cost_matrix = np.full((m + k, k + m), np.inf)
+        cost_matrix[source_index, target_index] = component_costs
+        cost_matrix[np.arange(m), k + np.arange(m)] = alternative_cost
+        cost_matrix[m + np.arange(k), np.arange(k)] = alternative_cost
+        cost_matrix[m + target_index, k + source_index] = component_costs.min()
+
+        rows, columns = linear_sum_assignment(cost_matrix)
+        links = (rows < m) & (columns < k)
+        linked_sources.append(component_sources[rows[links]])
+        linked_targets.append(component_targets[columns[links]])
+
+    return np.concatenate(linked_sources), np.concatenate(linked_targets)
+
+
+def find_candidate_links(source_positions, target_positions, max_distance):
+    """
+    The pairs of sources and targets within the maximum distance
+    :return: A tuple with the source indexes, target indexes and squared distances of the pairs
+    """
+
+    if len(source_positions) == 0 or len(target_positions) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+    pairs = cKDTree(source_positions).sparse_distance_matrix(
+        cKDTree(target_positions), max_distance, output_type='ndarray')
+    return pairs['i'].astype(np.int64), pairs['j'].astype(np.int64), pairs['v'] ** 2
+
+
+def link_frame_to_frame(frames, positions, linking_max_distance, alternative_cost_factor):
+    """
+    Link the spots of consecutive frames
+    :param frames: The frame of every spot, sorted
+    :param positions: The (x, y) position of every spot
+    :return: The index of the next spot in the segment for every spot, -1 if there is none
+    """
+
+    next_spot = np.full(len(frames), -1, dtype=np.int64)
+    frame_nrs, frame_starts = np.unique(frames, return_index=True)
+    frame_ends = np.r_[frame_starts[1:], len(frames)]
+
+    for i in range(len(frame_nrs) - 1):
+        if frame_nrs[i + 1] != frame_nrs[i] + 1:
+            continue
+        source_offset, target_offset = frame_starts[i], frame_starts[i + 1]
+        sources, targets, costs = find_candidate_links(
+            positions[source_offset:frame_ends[i]], positions[target_offset:frame_ends[i + 1]], linking_max_distance)
+        if len(costs) == 0:
+            continue
+        linked_sources, linked_targets = solve_sparse_lap(
+            sources, targets, costs, frame_ends[i] - source_offset, frame_ends[i + 1] - target_offset,
+            alternative_cost_factor * costs.max())
+        next_spot[source_offset + linked_sources] = target_offset + linked_targets
+
+    return next_spot
+
+
+def get_segments(next_spot):
+    """
+    Number the segments formed by the frame to frame links, in the order of the first spot
+    :return: A tuple with the segment of every spot, and the first and last spot of every segment
+    """
+
+    nr_spots = len(next_spot)
+    has_previous = np.zeros(nr_spots, dtype=bool)
+    has_previous[next_spot[next_spot >= 0]] = True
+
+    segment = np.full(nr_spots, -1, dtype=np.int64)
+    first_spots = np.flatnonzero(~has_previous)
+    last_spots = np.empty(len(first_spots), dtype=np.int64)
+    for segment_nr, spot in enumerate(first_spots):
+        while True:
+            segment[spot] = segment_nr
+            if next_spot[spot] < 0:
+                break
+            spot = next_spot[spot]
+        last_spots[segment_nr] = spot
+    return segment, first_spots, last_spots
+
+
+def close_gaps(frames, positions, first_spots, last_spots, max_frame_gap, gap_closing_max_distance,
+               alternative_cost_factor, cutoff_percentile):
+    """
+    Link the end of segments to the start of later segments
+    :return: The segment that continues every segment, -1 if there is none
+    """
+
+    next_segment = np.full(len(first_spots), -1, dtype=np.int64)
+    ends, starts, costs = find_candidate_links(
+        positions[last_spots], positions[first_spots], gap_closing_max_distance)
+    frame_gaps = frames[first_spots[starts]] - frames[last_spots[ends]]
+    valid = (frame_gaps >= 1) & (frame_gaps <= max_frame_gap)
+    ends, starts, costs = ends[valid], starts[valid], costs[valid]
+    if len(costs) == 0:
+        return next_segment
+
+    alternative_cost = alternative_cost_factor * np.percentile(costs, cutoff_percentile * 100)
+    linked_ends, linked_starts = solve_sparse_lap(
+        ends, starts, costs, len(last_spots), len(first_spots), alternative_cost)
+    next_segment[linked_ends] = linked_starts
+    return next_segment
+
+
+def link_spots(frames, x, y, trackmate_config):
+    """
+    Link the spots of a recording into tracks
+    :param frames: The frame of every spot, sorted
+    :param x: The x position of every spot, in micrometer
+    :param y: The y position of every spot, in micrometer
+    :param trackmate_config: The TrackMate section of the Paint configuration
+    :return: The track of every spot; tracks are numbered in the order of their first spot
+    """
+
+    if len(frames) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    positions = np.column_stack((x, y))
+    alternative_cost_factor = trackmate_config['ALTERNATIVE_LINKING_COST_FACTOR']
+    next_spot = link_frame_to_frame(
+        frames, positions, trackmate_config['LINKING_MAX_DISTANCE'], alternative_cost_factor)
+    segment, first_spots, last_spots = get_segments(next_spot)
+
+    if trackmate_config['ALLOW_GAP_CLOSING']:
+        next_segment = close_gaps(
+            frames, positions, first_spots, last_spots, trackmate_config['MAX_FRAME_GAP'],
+            trackmate_config['GAP_CLOSING_MAX_DISTANCE'], alternative_cost_factor,
+            trackmate_config['CUTOFF_PERCENTILE'])
+    else:
+        next_segment = np.full(len(first_spots), -1, dtype=np.int64)
+
+    # A segment is continued by a segment that starts later, so its number is higher
+    segment_track = np.full(len(first_spots), -1, dtype=np.int64)
+    nr_tracks = 0
+    for segment_nr in range(len(first_spots)):
+        if segment_track[segment_nr] < 0:
+            segment_track[segment_nr] = nr_tracks
+            nr_tracks += 1
+        if next_segment[segment_nr] >= 0:
+            segment_track[next_segment[segment_nr]] = segment_track[segment_nr]
+    return segment_track[segment]
+
+
+def get_track_features(frames, x, y, tracks, frame_interval):
+    """
+    Calculate the track features that Paint uses, as TrackMate defines them
+    :return: A dictionary with the 'Nr Spots', 'Track Duration' (seconds), 'Track X Location' and 'Track Y Location'
+    (micrometer) arrays, per track
+    """
+
+    nr_tracks = tracks.max() + 1 if len(tracks) > 0 else 0
+    nr_spots = np.bincount(tracks, minlength=nr_tracks)
+    first_frames = np.full(nr_tracks, np.iinfo(np.int64).max)
+    last_frames = np.full(nr_tracks, -1)
+    np.minimum.at(first_frames, tracks, frames)
+    np.maximum.at(last_frames, tracks, frames)
+    return {'Nr Spots': nr_spots,
+            'Track Duration': (last_frames - first_frames) * frame_interval,
+            'Track X Location': np.bincount(tracks, weights=x, minlength=nr_tracks) / np.maximum(nr_spots, 1),
+            'Track Y Location': np.bincount(tracks, weights=y, minlength=nr_tracks) / np.maximum(nr_spots, 1)}
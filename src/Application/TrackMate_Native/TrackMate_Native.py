@@ -0,0 +1,281 @@
+"""
+A Fiji-free alternative to Run TrackMate, for headless runs on machines without a desktop Fiji install.
+
+The recordings are read with nd2reader, the spots are detected with a LoG detector (Spot_Detector) and linked with a
+sparse LAP tracker (Spot_Linker), using the TrackMate section of Paint.json. The output is the same as that of
+Run TrackMate: per recording a -tracks.csv file with the same columns, a -spots.csv file and a TrackMate image, and
+per experiment the All Recordings, All Tracks and All Spots files, written by the TrackMate coordinator functions.
+
+The recordings of all experiments are processed in a process pool, one recording per task.
+"""
+
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from PIL import Image, ImageDraw
+
+from src.Application.Utilities.Diffusion_Coefficient_Engine import (
+    calculate_diffusion_coefficients,
+    get_frame_interval_from_timesteps,
+    DEFAULT_FRAME_INTERVAL)
+from src.Application.TrackMate_Coordinator.TrackMate_Coordinator import (
+    write_experiment_results,
+    prepare_trackmate_images_directory)
+from src.Application.TrackMate_Native.Spot_Detector import (
+    detect_spots,
+    select_spots)
+from src.Application.TrackMate_Native.Spot_Linker import (
+    link_spots,
+    get_track_features)
+from src.Application.Utilities.General_Support_Functions import format_time_nicely
+from src.Fiji.DirectoriesAndLocations import get_experiment_info_file_path
+from src.Fiji.LoggerConfig import get_paint_logger
+from src.Fiji.PaintConfig import (
+    get_paint_attribute,
+    get_paint_defaults_file_path,
+    load_paint_config)
+
+paint_logger = get_paint_logger('TrackMate_Native')
+
+DEFAULT_PIXEL_SIZE = 0.1602804  # Micrometer, the pixel size of the Paint recordings
+
+TRACKS_COLUMNS = ['Ext Recording Name', 'Track Label', 'Nr Spots', 'Track Duration', 'Track X Location',
+                  'Track Y Location', 'Diffusion Coefficient']
+SPOTS_COLUMNS = ['Ext Recording Name', 'Track Label', 'Frame', 'X', 'Y']
+
+
+def read_recording(recording_file_path, target_channel=1):
+    """
+    Read the frames of a recording and the calibration from its metadata
+    :param target_channel: The channel to read, counting from 1 as TrackMate does
+    :return: A tuple with the frames (t, y, x), the pixel size (micrometer) and the frame interval (seconds, or None)
+    """
+
+    from nd2reader import ND2Reader
+
+    with ND2Reader(recording_file_path) as images:
+        if 'c' in images.sizes:
+            images.default_coords['c'] = target_channel - 1
+        if 't' in images.sizes:
+            images.iter_axes = 't'
+        images.bundle_axes = 'yx'
+        frames = np.stack([np.asarray(frame) for frame in images])
+        pixel_size = images.metadata.get('pixel_microns') or DEFAULT_PIXEL_SIZE
+        frame_interval = get_frame_interval_from_timesteps(images.timesteps)
+    return frames, pixel_size, frame_interval
+
+
+def get_thresholds(threshold_value):
+    """
+    The Threshold in the Experiment Info file is a single value or several values separated by ';', as in
+    Run_TrackMate.py
+    """
+
+    return [float(value) for value in str(threshold_value).replace(';', ' ').split()]
+
+
+def get_track_colours(values):
+    """
+    A blue to red colour for every value, as the TrackMate 'Jet' lookup table
+    :return: A list of RGB tuples
+    """
+
+    values = np.asarray(values, dtype=float)
+    span = values.max() - values.min() if len(values) > 0 else 0
+    scaled = (values - values.min()) / span if span > 0 else np.zeros(len(values))
+    rgb = np.clip(1.5 - np.abs(4 * scaled[:, np.newaxis] - np.array([3, 2, 1])), 0, 1)
+    return [tuple(colour) for colour in (rgb * 255).astype(int)]
+
+
+def save_trackmate_image(frame, df_spots, df_tracks, pixel_size, image_file_path):
+    """
+    Save the first frame of the recording, with the contrast enhanced and the tracks drawn on top
+    """
+
+    frame = np.asarray(frame, dtype=float)
+    low, high = np.percentile(frame, [0.175, 99.825])  # Enhance Contrast with 0.35% saturated pixels
+    scaled = np.clip((frame - low) / (high - low), 0, 1) if high > low else np.zeros_like(frame)
+    image = Image.fromarray((scaled * 255).astype(np.uint8)).convert('RGB')
+    draw = ImageDraw.Draw(image)
+
+    colours = dict(zip(df_tracks['Track Label'], get_track_colours(df_tracks['Track Duration'])))
+    for track_label, df_track_spots in df_spots.groupby('Track Label', sort=False):
+        points = list(zip(df_track_spots['X'] / pixel_size, df_track_spots['Y'] / pixel_size))
+        draw.line(points, fill=colours[track_label], width=1)
+    image.save(image_file_path, 'JPEG')
+
+
+def track_spots(spots, ext_recording_name, trackmate_config, frame_interval):
+    """
+    Link the spots into tracks and keep the tracks with enough spots
+    :return: A tuple with the tracks and the spots of those tracks, as DataFrames with the tracks and spots file
+    columns, and the total number of tracks
+    """
+
+    tracks = link_spots(spots['Frame'], spots['X'], spots['Y'], trackmate_config)
+    features = get_track_features(spots['Frame'], spots['X'], spots['Y'], tracks, frame_interval)
+    nr_of_tracks = len(features['Nr Spots'])
+
+    # Tracks keep their number after filtering, as the TrackMate track ids do
+    visible = np.flatnonzero(features['Nr Spots'] >= trackmate_config['MIN_NR_SPOTS_IN_TRACK'])
+    df_tracks = pd.DataFrame({
+        'Ext Recording Name': ext_recording_name,
+        'Track Label': ['Track_' + str(track_id) for track_id in visible],
+        'Nr Spots': features['Nr Spots'][visible],
+        'Track Duration': np.round(features['Track Duration'][visible], 3),
+        'Track X Location': np.round(features['Track X Location'][visible], 2),
+        'Track Y Location': np.round(features['Track Y Location'][visible], 2)})
+
+    in_visible_track = np.isin(tracks, visible)
+    df_spots = pd.DataFrame({
+        'Ext Recording Name': ext_recording_name,
+        'Track Label': ['Track_' + str(track_id) for track_id in tracks[in_visible_track]],
+        'Frame': spots['Frame'][in_visible_track],
+        'X': np.round(spots['X'][in_visible_track], 4),
+        'Y': np.round(spots['Y'][in_visible_track], 4)})
+
+    # The diffusion coefficients with the legacy definition, as Generate Squares calculates them from the spots
+    df_dc = calculate_diffusion_coefficients(df_spots, {ext_recording_name: frame_interval})
+    df_tracks = df_tracks.merge(df_dc, on=['Ext Recording Name', 'Track Label'], how='left')
+    return df_tracks[TRACKS_COLUMNS], df_spots[SPOTS_COLUMNS], nr_of_tracks
+
+
+def process_recording(row, recording_source_directory, experiment_directory, trackmate_config, img_file_ext):
+    """
+    Detect and track the spots of a single recording and fill in the results in the row, as Run_TrackMate.py does.
+    When the row specifies several thresholds, detection is done once and a row is returned for every threshold.
+    This function runs in a worker process.
+    :return: A (status, rows) tuple, with status 'OK', 'NOT_FOUND' or 'FAILED' and a row per threshold
+    """
+
+    row = dict(row)
+    recording_name = row['Recording Name']
+    thresholds = get_thresholds(row['Threshold'])
+
+    if row['Adjuvant'] == 'None':
+        row['Adjuvant'] = 'No'
+
+    recording_file_path = os.path.join(recording_source_directory, recording_name + img_file_ext)
+    if not os.path.exists(recording_file_path):
+        paint_logger.warning(f"Processing: Failed to open recording: {recording_file_path}")
+        row['Recording Size'] = 0
+        return 'NOT_FOUND', [row]
+
+    row['Recording Size'] = os.path.getsize(recording_file_path)
+    time_stamp = time.time()
+    try:
+        frames, pixel_size, frame_interval = read_recording(recording_file_path, trackmate_config['TARGET_CHANNEL'])
+        row['Frame Interval'] = round(frame_interval, 6) if frame_interval else ''
+
+        all_spots = detect_spots(frames, pixel_size, trackmate_config['RADIUS'], min(thresholds),
+                                 trackmate_config['DO_MEDIAN_FILTERING'], trackmate_config['DO_SUBPIXEL_LOCALIZATION'])
+
+        rows = []
+        for threshold in thresholds:
+            ext_recording_name = recording_name + "-threshold-" + str(int(threshold))
+            spots = select_spots(all_spots, threshold)
+            df_tracks, df_spots, _ = track_spots(
+                spots, ext_recording_name, trackmate_config, frame_interval or DEFAULT_FRAME_INTERVAL)
+
+            df_tracks.to_csv(os.path.join(experiment_directory, ext_recording_name + '-tracks.csv'), index=False)
+            df_spots.to_csv(os.path.join(experiment_directory, ext_recording_name + '-spots.csv'), index=False)
+            save_trackmate_image(frames[0], df_spots, df_tracks, pixel_size,
+                                 os.path.join(experiment_directory, 'TrackMate Images', ext_recording_name + '.jpg'))
+
+            threshold_row = dict(row)
+            if len(thresholds) > 1:
+                threshold_row['Threshold'] = str(int(threshold))
+            threshold_row['Nr Spots'] = len(spots['Frame'])
+            threshold_row['Nr Tracks'] = len(df_tracks)
+            threshold_row['Ext Recording Name'] = ext_recording_name
+            rows.append(threshold_row)
+    except Exception as e:
+        paint_logger.error(f"Processing {recording_name} failed: {e}")
+        row['Nr Spots'] = -1
+        return 'FAILED', [row]
+
+    # For a sweep the run time is that of the whole sweep, as the detection is shared
+    run_time = round(time.time() - time_stamp, 1)
+    for threshold_row in rows:
+        threshold_row['Run Time'] = run_time
+        threshold_row['Time Stamp'] = time.asctime(time.localtime(time.time()))
+    return 'OK', rows
+
+
+def read_experiment_info(experiment_directory):
+    """
+    :return: A tuple with the column names and the rows of the Experiment Info file
+    """
+
+    with open(get_experiment_info_file_path(experiment_directory), mode='r') as experiment_info_file:
+        csv_reader = csv.DictReader(experiment_info_file)
+        return csv_reader.fieldnames, list(csv_reader)
+
+
+def run_trackmate_native(experiments, nr_workers=None):
+    """
+    Run the Fiji-free backend on the recordings of the experiments with a process pool
+    :param experiments: A list of dictionaries with 'Recording Source Directory' and 'Experiment Directory'
+    :param nr_workers: The number of processes, by default the number of CPUs
+    :return: True if all recordings were found and processed
+    """
+
+    trackmate_config = load_paint_config(get_paint_defaults_file_path())['TrackMate']
+    if trackmate_config['ALLOW_TRACK_SPLITTING'] or trackmate_config['ALLOW_TRACK_MERGING']:
+        paint_logger.warning("Track splitting and merging are not supported by the Fiji-free backend and are ignored")
+    img_file_ext = get_paint_attribute('Paint', 'Image File Extension')
+
+    time_stamp = time.time()
+    experiment_tasks = []
+    for experiment in experiments:
+        experiment_directory = experiment['Experiment Directory']
+        if not os.path.isfile(get_experiment_info_file_path(experiment_directory)):
+            paint_logger.error(f"The file '{get_experiment_info_file_path(experiment_directory)}' does not exist.")
+            continue
+        fieldnames, rows = read_experiment_info(experiment_directory)
+        rows_to_process = [row for row in rows if 'y' in row['Process'].lower()]
+        if not rows_to_process:
+            paint_logger.warning(f"No recordings selected for processing in {experiment_directory}")
+            continue
+        prepare_trackmate_images_directory(experiment_directory)
+        experiment_tasks.append((experiment, fieldnames, rows, rows_to_process))
+
+    nr_recordings = sum(len(rows_to_process) for _, _, _, rows_to_process in experiment_tasks)
+    paint_logger.info(f"Processing {nr_recordings} recordings with {nr_workers or os.cpu_count()} processes")
+
+    all_processed = True
+    with ProcessPoolExecutor(max_workers=nr_workers) as executor:
+        futures = {}
+        for experiment_nr, (experiment, _, _, rows_to_process) in enumerate(experiment_tasks):
+            for row in rows_to_process:
+                future = executor.submit(process_recording, row, experiment['Recording Source Directory'],
+                                         experiment['Experiment Directory'], trackmate_config, img_file_ext)
+                futures[future] = (experiment_nr, row['Recording Name'])
+
+        # Complete an experiment as soon as its last recording is done
+        results = [{} for _ in experiment_tasks]
+        remaining = [len(rows_to_process) for _, _, _, rows_to_process in experiment_tasks]
+        for future in as_completed(futures):
+            experiment_nr, recording_name = futures[future]
+            try:
+                status, result_rows = future.result()
+            except Exception as e:
+                status, result_rows = 'FAILED', []
+                paint_logger.error(f"Processing {recording_name} failed: {e}")
+            if status != 'OK':
+                all_processed = False
+            paint_logger.debug("%s: %s", recording_name, status)
+            results[experiment_nr][recording_name] = result_rows
+
+            remaining[experiment_nr] -= 1
+            if remaining[experiment_nr] == 0:
+                experiment, fieldnames, rows, _ = experiment_tasks[experiment_nr]
+                write_experiment_results(experiment, fieldnames, rows, results[experiment_nr])
+
+    run_time = round(time.time() - time_stamp, 1)
+    paint_logger.info(f"Processing completed in {format_time_nicely(run_time)}.")
+    return all_processed
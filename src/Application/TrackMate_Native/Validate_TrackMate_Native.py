@@ -0,0 +1,132 @@
+"""
+Compare the output of the Fiji-free backend with that of TrackMate for the same experiment.
+
+Run both on the same recordings, into two experiment directories, and compare their All Recordings and All Tracks
+files. Per recording the tracks are matched one to one on their location (a LAP on the squared distance between the
+Track X and Y Locations). The report gives the number of spots and tracks of both, the fraction of the TrackMate
+tracks that were found (recall) and of the native tracks that match a TrackMate track (precision), and the median
+differences of the matched tracks. Run TrackMate leaves the diffusion coefficients to Generate Squares, so those of
+the reference are calculated from its All Spots file, as the native backend does.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.Application.Utilities.Diffusion_Coefficient_Engine import (
+    get_frame_intervals,
+    update_tracks_diffusion_coefficients)
+from src.Application.TrackMate_Native.Spot_Linker import (
+    find_candidate_links,
+    solve_sparse_lap)
+from src.Application.Utilities.Directory_Index import OUTPUT_DIR
+from src.Fiji.LoggerConfig import paint_logger
+
+VALIDATION_REPORT_FILE = 'TrackMate Native Validation.csv'
+DEFAULT_MATCH_DISTANCE = 0.5  # Micrometer
+
+
+def match_tracks(df_reference, df_native, max_distance):
+    """
+    Match the tracks of a recording one to one on their location
+    :return: A tuple with the row positions of the matched tracks in the reference and in the native tracks
+    """
+
+    reference_positions = df_reference[['Track X Location', 'Track Y Location']].to_numpy(dtype=float)
+    native_positions = df_native[['Track X Location', 'Track Y Location']].to_numpy(dtype=float)
+    sources, targets, costs = find_candidate_links(reference_positions, native_positions, max_distance)
+    return solve_sparse_lap(sources, targets, costs, len(df_reference), len(df_native), max_distance ** 2)
+
+
+def compare_recording(df_reference, df_native, max_distance):
+    """
+    Compare the tracks of a single recording
+    :return: A dictionary with the comparison
+    """
+
+    reference_index, native_index = match_tracks(df_reference, df_native, max_distance)
+    df_reference_matched = df_reference.iloc[reference_index].reset_index(drop=True)
+    df_native_matched = df_native.iloc[native_index].reset_index(drop=True)
+    nr_matched = len(reference_index)
+
+    def median_difference(column, relative=False):
+        if nr_matched == 0:
+            return np.nan
+        reference = pd.to_numeric(df_reference_matched[column], errors='coerce')
+        native = pd.to_numeric(df_native_matched[column], errors='coerce')
+        difference = (native - reference).abs()
+        if relative:
+            difference = difference / reference.abs().replace(0, np.nan)
+        return round(float(difference.median()), 3)
+
+    return {
+        'Reference Tracks': len(df_reference),
+        'Native Tracks': len(df_native),
+        'Matched Tracks': nr_matched,
+        'Recall': round(nr_matched / len(df_reference), 3) if len(df_reference) > 0 else np.nan,
+        'Precision': round(nr_matched / len(df_native), 3) if len(df_native) > 0 else np.nan,
+        'Median Nr Spots Difference': median_difference('Nr Spots'),
+        'Median Duration Difference': median_difference('Track Duration'),
+        'Median Relative DC Difference': median_difference('Diffusion Coefficient', relative=True)}
+
+
+def validate_against_trackmate(reference_directory, native_directory, max_distance=DEFAULT_MATCH_DISTANCE,
+                               report_file_path=None):
+    """
+    Compare the native backend output in native_directory with the TrackMate output in reference_directory
+    and write the report
+    :param max_distance: The maximum distance, in micrometer, between the locations of matching tracks
+    :param report_file_path: Where to write the report, by default in the Output directory of the native experiment
+    (a file in the experiment directory itself would make it fail the experiment check)
+    :return: The report, one row per recording, or None if the files are missing
+    """
+
+    tables = {}
+    for name, directory in (('Reference', reference_directory), ('Native', native_directory)):
+        try:
+            tables[name] = (pd.read_csv(os.path.join(directory, 'All Recordings.csv')),
+                            pd.read_csv(os.path.join(directory, 'All Tracks.csv')))
+        except FileNotFoundError as e:
+            paint_logger.error(f"Could not read the {name.lower()} output: {e}")
+            return None
+
+    df_reference_recordings, df_reference_tracks = tables['Reference']
+    df_native_recordings, df_native_tracks = tables['Native']
+
+    # The diffusion coefficients of the reference, with the same (default) method the native backend uses
+    reference_spots_file_path = os.path.join(reference_directory, 'All Spots.csv')
+    if os.path.isfile(reference_spots_file_path):
+        df_reference_tracks = update_tracks_diffusion_coefficients(
+            df_reference_tracks, pd.read_csv(reference_spots_file_path), get_frame_intervals(df_reference_recordings))
+    else:
+        paint_logger.warning(f"No 'All Spots.csv' in {reference_directory}, the diffusion coefficients of the "
+                             f"reference may be missing")
+    reference_spots = df_reference_recordings.set_index('Ext Recording Name')['Nr Spots']
+    native_spots = df_native_recordings.set_index('Ext Recording Name')['Nr Spots']
+
+    report = []
+    for ext_recording_name in df_reference_recordings['Ext Recording Name'].dropna():
+        if ext_recording_name not in native_spots.index:
+            paint_logger.warning(f"Recording {ext_recording_name} is missing in the native output")
+            continue
+        comparison = compare_recording(
+            df_reference_tracks[df_reference_tracks['Ext Recording Name'] == ext_recording_name],
+            df_native_tracks[df_native_tracks['Ext Recording Name'] == ext_recording_name],
+            max_distance)
+        report.append({'Ext Recording Name': ext_recording_name,
+                       'Reference Spots': reference_spots[ext_recording_name],
+                       'Native Spots': native_spots[ext_recording_name],
+                       **comparison})
+
+    df_report = pd.DataFrame(report)
+    if report_file_path is None:
+        os.makedirs(os.path.join(native_directory, OUTPUT_DIR), exist_ok=True)
+        report_file_path = os.path.join(native_directory, OUTPUT_DIR, VALIDATION_REPORT_FILE)
+    df_report.to_csv(report_file_path, index=False)
+    paint_logger.info(f"Wrote the validation report to {report_file_path}")
+
+    if len(df_report) > 0:
+        paint_logger.info(f"Compared {len(df_report)} recordings: median recall {df_report['Recall'].median():.3f}, "
+                          f"median precision {df_report['Precision'].median():.3f}")
+    return df_report
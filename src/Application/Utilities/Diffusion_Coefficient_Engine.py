@@ -0,0 +1,236 @@
+"""
+Vectorised calculation of mean squared displacements and diffusion coefficients from the spots of the tracks.
+
+Run TrackMate writes the spots of the visible tracks (Ext Recording Name, Track Label, Frame, X, Y) to
+'All Spots.csv'. The functions here work on all tracks of an experiment at once: the spots are sorted on track and
+frame and every track gets a consecutive code, so per track sums are np.bincount calls.
+
+Two definitions are available:
+- 'First Spot': the mean squared distance of the spots of a track to its first spot, divided by 4 times the frame
+  interval. This is the definition TrackMate.py used to calculate in Jython, so the values stay comparable.
+- 'MSD Fit': the MSD-vs-lag curve of the track is fitted to MSD = 4 D t (2D diffusion) over the first lags.
+The diffusion coefficients are reported as in the tracks file: in 10^-3 um^2/s and rounded.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.Fiji.LoggerConfig import paint_logger
+
+DEFAULT_FRAME_INTERVAL = 0.05  # Seconds, used when the recording metadata does not provide the frame interval
+MAX_LAG = 10  # The number of frame lags of the MSD curves
+NR_OF_LAGS_TO_FIT = 4  # The number of lags used to fit the diffusion coefficient
+
+FIRST_SPOT = 'First Spot'
+MSD_FIT = 'MSD Fit'
+
+
+def prepare_spots(df_spots: pd.DataFrame):
+    """
+    Sort the spots on track and frame and give every track a consecutive code
+    :param df_spots: The spots, with 'Ext Recording Name', 'Track Label', 'Frame', 'X' and 'Y'
+    :return: A tuple with the track codes, frames, x and y arrays and the (Ext Recording Name, Track Label) of every
+    track code
+    """
+
+    df_spots = df_spots.sort_values(['Ext Recording Name', 'Track Label', 'Frame'], kind='stable')
+    track_codes, tracks = pd.MultiIndex.from_frame(df_spots[['Ext Recording Name', 'Track Label']]).factorize()
+    return (track_codes.astype(np.int64),
+            df_spots['Frame'].to_numpy(dtype=np.int64),
+            df_spots['X'].to_numpy(dtype=float),
+            df_spots['Y'].to_numpy(dtype=float),
+            tracks)
+
+
+def calculate_msd_curves(track_codes, frames, x, y, nr_of_tracks, max_lag=MAX_LAG):
+    """
+    Calculate the MSD-vs-lag curve of every track. Frames missing in a track (gap closing) are handled by using the
+    frame difference as lag.
+    :param track_codes: The track code of every spot, sorted on track and frame
+    :param nr_of_tracks: The number of track codes
+    :param max_lag: The longest lag, in frames
+    :return: A tuple with the MSD and the number of displacements per track and lag, both (nr_of_tracks, max_lag)
+    """
+
+    nr_of_bins = nr_of_tracks * max_lag
+    sums = np.zeros(nr_of_bins)
+    counts = np.zeros(nr_of_bins, dtype=np.int64)
+
+    # Within a track the frames increase, so a displacement over a lag of n frames is at most n spots apart
+    for shift in range(1, min(max_lag, len(frames) - 1) + 1):
+        lags = frames[shift:] - frames[:-shift]
+        valid = (track_codes[shift:] == track_codes[:-shift]) & (lags <= max_lag)
+        squared_displacements = (x[shift:] - x[:-shift]) ** 2 + (y[shift:] - y[:-shift]) ** 2
+        bins = track_codes[:-shift][valid] * max_lag + (lags[valid] - 1)
+        sums += np.bincount(bins, weights=squared_displacements[valid], minlength=nr_of_bins)
+        counts += np.bincount(bins, minlength=nr_of_bins)
+
+    msd = np.divide(sums, counts, out=np.full(nr_of_bins, np.nan), where=counts > 0)
+    return msd.reshape(nr_of_tracks, max_lag), counts.reshape(nr_of_tracks, max_lag)
+
+
+def fit_diffusion_coefficients(msd, counts, frame_intervals, nr_of_lags=NR_OF_LAGS_TO_FIT):
+    """
+    Fit MSD = 4 D t through the origin over the first lags of every track
+    :param msd: The MSD curves, as returned by calculate_msd_curves
+    :param counts: The number of displacements, as returned by calculate_msd_curves
+    :param frame_intervals: The frame interval of every track, in seconds
+    :return: The diffusion coefficient of every track in um^2/s, NaN for tracks without displacements
+    """
+
+    times = np.arange(1, nr_of_lags + 1)[np.newaxis, :] * frame_intervals[:, np.newaxis]
+    valid = counts[:, :nr_of_lags] > 0
+    numerator = np.where(valid, msd[:, :nr_of_lags] * times, 0).sum(axis=1)
+    denominator = np.where(valid, times * times, 0).sum(axis=1)
+    return np.divide(numerator, 4 * denominator, out=np.full(len(numerator), np.nan), where=denominator > 0)
+
+
+def calculate_first_spot_diffusion_coefficients(track_codes, x, y, nr_of_tracks, frame_intervals):
+    """
+    The mean squared distance to the first spot of the track, divided by 4 times the frame interval
+    :return: The diffusion coefficient of every track in um^2/s, NaN for tracks with a single spot
+    """
+
+    starts = np.flatnonzero(np.r_[True, track_codes[1:] != track_codes[:-1]])
+    nr_of_spots = np.diff(np.r_[starts, len(track_codes)])
+    x0 = np.repeat(x[starts], nr_of_spots)
+    y0 = np.repeat(y[starts], nr_of_spots)
+
+    sums = np.bincount(track_codes, weights=(x - x0) ** 2 + (y - y0) ** 2, minlength=nr_of_tracks)
+    counts = np.bincount(track_codes, minlength=nr_of_tracks) - 1
+    msd = np.divide(sums, counts, out=np.full(nr_of_tracks, np.nan), where=counts > 0)
+    return msd / (2 * 2 * frame_intervals)
+
+
+def calculate_diffusion_coefficients(df_spots: pd.DataFrame, frame_intervals: dict = None,
+                                     method: str = FIRST_SPOT) -> pd.DataFrame:
+    """
+    Calculate the diffusion coefficients of all tracks in the spots table
+    :param df_spots: The spots, with 'Ext Recording Name', 'Track Label', 'Frame', 'X' and 'Y'
+    :param frame_intervals: The frame interval in seconds per Ext Recording Name, DEFAULT_FRAME_INTERVAL if missing
+    :param method: FIRST_SPOT or MSD_FIT
+    :return: A DataFrame with 'Ext Recording Name', 'Track Label' and 'Diffusion Coefficient'
+    """
+
+    if len(df_spots) == 0:
+        return pd.DataFrame(columns=['Ext Recording Name', 'Track Label', 'Diffusion Coefficient'])
+
+    frame_intervals = frame_intervals or {}
+    track_codes, frames, x, y, tracks = prepare_spots(df_spots)
+    recording_names = tracks.get_level_values(0)
+    track_frame_intervals = np.array(
+        [frame_intervals.get(name, DEFAULT_FRAME_INTERVAL) for name in recording_names], dtype=float)
+
+    if method == MSD_FIT:
+        msd, counts = calculate_msd_curves(track_codes, frames, x, y, len(tracks))
+        diffusion_coefficients = fit_diffusion_coefficients(msd, counts, track_frame_intervals)
+    else:
+        diffusion_coefficients = calculate_first_spot_diffusion_coefficients(
+            track_codes, x, y, len(tracks), track_frame_intervals)
+
+    return pd.DataFrame({
+        'Ext Recording Name': recording_names,
+        'Track Label': tracks.get_level_values(1),
+        'Diffusion Coefficient': np.round(diffusion_coefficients * 1000, 0)})
+
+
+def get_frame_intervals(df_recordings: pd.DataFrame) -> dict:
+    """
+    The frame interval of the recordings, as Run TrackMate took it from the recording metadata
+    :return: A dictionary with the frame interval per Ext Recording Name (only for recordings that have one)
+    """
+
+    if 'Frame Interval' not in df_recordings.columns:
+        return {}
+    df_known = df_recordings[pd.to_numeric(df_recordings['Frame Interval'], errors='coerce') > 0]
+    return dict(zip(df_known['Ext Recording Name'], df_known['Frame Interval'].astype(float)))
+
+
+def get_frame_interval_from_recording(recording_file_path: str) -> float:
+    """
+    Read the frame interval from the metadata of an nd2 recording
+    :return: The median time between frames in seconds, or None if it can not be determined
+    """
+
+    from nd2reader import ND2Reader
+
+    try:
+        with ND2Reader(recording_file_path) as images:
+            timesteps = np.asarray(images.timesteps, dtype=float)  # In milliseconds
+    except Exception as e:
+        paint_logger.warning(f"Could not read the frame interval of {recording_file_path}: {e}")
+        return None
+    return get_frame_interval_from_timesteps(timesteps)
+
+
+def get_frame_interval_from_timesteps(timesteps) -> float:
+    """
+    :param timesteps: The acquisition times of the frames in milliseconds, as nd2reader reports them
+    :return: The median time between frames in seconds, or None if it can not be determined
+    """
+
+    timesteps = np.asarray(timesteps, dtype=float)
+    if len(timesteps) < 2:
+        return None
+    frame_interval = float(np.median(np.diff(timesteps))) / 1000
+    return frame_interval if frame_interval > 0 else None
+
+
+def update_tracks_diffusion_coefficients(df_tracks: pd.DataFrame, df_spots: pd.DataFrame,
+                                         frame_intervals: dict = None, method: str = FIRST_SPOT) -> pd.DataFrame:
+    """
+    Replace the 'Diffusion Coefficient' of the tracks by the values calculated from the spots.
+    Tracks that have no spots keep their value.
+    :return: The updated tracks
+    """
+
+    df_dc = calculate_diffusion_coefficients(df_spots, frame_intervals, method)
+    df_dc = df_dc.set_index(['Ext Recording Name', 'Track Label'])['Diffusion Coefficient']
+    keys = pd.MultiIndex.from_frame(df_tracks[['Ext Recording Name', 'Track Label']])
+    calculated = df_dc.reindex(keys).to_numpy()
+
+    df_tracks = df_tracks.copy()
+    if 'Diffusion Coefficient' in df_tracks.columns:
+        existing = pd.to_numeric(df_tracks['Diffusion Coefficient'], errors='coerce').to_numpy()
+        calculated = np.where(np.isnan(calculated), existing, calculated)
+    df_tracks['Diffusion Coefficient'] = calculated
+    return df_tracks
+
+
+def recompute_diffusion_coefficients(experiment_path: str, recordings_directory: str = None,
+                                     method: str = FIRST_SPOT) -> bool:
+    """
+    Recalculate the diffusion coefficients in the All Tracks file of an experiment from its All Spots file, without
+    running TrackMate again
+    :param experiment_path: The experiment directory
+    :param recordings_directory: If specified, the frame intervals are read from the recordings in this directory,
+    otherwise those stored in All Recordings are used
+    :param method: FIRST_SPOT or MSD_FIT
+    :return: True if the All Tracks file was updated
+    """
+
+    spots_file_path = os.path.join(experiment_path, 'All Spots.csv')
+    if not os.path.isfile(spots_file_path):
+        paint_logger.error(f"No 'All Spots.csv' in {experiment_path}, run TrackMate again to create it")
+        return False
+
+    df_recordings = pd.read_csv(os.path.join(experiment_path, 'All Recordings.csv'))
+    frame_intervals = get_frame_intervals(df_recordings)
+    if recordings_directory is not None:
+        from src.Fiji.PaintConfig import get_paint_attribute
+        img_file_ext = get_paint_attribute('Paint', 'Image File Extension')
+        for recording_name, ext_recording_name in zip(df_recordings['Recording Name'],
+                                                      df_recordings['Ext Recording Name']):
+            frame_interval = get_frame_interval_from_recording(
+                os.path.join(recordings_directory, recording_name + img_file_ext))
+            if frame_interval:
+                frame_intervals[ext_recording_name] = frame_interval
+
+    tracks_file_path = os.path.join(experiment_path, 'All Tracks.csv')
+    df_tracks = update_tracks_diffusion_coefficients(
+        pd.read_csv(tracks_file_path), pd.read_csv(spots_file_path), frame_intervals, method)
+    df_tracks.to_csv(tracks_file_path, index=False)
+    paint_logger.info(f"Recalculated the diffusion coefficients of {len(df_tracks)} tracks in {experiment_path}")
+    return True
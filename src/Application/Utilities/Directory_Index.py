@@ -0,0 +1,212 @@
+"""
+A single pass, cached index of Paint project and experiment directories.
+
+Every directory is read once with os.scandir and its entries (names and whether they are files or directories) are
+kept in memory. A cached entry is reused as long as the modification time of the directory itself is unchanged,
+so classification and the experiment listing share the same information without touching the file system again.
+Rewriting a file in place does not change the modification time of its directory, so the modification times of
+files are not cached: get_file_mtime reads them when asked. Code that writes files into a directory calls
+invalidate_directory_index.
+"""
+
+import os
+
+EXPERIMENT_FILES = {"Experiment Info.csv", "All Recordings.csv", "All Tracks.csv"}
+# The spots are exported by Run TrackMate for the diffusion coefficient calculation, older experiments do not have them
+OPTIONAL_EXPERIMENT_FILES = {"All Spots.csv"}
+EXPERIMENT_DIRS = {"Brightfield Images", "TrackMate Images"}
+PROJECT_FILES = {"All Recordings.csv", "All Tracks.csv", "All Squares.csv"}
+SQUARES_FILE = "All Squares.csv"
+OUTPUT_DIR = "Output"
+
+_directory_index_cache = {}
+
+
+def _scan_directory(directory_path, directory_mtime):
+    """
+    Read the entries of a single directory in one os.scandir pass
+    :param directory_path: The directory to scan
+    :param directory_mtime: The modification time of the directory, stored to validate the cache
+    :return: A dictionary with the path, modification time and entries of the directory
+    """
+
+    entries = {}
+    with os.scandir(directory_path) as it:
+        for entry in it:
+            if entry.name.startswith('.'):  # Hidden files, such as .DS_Store and the working files of Paint tools
+                continue
+            try:
+                is_dir = entry.is_dir()
+                is_file = entry.is_file()
+            except OSError:
+                continue
+            entries[entry.name] = {'is_dir': is_dir, 'is_file': is_file}
+
+    return {'path': directory_path, 'mtime': directory_mtime, 'entries': entries}
+
+
+def get_directory_index(directory_path, refresh=False):
+    """
+    Return the (cached) index of a single directory. The directory is rescanned when its modification time
+    has changed since the last scan or when a refresh is requested.
+    :param directory_path: The directory to index
+    :param refresh: Force a rescan
+    :return: The index, or None when the directory does not exist
+    """
+
+    directory_path = os.path.abspath(directory_path)
+    try:
+        directory_mtime = os.stat(directory_path).st_mtime_ns
+    except OSError:
+        _directory_index_cache.pop(directory_path, None)
+        return None
+
+    index = _directory_index_cache.get(directory_path)
+    if refresh or index is None or index['mtime'] != directory_mtime:
+        try:
+            index = _scan_directory(directory_path, directory_mtime)
+        except OSError:
+            return None
+        _directory_index_cache[directory_path] = index
+    return index
+
+
+def invalidate_directory_index(directory_path=None):
+    """
+    Remove a directory (and its subdirectories) from the cache, or clear the cache entirely
+    :param directory_path: The directory that was written to, None to clear everything
+    """
+
+    if directory_path is None:
+        _directory_index_cache.clear()
+        return
+
+    directory_path = os.path.abspath(directory_path)
+    for cached_path in list(_directory_index_cache):
+        if cached_path == directory_path or cached_path.startswith(directory_path + os.sep):
+            del _directory_index_cache[cached_path]
+
+
+def _file_names(index):
+    return {name for name, entry in index['entries'].items() if entry['is_file']}
+
+
+def _dir_names(index):
+    return {name for name, entry in index['entries'].items() if entry['is_dir']}
+
+
+def check_experiment_index(index):
+    """
+    Determine from its index if a directory is an Experiment directory
+    :param index: The index of the directory
+    :return: A tuple (is_experiment, maturity, feedback)
+    """
+
+    feedback = []
+    file_names = _file_names(index)
+    dir_names = _dir_names(index)
+    output = index['entries'].get(OUTPUT_DIR)
+
+    has_experiment_files = EXPERIMENT_FILES <= file_names
+    has_required_dirs = EXPERIMENT_DIRS <= dir_names
+
+    if has_experiment_files and has_required_dirs:
+        additional_contents = [name for name in index['entries']
+                               if name not in EXPERIMENT_FILES and
+                               name not in OPTIONAL_EXPERIMENT_FILES and
+                               name not in EXPERIMENT_DIRS and
+                               name != SQUARES_FILE and
+                               name != OUTPUT_DIR]
+        if additional_contents:
+            feedback.append(
+                f"Not an Experiment: directory contains unexpected files or directories: {additional_contents}.")
+        if not additional_contents and (output is None or output['is_dir']):
+            maturity = "Mature" if SQUARES_FILE in file_names else "Immature"
+            return True, maturity, feedback
+        else:
+            feedback.append("Experiment directory contains unexpected files or directories.")
+    else:
+        if not has_experiment_files:
+            feedback.append(f"Not an Experiment: Missing required experiment files: {EXPERIMENT_FILES - file_names}")
+        if not has_required_dirs:
+            feedback.append(
+                f"Not an Experiment: Missing required directories for an experiment: {EXPERIMENT_DIRS - dir_names}")
+
+    return False, None, feedback
+
+
+def get_project_index(directory_path, refresh=False):
+    """
+    Build the index of a directory together with the indexes of its direct subdirectories.
+    All subdirectories except Output are listed under 'subdirectories', those that qualify as Experiment
+    directories also under 'experiments'. Both are sorted by name.
+    :param directory_path: The Project (or Experiment) directory
+    :param refresh: Force a rescan of all directories involved
+    :return: A dictionary with keys 'index', 'subdirectories', 'experiments' and 'other_dirs', or None if the
+        directory does not exist
+    """
+
+    index = get_directory_index(directory_path, refresh=refresh)
+    if index is None:
+        return None
+
+    subdirectories = {}
+    experiments = {}
+    other_dirs = []
+    for name in sorted(_dir_names(index)):
+        if name == OUTPUT_DIR:
+            continue
+        sub_index = get_directory_index(os.path.join(index['path'], name), refresh=refresh)
+        if sub_index is None:
+            continue
+        subdirectories[name] = sub_index
+        if check_experiment_index(sub_index)[0]:
+            experiments[name] = sub_index
+        else:
+            other_dirs.append(name)
+
+    return {'index': index, 'subdirectories': subdirectories, 'experiments': experiments, 'other_dirs': other_dirs}
+
+
+def get_file_mtime(index, file_name):
+    """
+    Return the modification time of a file in the index, None if the file is not present. The time is read from the
+    file itself, as it changes without the index noticing when the file is rewritten.
+    """
+
+    entry = index['entries'].get(file_name)
+    if entry is None or not entry['is_file']:
+        return None
+    try:
+        return os.stat(os.path.join(index['path'], file_name)).st_mtime
+    except OSError:
+        return None
+
+
+def get_experiment_names(directory_path):
+    """
+    Return the sorted names of the Experiment directories in a Project directory
+    """
+
+    project_index = get_project_index(directory_path)
+    if project_index is None:
+        return []
+    return list(project_index['experiments'])
+
+
+def get_out_of_date_experiments(project_directory):
+    """
+    Return the names of the experiments that have an 'All Recordings.csv' newer than that of the project
+    """
+
+    project_index = get_project_index(project_directory)
+    if project_index is None:
+        return []
+
+    time_stamp_project = get_file_mtime(project_index['index'], 'All Recordings.csv') or 0
+    out_of_date = []
+    for experiment_name, experiment_index in project_index['experiments'].items():
+        time_stamp_experiment = get_file_mtime(experiment_index, 'All Recordings.csv')
+        if time_stamp_experiment is not None and time_stamp_project < time_stamp_experiment:
+            out_of_date.append(experiment_name)
+    return out_of_date
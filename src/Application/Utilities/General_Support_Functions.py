@@ -1,13 +1,30 @@
 import os
-from pathlib import Path
 import re
 import shutil
-import pandas as pd
+from typing import TYPE_CHECKING
+
 from PIL import Image, ImageTk
 
+from src.Application.Utilities.Directory_Index import (
+    get_directory_index,
+    get_project_index,
+    check_experiment_index,
+    PROJECT_FILES,
+    OUTPUT_DIR)
 from src.Fiji.LoggerConfig import paint_logger
 
-pd.options.mode.copy_on_write = True
+# pandas is imported in the functions that need it, so tools that do not need it start quickly
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def set_pandas_options():
+    """
+    Paint runs pandas with copy on write. The applications call this once, before they start working with tables
+    """
+
+    import pandas as pd
+    pd.options.mode.copy_on_write = True
 
 
 def save_experiment_to_file(df_experiment, experiment_file_path):
@@ -18,12 +35,14 @@ def save_squares_to_file(df_squares, square_file_path):
     df_squares.to_csv(square_file_path, index=False)
 
 
-def read_experiment_file(experiment_file_path: str, only_records_to_process: bool = True) -> pd.DataFrame:
+def read_experiment_file(experiment_file_path: str, only_records_to_process: bool = True) -> 'pd.DataFrame':
     """
     Create the process table by looking for records that were marked for processing
     :return:
     """
 
+    import pandas as pd
+
     try:
         df_experiment = pd.read_csv(experiment_file_path, header=0, skiprows=[])
     except IOError:
@@ -67,6 +86,8 @@ def correct_all_images_column_types(df_experiment):
 
 
 def read_squares_from_file(squares_file_path):
+    import pandas as pd
+
     try:
         df_squares = pd.read_csv(squares_file_path, header=0, skiprows=[])
     except IOError:
@@ -122,7 +143,7 @@ def split_probe_structure(row):
 def copy_directory(src, dest):
     try:
         shutil.rmtree(dest, ignore_errors=True)
-        paint_logger.debug(f"Removed {dest}")
+        paint_logger.debug("Removed %s", dest)
     except FileNotFoundError as e:
         paint_logger.error(f"FileNotFoundError: {e}")
     except PermissionError as e:
@@ -136,7 +157,7 @@ def copy_directory(src, dest):
 
     try:
         shutil.copytree(src, dest)
-        paint_logger.debug(f"Copied {src} to {dest}")
+        paint_logger.debug("Copied %s to %s", src, dest)
     except FileNotFoundError as e:
         paint_logger.error(f"FileNotFoundError: {e}")
     except FileExistsError as e:
@@ -247,6 +268,7 @@ def classify_directory_work(directory_path):
     """
     Classifies a directory as either an experiment or project directory,
     and determines its maturity. Provides feedback if classification fails.
+    The directory contents are taken from the shared directory index, so repeated calls do not rescan.
 
     Args:
         directory_path (str): The path to the directory to classify.
@@ -257,62 +279,33 @@ def classify_directory_work(directory_path):
               Possible 'maturity' values: 'mature', 'immature'.
               'feedback' provides information on why classification failed.
     """
-    directory = Path(directory_path)
-
-    # Ignore files like .DS_Store
-    contents = [item for item in directory.iterdir() if item.name != ".DS_Store"]
 
-    # Initialize feedback
-    feedback = []
+    index = get_directory_index(directory_path)
+    if index is None:
+        return {"type": "unknown", "maturity": "immature",
+                "feedback": f"Directory '{directory_path}' does not exist."}
 
     # Check for experiment directory
-    experiment_files = {"Experiment Info.csv", "All Recordings.csv", "All Tracks.csv"}
-    required_dirs = {"Brightfield Images", "TrackMate Images"}
-    optional_file = "All Squares.csv"
-    output_dir = directory / "Output"
-
-    has_experiment_files = all((directory / file).is_file() for file in experiment_files)
-    has_required_dirs = all((directory / dir_name).is_dir() for dir_name in required_dirs)
-
-    if has_experiment_files and has_required_dirs:
-        additional_contents = [item for item in contents \
-                               if item.name not in experiment_files and \
-                                  item.name not in required_dirs and \
-                                  item.name != optional_file and \
-                                  item != output_dir]
-        if additional_contents:
-            feedback.append(f"Not an Experiment: directory contains unexpected files or directories: {additional_contents}.")
-        if not additional_contents and (not output_dir.exists() or output_dir.is_dir()):
-            maturity = "Mature" if (directory / optional_file).is_file() else "Immature"
-            return {"type": "Experiment", "maturity": maturity, "feedback": None}
-        else:
-            feedback.append("Experiment directory contains unexpected files or directories.")
-    else:
-        if not has_experiment_files:
-            file_names = [Path(path).name for path in contents if Path(path).is_file()]
-            missing_files = set(experiment_files) - set(file_names)
-            feedback.append(f"Not an Experiment: Missing required experiment files: {missing_files}")
-        if not has_required_dirs:
-            dir_names = [Path(path).name for path in contents if Path(path).is_dir()]
-            missing_dirs = set(required_dirs) - set(dir_names)
-            feedback.append(f"Not an Experiment: Missing required directories for an experiment: {missing_dirs}")
+    is_experiment, maturity, feedback = check_experiment_index(index)
+    if is_experiment:
+        return {"type": "Experiment", "maturity": maturity, "feedback": None}
 
     # Check for project directory
-    experiment_dirs = [item for item in contents if item.is_dir() and classify_directory_work(item)["type"] == "Experiment"]
-    project_files = {"All Recordings.csv", "All Tracks.csv", "All Squares.csv"}
-
-    has_project_files = all((directory / file).is_file() for file in project_files)
+    project_index = get_project_index(directory_path)
+    entries = index['entries']
+    has_project_files = all(entries.get(file, {}).get('is_file', False) for file in PROJECT_FILES)
 
-    if experiment_dirs:
-        additional_dirs = [item for item in contents if item.is_dir() and item != output_dir and item not in experiment_dirs]
-        additional_files = [item for item in contents if item.is_file() and item.name not in project_files]
+    if project_index['experiments']:
+        additional_dirs = project_index['other_dirs']
+        additional_files = [name for name, entry in entries.items()
+                            if entry['is_file'] and name not in PROJECT_FILES]
+        output = entries.get(OUTPUT_DIR)
 
-        if not additional_dirs and not additional_files and (not output_dir.exists() or output_dir.is_dir()):
+        if not additional_dirs and not additional_files and (output is None or output['is_dir']):
             maturity = "Mature" if has_project_files else "Immature"
             return {"type": "Project", "maturity": maturity, "feedback": None}
         else:
-            dir_names = [Path(path).name for path in additional_dirs if Path(path).is_dir()]
-            feedback.append(f"Not a Project: unexpected files {additional_files} or directories {dir_names}.")
+            feedback.append(f"Not a Project: unexpected files {additional_files} or directories {additional_dirs}.")
     else:
         feedback.append("Not a Project: No valid experiment directories found for a project.")
 
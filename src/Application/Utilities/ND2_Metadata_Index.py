@@ -0,0 +1,132 @@
+"""
+A cached index of the acquisition parameters of the recordings in an image directory.
+
+The frame count, frame interval, pixel size and image dimensions are read from the header of every recording once,
+in a process pool, and kept in a hidden index file in the image directory. An entry is reused as long as the size and
+modification time of its recording are unchanged, so rescanning a large acquisition directory only reads the
+headers of new or changed recordings. Within a session the index is also kept in memory, which saves reading the index
+file, but its entries are checked against the recordings in the same way.
+"""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from src.Application.Utilities.Diffusion_Coefficient_Engine import get_frame_interval_from_timesteps
+from src.Fiji.LoggerConfig import get_paint_logger
+
+paint_logger = get_paint_logger('ND2_Metadata_Index')
+
+METADATA_INDEX_FILE = '.Paint Metadata Index.json'
+METADATA_INDEX_VERSION = 1
+
+_metadata_index_cache = {}
+
+
+def read_nd2_metadata(recording_file_path):
+    """
+    Read the acquisition parameters from the header of a recording. This function runs in a worker process.
+    :return: A dictionary with 'Nr Frames', 'Frame Interval' (seconds), 'Pixel Size' (micrometer), 'Image Width' and
+    'Image Height' (pixels), missing values are None; or None if the header could not be read
+    """
+
+    from nd2reader import ND2Reader
+
+    try:
+        with ND2Reader(recording_file_path) as images:
+            sizes = images.sizes
+            return {'Nr Frames': int(sizes.get('t', 1)),
+                    'Frame Interval': get_frame_interval_from_timesteps(images.timesteps),
+                    'Pixel Size': images.metadata.get('pixel_microns') or None,
+                    'Image Width': int(sizes['x']),
+                    'Image Height': int(sizes['y'])}
+    except Exception as e:
+        paint_logger.warning(f"Could not read the metadata of {recording_file_path}: {e}")
+        return None
+
+
+def _read_index_file(index_file_path):
+    try:
+        with open(index_file_path, 'r') as index_file:
+            index = json.load(index_file)
+        if index.get('Version') == METADATA_INDEX_VERSION:
+            return index['Recordings']
+    except (OSError, ValueError, KeyError):
+        pass
+    return {}
+
+
+def _write_index_file(index_file_path, recordings):
+    # Written to a temporary file first, so an interrupted write does not leave a corrupt index
+    temp_file_path = index_file_path + '.tmp'
+    with open(temp_file_path, 'w') as index_file:
+        json.dump({'Version': METADATA_INDEX_VERSION, 'Recordings': recordings}, index_file, indent=1)
+    os.replace(temp_file_path, index_file_path)
+
+
+def get_metadata_index(image_directory, img_file_ext, max_workers=None):
+    """
+    Return the acquisition parameters of all recordings in the image directory, reading only the headers of
+    recordings that are new or changed since the index was written
+    :param image_directory: The directory with the recordings
+    :param img_file_ext: The extension of the recordings, e.g. '.nd2'
+    :param max_workers: The number of worker processes, defaults to the number of CPUs
+    :return: A dictionary with per file name the 'Size' and 'Mtime' of the recording and its acquisition parameters
+    (None when the header could not be read), sorted on file name
+    """
+
+    image_directory = os.path.abspath(image_directory)
+    index_file_path = os.path.join(image_directory, METADATA_INDEX_FILE)
+
+    # A recording rewritten in place does not change the modification time of the directory, so also the index kept in
+    # memory is only trusted for recordings whose size and modification time are unchanged
+    previous = _metadata_index_cache.get(image_directory)
+    if previous is None:
+        previous = _read_index_file(index_file_path)
+
+    recordings = {}
+    to_read = []
+    with os.scandir(image_directory) as it:
+        for entry in it:
+            if entry.name.startswith('.') or not entry.name.endswith(img_file_ext) or not entry.is_file():
+                continue
+            stat = entry.stat()
+            entry_previous = previous.get(entry.name)
+            if (entry_previous is not None and entry_previous['Size'] == stat.st_size and
+                    entry_previous['Mtime'] == stat.st_mtime):
+                recordings[entry.name] = entry_previous
+            else:
+                recordings[entry.name] = {'Size': stat.st_size, 'Mtime': stat.st_mtime}
+                to_read.append(entry.name)
+
+    if to_read:
+        paths = [os.path.join(image_directory, file_name) for file_name in to_read]
+        if len(paths) > 1:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                all_metadata = list(executor.map(read_nd2_metadata, paths))
+        else:
+            all_metadata = [read_nd2_metadata(paths[0])]
+        for file_name, metadata in zip(to_read, all_metadata):
+            recordings[file_name]['Metadata'] = metadata
+        paint_logger.debug("Read the metadata of %d recordings in %s", len(to_read), image_directory)
+
+    recordings = dict(sorted(recordings.items()))
+    if to_read or recordings.keys() != previous.keys():
+        try:
+            _write_index_file(index_file_path, recordings)
+        except OSError as e:
+            paint_logger.warning(f"Could not write the metadata index of {image_directory}: {e}")
+
+    _metadata_index_cache[image_directory] = recordings
+    return recordings
+
+
+def get_recording_metadata(metadata_index, recording_name, img_file_ext):
+    """
+    :return: The acquisition parameters of a recording, or an empty dictionary if they are not known
+    """
+
+    entry = metadata_index.get(recording_name + img_file_ext)
+    if entry is None or entry.get('Metadata') is None:
+        return {}
+    return entry['Metadata']
@@ -0,0 +1,182 @@
+"""
+Small, fast decoding versions of the TrackMate and Brightfield images.
+
+For every image a pyramid of JPEG thumbnails (512 and 128 pixels) is kept in a 'Thumbnails' directory next to it, in
+a subdirectory per size. Each level is made from the next larger one, so the full image is decoded only once.
+A thumbnail is up to date when it is not older than its image. The Recording Viewer uses the 512 level, which is far
+smaller than the TrackMate overlay captures, and the contact sheet the 128 level.
+
+write_contact_sheet puts the 128 pixel thumbnails of all recordings of a project on a single sheet, with an index
+that gives the position of every recording on it. Both are written to the Output directory of the project.
+"""
+
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageDraw
+
+from src.Application.Utilities.Directory_Index import get_experiment_names, OUTPUT_DIR
+from src.Fiji.LoggerConfig import get_paint_logger
+
+paint_logger = get_paint_logger('Thumbnails')
+
+THUMBNAIL_DIR = 'Thumbnails'
+THUMBNAIL_SIZES = (512, 128)  # Largest first, every level is made from the previous one
+THUMBNAIL_QUALITY = 85
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.tif', '.tiff', '.png')
+
+CONTACT_SHEET_FILE = 'Contact Sheet.jpg'
+CONTACT_SHEET_INDEX_FILE = 'Contact Sheet.csv'
+CONTACT_SHEET_TILE_SIZE = 128
+CONTACT_SHEET_COLUMNS = 12
+CONTACT_SHEET_LABEL_HEIGHT = 14
+
+
+def get_thumbnail_path(image_path, size):
+    """
+    The path of the thumbnail of an image, whether it exists or not
+    """
+
+    directory, file_name = os.path.split(image_path)
+    return os.path.join(directory, THUMBNAIL_DIR, str(size), os.path.splitext(file_name)[0] + '.jpg')
+
+
+def get_up_to_date_thumbnail(image_path, size):
+    """
+    :return: The path of the thumbnail of the image if it exists and is not older than the image, otherwise None
+    """
+
+    thumbnail_path = get_thumbnail_path(image_path, size)
+    try:
+        if os.path.getmtime(thumbnail_path) >= os.path.getmtime(image_path):
+            return thumbnail_path
+    except OSError:
+        pass
+    return None
+
+
+def make_thumbnails(image_path, force=False):
+    """
+    Make the thumbnail pyramid of an image, unless it is up to date
+    :return: None if the thumbnails were made or up to date, otherwise the error message
+    """
+
+    if not force and all(get_up_to_date_thumbnail(image_path, size) for size in THUMBNAIL_SIZES):
+        return None
+
+    try:
+        img = Image.open(image_path)
+        img.draft('RGB', (THUMBNAIL_SIZES[0], THUMBNAIL_SIZES[0]))  # Lets the JPEG decoder skip the full resolution
+        if img.mode not in ('L', 'RGB'):
+            img = img.convert('RGB')
+        for size in THUMBNAIL_SIZES:
+            img = img.copy()
+            img.thumbnail((size, size), Image.Resampling.BILINEAR)
+            thumbnail_path = get_thumbnail_path(image_path, size)
+            os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+            img.save(thumbnail_path, 'JPEG', quality=THUMBNAIL_QUALITY)
+    except Exception as e:
+        return str(e)
+    return None
+
+
+def make_thumbnails_for_directory(image_directory, force=False, max_workers=None):
+    """
+    Make the thumbnail pyramids of the images in a directory, in a process pool
+    :return: The number of images for which the thumbnails could not be made
+    """
+
+    if not os.path.isdir(image_directory):
+        return 0
+    image_paths = [entry.path for entry in os.scandir(image_directory)
+                   if entry.is_file() and not entry.name.startswith('.') and
+                   entry.name.lower().endswith(IMAGE_EXTENSIONS)]
+    if not force:
+        image_paths = [image_path for image_path in image_paths
+                       if not all(get_up_to_date_thumbnail(image_path, size) for size in THUMBNAIL_SIZES)]
+    if not image_paths:
+        return 0
+
+    if len(image_paths) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            errors = list(executor.map(make_thumbnails, image_paths, [True] * len(image_paths)))
+    else:
+        errors = [make_thumbnails(image_paths[0], force=True)]
+
+    nr_failed = 0
+    for image_path, error in zip(image_paths, errors):
+        if error is not None:
+            paint_logger.error(f"Could not make the thumbnails of {image_path}: {error}")
+            nr_failed += 1
+    paint_logger.debug("Made the thumbnails of %d images in %s", len(image_paths) - nr_failed, image_directory)
+    return nr_failed
+
+
+def get_contact_sheet_entries(project_directory):
+    """
+    The TrackMate images of all experiments in the project, in experiment and recording name order
+    :return: A list of (experiment name, ext recording name, image path) tuples
+    """
+
+    entries = []
+    for experiment_name in get_experiment_names(project_directory):
+        image_directory = os.path.join(project_directory, experiment_name, 'TrackMate Images')
+        if not os.path.isdir(image_directory):
+            continue
+        for file_name in sorted(os.listdir(image_directory)):
+            if file_name.startswith('.') or not file_name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            entries.append((experiment_name, os.path.splitext(file_name)[0], os.path.join(image_directory, file_name)))
+    return entries
+
+
+def write_contact_sheet(project_directory, nr_columns=CONTACT_SHEET_COLUMNS):
+    """
+    Write a contact sheet with the thumbnails of the TrackMate images of all recordings in the project, and an index
+    with the position of every recording on the sheet, to the Output directory of the project
+    :return: The path of the contact sheet, or None if there are no images
+    """
+
+    entries = get_contact_sheet_entries(project_directory)
+    if not entries:
+        paint_logger.warning(f"No TrackMate images found in {project_directory} for a contact sheet")
+        return None
+
+    for image_directory in sorted({os.path.dirname(image_path) for _, _, image_path in entries}):
+        make_thumbnails_for_directory(image_directory)
+
+    tile_height = CONTACT_SHEET_TILE_SIZE + CONTACT_SHEET_LABEL_HEIGHT
+    nr_rows = (len(entries) + nr_columns - 1) // nr_columns
+    sheet = Image.new('RGB', (nr_columns * CONTACT_SHEET_TILE_SIZE, nr_rows * tile_height), (255, 255, 255))
+    draw = ImageDraw.Draw(sheet)
+
+    index_rows = []
+    for position, (experiment_name, ext_recording_name, image_path) in enumerate(entries):
+        row_nr, col_nr = divmod(position, nr_columns)
+        x, y = col_nr * CONTACT_SHEET_TILE_SIZE, row_nr * tile_height
+        thumbnail_path = get_up_to_date_thumbnail(image_path, CONTACT_SHEET_TILE_SIZE)
+        if thumbnail_path is not None:
+            with Image.open(thumbnail_path) as thumbnail:
+                sheet.paste(thumbnail.convert('RGB'), (x, y))
+        draw.text((x + 2, y + CONTACT_SHEET_TILE_SIZE), ext_recording_name[:20], fill=(0, 0, 0))
+        index_rows.append({'Experiment Name': experiment_name,
+                           'Ext Recording Name': ext_recording_name,
+                           'Row Nr': row_nr + 1,
+                           'Col Nr': col_nr + 1,
+                           'Image Path': os.path.relpath(image_path, project_directory),
+                           'Thumbnail Path': os.path.relpath(thumbnail_path, project_directory) if thumbnail_path
+                           else ''})
+
+    # Files in the project directory itself would make it fail the project check
+    output_directory = os.path.join(project_directory, OUTPUT_DIR)
+    os.makedirs(output_directory, exist_ok=True)
+    sheet_path = os.path.join(output_directory, CONTACT_SHEET_FILE)
+    sheet.save(sheet_path, 'JPEG', quality=THUMBNAIL_QUALITY)
+    with open(os.path.join(output_directory, CONTACT_SHEET_INDEX_FILE), 'w', newline='') as index_file:
+        writer = csv.DictWriter(index_file, list(index_rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(index_rows)
+
+    paint_logger.info(f"Wrote a contact sheet of {len(entries)} recordings to {sheet_path}")
+    return sheet_path
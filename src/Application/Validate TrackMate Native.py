@@ -0,0 +1,33 @@
+import argparse
+import sys
+
+from src.Application.TrackMate_Native.Validate_TrackMate_Native import (
+    validate_against_trackmate,
+    DEFAULT_MATCH_DISTANCE)
+from src.Application.Utilities.General_Support_Functions import set_pandas_options
+from src.Fiji.LoggerConfig import paint_logger_change_file_handler_name
+
+paint_logger_change_file_handler_name('Validate TrackMate Native.log')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare the output of Run TrackMate Native with that of TrackMate for the same experiment')
+    parser.add_argument('--reference-directory', required=True,
+                        help='The experiment directory with the TrackMate output')
+    parser.add_argument('--native-directory', required=True,
+                        help='The experiment directory with the Run TrackMate Native output')
+    parser.add_argument('--max-distance', type=float, default=DEFAULT_MATCH_DISTANCE,
+                        help='The maximum distance in micrometer between the locations of matching tracks')
+    parser.add_argument('--report-file',
+                        help='Where to write the report, by default in the Output directory of the native experiment')
+    args = parser.parse_args()
+    set_pandas_options()
+
+    if validate_against_trackmate(args.reference_directory, args.native_directory, args.max_distance,
+                                  args.report_file) is None:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,7 @@ import os
 import shutil
 
 from ij import IJ
-
+from loci.plugins import BF
 
 from LoggerConfig import (
     paint_logger,
@@ -57,11 +57,11 @@ def convert_bf_images(image_source_directory, paint_directory, force=False):
 
                 if convert:
                     try:
-                        # Open the image using Bio-Formats and save as JPEG
-                        nd2_arg = "open=[%s]" % input_file
-                        IJ.run("Bio-Formats (Windowless)", nd2_arg)
-                        IJ.saveAs("Jpeg", output_file)
-                        IJ.getImage().close()  # Close the image after saving
+                        # Open the image using Bio-Formats and save as JPEG, without a window so this also
+                        # works when Fiji runs headless
+                        imp = BF.openImagePlus(input_file)[0]
+                        IJ.saveAs(imp, "Jpeg", output_file)
+                        imp.close()  # Close the image after saving
                         paint_logger.info("Image %s was updated.", display_name)
                         converted += 1
                     except Exception as e:
@@ -3,6 +3,7 @@ import sys
 import time
 
 import java.lang
+from java.awt import GraphicsEnvironment
 from java.io import PrintStream, ByteArrayOutputStream
 from java.lang import System
 from javax.swing import JFileChooser
@@ -30,6 +31,15 @@ def ask_user_for_file(prompt='Select File'):
         return ""
 
 
+def fiji_is_headless():
+    """
+    Determine if Fiji runs without a display, e.g. when started with --headless on a compute node
+    :return: True if no windows or dialogs can be shown
+    """
+
+    return GraphicsEnvironment.isHeadless()
+
+
 def fiji_get_file_open_write_attribute():
     """
     Returns an open write attribute that works both on macOS and Windows
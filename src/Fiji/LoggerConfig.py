@@ -1,6 +1,13 @@
+import atexit
 import logging
 import os
-from os import path
+
+# Jython 2.7 has no queue handlers, queue logging is then not available
+try:
+    import queue
+    from logging.handlers import QueueHandler, QueueListener
+except ImportError:
+    QueueHandler = QueueListener = None
 
 DEBUG = logging.DEBUG
 INFO = logging.INFO
@@ -8,7 +15,12 @@ WARNING = logging.WARNING
 ERROR = logging.ERROR
 CRITICAL = logging.CRITICAL
 
+LEVELS = {'DEBUG': DEBUG, 'INFO': INFO, 'WARNING': WARNING, 'ERROR': ERROR, 'CRITICAL': CRITICAL}
+
 paint_logger_file_name_assigned = False
+paint_logger_configured = False  # The Logging section of the configuration is applied once
+levels_set_by_application = set()  # 'Console Level' and/or 'File Level', the configuration does not override these
+queue_listener = None
 
 # ----------------------------------------------------------
 # Set up the logging
@@ -30,10 +42,24 @@ console_handler.setFormatter(formatter)
 # Set up the file handler
 # ----------------------------------------------------------
 
-# file_handler = logging.FileHandler(os.path.join(get_paint_logger_directory(), 'paint.log'), mode='w')  # Logs to a file
-file_handler = logging.FileHandler(os.path.join(os.path.expanduser('~'), 'Paint', 'Logger', 'paint.log'),
-                                   mode='w')  # Logs to a file   #ToDo
-file_handler.setLevel(logging.INFO)  # All logs at INFO level or higher go to the console
+class PaintFileHandler(logging.FileHandler):
+    """
+    Logs to a file in the Paint Logger directory. The file, and the directory, are only created when the first record
+    is written, so importing this module has no side effects and an application that renames its log file right
+    away does not also truncate paint.log.
+    """
+
+    def __init__(self, file_name):
+        logging.FileHandler.__init__(
+            self, os.path.join(os.path.expanduser('~'), 'Paint', 'Logger', file_name), mode='w', delay=True)
+
+    def _open(self):
+        get_paint_logger_directory()
+        return logging.FileHandler._open(self)
+
+
+file_handler = PaintFileHandler('paint.log')
+file_handler.setLevel(logging.INFO)  # All logs at INFO level or higher go to the file
 file_handler.setFormatter(formatter)
 
 # ----------------------------------------------------------
@@ -48,6 +74,20 @@ paint_logger.addHandler(file_handler)
 # Functions that can be called from the application
 # ----------------------------------------------------------
 
+def get_paint_logger(module_name):
+    """
+    The logger of a module, a child of paint_logger whose level can be set in the Logging section of Paint.json
+    :param module_name: The name of the module, e.g. 'Generate_Squares'
+    """
+
+    return logging.getLogger('paint.' + module_name)
+
+
+def _update_logger_level():
+    # The logger itself passes only what a handler will write, so filtered messages are not even formatted
+    paint_logger.setLevel(min(console_handler.level, file_handler.level))
+
+
 # Get the directory where the log files will be stored
 def get_paint_logger_directory():
     sub_dir = 'Logger'
@@ -57,24 +97,23 @@ def get_paint_logger_directory():
     return os.path.join(conf_dir, sub_dir)
 
 
-# Change the log level of the file logger
-def paint_logger_file_handle_set_level(level):
-    global file_handler
-
+def _set_handler_level(handler, level):
     if level not in (logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR, logging.CRITICAL):
         raise ValueError("Invalid level: {}".format(level))
-    else:
-        file_handler.setLevel(level)
+    handler.setLevel(level)
+    _update_logger_level()
+
+
+# Change the log level of the file logger
+def paint_logger_file_handle_set_level(level):
+    _set_handler_level(file_handler, level)
+    levels_set_by_application.add('File Level')
 
 
 # Change the log level of the console logger
 def paint_logger_console_handle_set_level(level):
-    global console_handler
-
-    if level not in (logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR, logging.CRITICAL):
-        raise ValueError("Invalid level: {}.format(level)")
-    else:
-        console_handler.setLevel(level)
+    _set_handler_level(console_handler, level)
+    levels_set_by_application.add('Console Level')
 
 
 # Change the file name of the file logger
@@ -82,11 +121,124 @@ def paint_logger_change_file_handler_name(file_name):
     global file_handler
     global paint_logger_file_name_assigned
 
-    paint_logger.removeHandler(file_handler)
+    # With queue logging, the listener is stopped while its file handler is replaced
+    if queue_listener is not None:
+        queue_listener.stop()
+    else:
+        paint_logger.removeHandler(file_handler)
+    file_handler.close()
 
-    file_handler = logging.FileHandler(path.join(get_paint_logger_directory(), file_name), mode='w')  # Logs to a file
-    file_handler.setLevel(logging.INFO)  # All logs at INFO level or higher go to the console
+    level = file_handler.level
+    file_handler = PaintFileHandler(file_name)
+    file_handler.setLevel(level)
     file_handler.setFormatter(formatter)
 
-    paint_logger.addHandler(file_handler)
+    if queue_listener is not None:
+        queue_listener.handlers = (console_handler, file_handler)
+        queue_listener.start()
+    else:
+        paint_logger.addHandler(file_handler)
     paint_logger_file_name_assigned = True
+
+
+def paint_logger_use_queue():
+    """
+    Let the console and file handlers write from a background thread. A paint_logger call then only puts the record
+    on a queue, so slow consoles (e.g. over SSH) and log files on network directories do not hold up processing.
+    The queued records are written when the program exits.
+    Worker processes log directly: a spawned worker does not start a listener, and a forked one does not inherit the
+    listener thread, so it returns to the direct handlers (see _use_direct_handlers).
+    :return: True if queue logging is active, it is not available in Jython
+    """
+
+    global queue_listener
+
+    if queue_listener is not None:
+        return True
+    if QueueHandler is None or _in_worker_process():
+        return False
+
+    log_queue = queue.Queue(-1)
+    paint_logger.removeHandler(console_handler)
+    paint_logger.removeHandler(file_handler)
+    paint_logger.addHandler(QueueHandler(log_queue))
+    queue_listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    queue_listener.start()
+    atexit.register(paint_logger_stop_queue)
+    return True
+
+
+def paint_logger_stop_queue():
+    """
+    Write the queued records and log directly from the calling thread again
+    """
+
+    if queue_listener is None:
+        return
+    queue_listener.stop()
+    _use_direct_handlers()
+
+
+def _use_direct_handlers():
+    # Replace the queue handler by the console and file handlers, without a listener to stop
+    global queue_listener
+
+    if queue_listener is None:
+        return
+    queue_listener = None
+    for handler in list(paint_logger.handlers):
+        if isinstance(handler, QueueHandler):
+            paint_logger.removeHandler(handler)
+    paint_logger.addHandler(console_handler)
+    paint_logger.addHandler(file_handler)
+
+
+def _in_worker_process():
+    try:
+        import multiprocessing
+        return multiprocessing.parent_process() is not None
+    except (ImportError, AttributeError):
+        return False
+
+
+# A forked worker process inherits the queue handler but not the listener thread, its records would never be written
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_use_direct_handlers)
+
+
+def _get_level(level_name):
+    level = LEVELS.get(str(level_name).upper())
+    if level is None:
+        paint_logger.error("Invalid log level '{}' in the Logging configuration".format(level_name))
+    return level
+
+
+def paint_logger_configure(logging_config):
+    """
+    Apply the Logging section of the Paint configuration, only the first time it is called:
+        'Console Level' and 'File Level': the levels of the console and file handlers, unless the application has
+            already set them
+        'Module Levels': the level per module logger (see get_paint_logger), e.g. {"Generate_Squares": "DEBUG"}
+        'Queue': log from a background thread (see paint_logger_use_queue)
+    :param logging_config: The Logging section, may be None
+    """
+
+    global paint_logger_configured
+
+    if paint_logger_configured or not logging_config:
+        return
+    paint_logger_configured = True
+
+    for key, handler in (('Console Level', console_handler), ('File Level', file_handler)):
+        if key in logging_config and key not in levels_set_by_application:
+            level = _get_level(logging_config[key])
+            if level is not None:
+                _set_handler_level(handler, level)
+
+    for module_name, level_name in logging_config.get('Module Levels', {}).items():
+        level = _get_level(level_name)
+        if level is not None:
+            get_paint_logger(module_name).setLevel(level)
+
+    if logging_config.get('Queue', False):
+        paint_logger_use_queue()
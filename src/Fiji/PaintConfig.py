@@ -11,13 +11,13 @@ def get_paint_defaults_file_path():  # ToDo
 
 # Import for Jython
 try:
-    from LoggerConfig import paint_logger
+    from LoggerConfig import paint_logger, paint_logger_configure
 except:
     pass
 
 # Import for Python
 try:
-    from src.Fiji.LoggerConfig import paint_logger
+    from src.Fiji.LoggerConfig import paint_logger, paint_logger_configure
 except:
     pass
 
@@ -36,6 +36,12 @@ default_data = {
         "Images Directory": "~",
         "Level": "Experiment"
     },
+    "Logging": {
+        "Queue": True,
+        "Console Level": "DEBUG",
+        "File Level": "INFO",
+        "Module Levels": {}
+    },
     "Generate Squares": {
         "Plot to File": False,
         "Plot Max": 5,
@@ -49,6 +55,7 @@ default_data = {
         'Min Allowable R Squared': 0.9,
         "Min Required Density Ratio": 2.0,
         "Max Allowable Variability": 10.0,
+        "Diffusion Coefficient Method": "First Spot",
 
         "logging": {
             "level": "INFO",
@@ -87,7 +94,8 @@ default_data = {
         "RADIUS": 0.5,
         "TARGET_CHANNEL": 1,
         "DO_MEDIAN_FILTERING": False,
-        "TRACK_COLOURING": "TRACK_DURATION"
+        "TRACK_COLOURING": "TRACK_DURATION",
+        "ANALYZER_PROFILE": "minimal"
     }
 }
 
@@ -110,7 +118,6 @@ def load_paint_config(file_path):
     try:
         with open(file_path, 'r') as config_file:
             paint_configuration = json.load(config_file)
-        return paint_configuration
     except IOError:
         paint_logger.error("Error: Configuration file {} not found.".format(file_path))
         return None
@@ -121,6 +128,9 @@ def load_paint_config(file_path):
         paint_logger.error("Error: Problem with configuration file {}.".format(file_path))
         return None
 
+    paint_logger_configure(paint_configuration.get('Logging'))
+    return paint_configuration
+
 
 def get_paint_attribute(application, attribute_name):
     config = load_paint_config(get_paint_defaults_file_path())
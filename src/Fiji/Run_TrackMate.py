@@ -1,4 +1,6 @@
+import argparse
 import csv
+import json
 import os
 import sys
 import threading
@@ -15,13 +17,17 @@ from DirectoriesAndLocations import (
 
 from PaintConfig import (
     get_paint_attribute,
-    update_paint_attribute
+    update_paint_attribute,
+    load_paint_config,
+    get_paint_defaults_file_path
 )
-from Trackmate import execute_trackmate_in_Fiji
+from Trackmate import (
+    execute_trackmate_in_Fiji,
+    execute_trackmate_in_Fiji_for_thresholds)
 
 from FijiSupportFunctions import (
     fiji_get_file_open_write_attribute,
-    fiji_get_file_open_append_attribute,
+    fiji_is_headless,
     suppress_fiji_output,
     format_time_nicely)
 
@@ -31,10 +37,33 @@ from LoggerConfig import (
 
 from ConvertBrightfieldImages import convert_bf_images
 
+from TrackMateCheckpoint import (
+    TrackMateCheckpoint,
+    get_settings_hash,
+    get_recording_signature,
+    merge_trackmate_results)
+
 paint_logger_change_file_handler_name('Grid Process Batch.log')
 
+# The columns Run TrackMate adds to those of the Experiment Info file to make the All Recordings file
+TRACKMATE_COLUMNS = ['Nr Spots', 'Nr Tracks', 'Run Time', 'Ext Recording Name', 'Recording Size', 'Time Stamp',
+                     'Frame Interval']
+
+
+def show_warning(msg, headless):
+    """
+    Log the warning and, when there is a user to see it, also show it in a dialog
+    :param msg: The warning
+    :param headless: No dialogs are shown in headless mode
+    :return:
+    """
+
+    paint_logger.warning(msg)
+    if not headless:
+        JOptionPane.showMessageDialog(None, msg, "Warning", JOptionPane.WARNING_MESSAGE)
+
 
-def run_trackmate(experiment_directory, recording_source_directory):
+def run_trackmate(experiment_directory, recording_source_directory, headless=False, progress_file_path=None):
     # Open the experiment file to determine the columns (which should be in the paint directory)
 
     experiment_info_path = get_experiment_info_file_path(experiment_directory)
@@ -42,18 +71,13 @@ def run_trackmate(experiment_directory, recording_source_directory):
     if not os.path.exists(experiment_info_path):
         msg = "Warning: The file '{}' does not exist.".format(experiment_info_path)
         paint_logger.error(msg)
-        JOptionPane.showMessageDialog(None, msg, "Warning", JOptionPane.WARNING_MESSAGE)
-        suppress_fiji_output
+        if not headless:
+            JOptionPane.showMessageDialog(None, msg, "Warning", JOptionPane.WARNING_MESSAGE)
+        suppress_fiji_output()
         sys.exit()
 
-    image_dir = os.path.join(experiment_directory, 'TrackMate Images')
-    if not os.path.exists(image_dir):
-        os.mkdir(image_dir)
-    else:
-        for filename in os.listdir(image_dir):
-            file_path = os.path.join(image_dir, filename)
-            if os.path.isfile(file_path):
-                os.remove(file_path)  # Delete the file
+    img_file_ext = get_paint_attribute('Paint', 'Image File Extension')
+    settings_hash = get_settings_hash(load_paint_config(get_paint_defaults_file_path())['TrackMate'])
 
     with open(experiment_info_path, mode='r') as experiment_info_file:
         csv_reader = csv.DictReader(experiment_info_file)
@@ -65,24 +89,46 @@ def run_trackmate(experiment_directory, recording_source_directory):
             sys.exit()
 
         try:
-            # Count how many recordings need to be processed
+            # Count how many recordings need to be processed and describe their inputs
             count = 0
             nr_to_process = 0
+            signatures = {}
             for row in csv_reader:
                 if 'y' in row['Process'].lower():
                     nr_to_process += 1
+                    signatures[row['Recording Name']] = get_recording_signature(
+                        os.path.join(recording_source_directory, row['Recording Name'] + img_file_ext),
+                        row['Threshold'], settings_hash)
                 count += 1
             if nr_to_process == 0:
                 paint_logger.warning("No recordings selected for processing")
                 return -1
 
+            # Find out what an earlier run already did. All Recordings is not one of the output files that must be
+            # unchanged, it is always rewritten so that edits to the Experiment Info file are taken over
+            checkpoint = TrackMateCheckpoint(experiment_directory)
+            all_tracks_file_path = os.path.join(experiment_directory, "All Tracks.csv")
+            all_spots_file_path = os.path.join(experiment_directory, "All Spots.csv")
+            experiment_output_files = [all_tracks_file_path, all_spots_file_path]
+            run_complete = checkpoint.is_complete(signatures, experiment_output_files)
+            if run_complete:
+                paint_logger.info("The recordings in directory " + recording_source_directory +
+                                  " were already processed with the same inputs and settings, only All Recordings" +
+                                  " is written")
+            elif checkpoint.is_resumable():
+                paint_logger.info("Resuming an interrupted run, completed recordings are not processed again")
+                prepare_trackmate_images_directory(experiment_directory, delete_existing=False)
+            else:
+                checkpoint.clear()
+                prepare_trackmate_images_directory(experiment_directory, delete_existing=True)
+
             message = "Processing " + str(nr_to_process) + " recordings in directory " + recording_source_directory
             paint_logger.info(message)
 
             # Initialise the All Recordings file with the column headers
-            col_names = csv_reader.fieldnames + ['Nr Spots', 'Nr Tracks', 'Run Time', 'Ext Recording Name',
-                                                 'Recording Size', 'Time Stamp']
-            experiment_tm_file_path = initialise_experiment_tm_file(experiment_directory, col_names)
+            col_names = csv_reader.fieldnames + TRACKMATE_COLUMNS
+            status_writer = StatusWriter(get_experiment_tm_file_path(experiment_directory), col_names,
+                                         progress_file_path)
 
             # And now cycle through the experiment file
             nr_recording_processed = 0
@@ -100,85 +146,178 @@ def run_trackmate(experiment_directory, recording_source_directory):
                         "Processing file nr " + str(file_count) + " of " + str(nr_to_process) + ": " + row[
                             'Recording Name'])
 
-                    status, row = process_recording(row, recording_source_directory, experiment_directory)
+                    recording_name = row['Recording Name']
+                    completed = checkpoint.completed_results(recording_name, signatures[recording_name])
+                    if completed is not None:
+                        paint_logger.info("Recording " + recording_name + " was completed in an earlier run")
+                        completed_status, results = completed
+                        normalise_experiment_info_row(row)
+                        rows = merge_trackmate_results(row, results)
+                        if completed_status == 'OK':
+                            nr_recording_processed += 1
+                        else:
+                            nr_recording_not_found += 1
+                        status = 'DONE'
+                    else:
+                        status, rows = process_recording(row, recording_source_directory, experiment_directory,
+                                                         headless)
+                        output_files = get_recording_output_files(experiment_directory, rows) if status == 'OK' else []
+                        checkpoint.record_recording(recording_name, signatures[recording_name], status,
+                                                    get_trackmate_results(rows), output_files)
                     if status == 'OK':
                         nr_recording_processed += 1
                     elif status == 'NOT_FOUND':
                         nr_recording_not_found += 1
                     elif status == 'FAILED':
                         nr_recording_not_found += 1
-
-                write_row_to_temp_file(row, experiment_tm_file_path, col_names)
+                    status_writer.write_recording(status, rows, experiment_directory)
+                else:
+                    status_writer.write_row(row)
+            status_writer.close()
 
             paint_logger.info("Number of recordings processed successfully:      " + str(nr_recording_processed))
             paint_logger.info("Number of recordings not found:                   " + str(nr_recording_not_found))
             paint_logger.info("Number of recordings not  successfully processed: " + str(nr_recording_failed))
 
             if nr_recording_processed == 0:
-                msg = "No recordings processed successfully. Refer to Paint log for details."
-                paint_logger.warning(msg)
-                JOptionPane.showMessageDialog(None, msg, "Warning", JOptionPane.WARNING_MESSAGE)
+                show_warning("No recordings processed successfully. Refer to Paint log for details.", headless)
             elif nr_recording_not_found:
-                msg = "Some recordings were not found. Refer to Paint log for details."
-                paint_logger.warning(msg)
-                JOptionPane.showMessageDialog(None, msg, "Warning", JOptionPane.WARNING_MESSAGE)
+                show_warning("Some recordings were not found. Refer to Paint log for details.", headless)
+
+            if run_complete:
+                # Nothing was processed again, All Tracks and All Spots are still those of the completed run
+                return 0
 
             # -----------------------------------------------------------------------------
-            # Concatenate the Tracks file with the existing one
+            # Concatenate the Tracks and Spots files of the recordings
             # -----------------------------------------------------------------------------
 
-            # Define the directory to search in
-            keywords = ["threshold", "tracks"]
-            matching_files = []
+            concatenate_recording_files(experiment_directory, ["threshold", "track"], all_tracks_file_path)
+            concatenate_recording_files(experiment_directory, ["threshold", "spots"], all_spots_file_path,
+                                        create_empty=False)
 
-            # Loop through each file in the directory
-            for filename in os.listdir(experiment_directory):
-                # Check if it's a CSV file and if all keywords are in the filename
-                if filename.endswith('.csv') and all(keyword in filename.lower() for keyword in ["threshold", "track"]):
-                    matching_files.append(os.path.join(experiment_directory, filename))
-            matching_files.sort()
+            # The run is complete, the per recording tracks files are now part of All Tracks
+            checkpoint.record_complete(signatures, experiment_output_files)
 
-            # Define the output file
-            output_file = os.path.join(experiment_directory, "All Tracks.csv")
+        except KeyError as e:
+            paint_logger.error("Run_Trackmate: Missing expected column in row: {}.format(e)")
+            suppress_fiji_output()
+            sys.exit(0)
 
-            # Open the output file in write mode
-            with open(output_file, 'w') as outfile:
-                writer = None
+    convert_bf_images(recording_source_directory, experiment_directory, force=True)
 
-                # Loop through each CSV file
-                for filename in matching_files:
-                    with open(filename, 'r') as infile:
-                        reader = csv.reader(infile)
-                        header = next(reader)  # Read the header row
 
-                        # Write the header only once, when the writer is None
-                        if writer is None:
-                            writer = csv.writer(outfile)
-                            writer.writerow(header)
+def concatenate_recording_files(experiment_directory, keywords, output_file, create_empty=True):
+    """
+    Concatenate the csv files of the recordings that have all keywords in their name into one file and remove them
+    :param experiment_directory: The directory to search in
+    :param keywords: The keywords that must be in the file name
+    :param output_file: The file to write
+    :param create_empty: Write the output file also when there are no matching files
+    :return:
+    """
 
-                        # Write the rest of the rows
-                        for row in reader:
-                            writer.writerow(row)
+    matching_files = []
 
-            for filename in matching_files:
-                os.remove(filename)
+    # Loop through each file in the directory
+    for filename in os.listdir(experiment_directory):
+        # Check if it's a CSV file and if all keywords are in the filename
+        if filename.endswith('.csv') and all(keyword in filename.lower() for keyword in keywords):
+            matching_files.append(os.path.join(experiment_directory, filename))
+    matching_files.sort()
 
-        except KeyError as e:
-            paint_logger.error("Run_Trackmate: Missing expected column in row: {}.format(e)")
-            suppress_fiji_output()
-            sys.exit(0)
+    if not matching_files and not create_empty:
+        return
 
-    convert_bf_images(recording_source_directory, experiment_directory, force=True)
+    # Open the output file in write mode
+    with open(output_file, 'w') as outfile:
+        writer = None
 
+        # Loop through each CSV file
+        for filename in matching_files:
+            with open(filename, 'r') as infile:
+                reader = csv.reader(infile)
+                header = next(reader)  # Read the header row
 
-def process_recording(row, recording_source_directory, experiment_directory):
-    status = 'OK'
-    recording_name = row['Recording Name']
-    threshold = float(row['Threshold'])
+                # Write the header only once, when the writer is None
+                if writer is None:
+                    writer = csv.writer(outfile)
+                    writer.writerow(header)
+
+                # Write the rest of the rows
+                for row in reader:
+                    writer.writerow(row)
+
+    for filename in matching_files:
+        os.remove(filename)
+
+
+def prepare_trackmate_images_directory(experiment_directory, delete_existing=True):
+    image_dir = os.path.join(experiment_directory, 'TrackMate Images')
+    if not os.path.exists(image_dir):
+        os.mkdir(image_dir)
+    elif delete_existing:
+        for filename in os.listdir(image_dir):
+            file_path = os.path.join(image_dir, filename)
+            if os.path.isfile(file_path):
+                os.remove(file_path)  # Delete the file
+
+
+def get_recording_output_files(experiment_directory, rows):
+    """
+    The files TrackMate wrote for a recording: a tracks file, a spots file and an image for every threshold
+    """
 
+    output_files = []
+    for row in rows:
+        output_files.append(os.path.join(experiment_directory, row['Ext Recording Name'] + '-tracks.csv'))
+        output_files.append(os.path.join(experiment_directory, row['Ext Recording Name'] + '-spots.csv'))
+        output_files.append(os.path.join(experiment_directory, 'TrackMate Images', row['Ext Recording Name'] + '.jpg'))
+    return output_files
+
+
+def get_trackmate_results(rows):
+    """
+    The columns TrackMate filled in for a recording, one dictionary per threshold, to be kept in the checkpoint
+    """
+
+    return [dict((column, row.get(column)) for column in ['Threshold'] + TRACKMATE_COLUMNS) for row in rows]
+
+
+def normalise_experiment_info_row(row):
     if row['Adjuvant'] == 'None':
         row['Adjuvant'] = 'No'
 
+
+def get_thresholds(threshold_value):
+    """
+    The Threshold in the Experiment Info file is a single value or, for a threshold sweep, several values separated
+    by ';', e.g. '10;20;30'
+    :param threshold_value: The value of the Threshold column
+    :return: The list of thresholds, in the order specified
+    """
+
+    return [float(value) for value in threshold_value.replace(';', ' ').split()]
+
+
+def process_recording(row, recording_source_directory, experiment_directory, headless=False, nr_threads=None):
+    """
+    Run TrackMate on a single recording and fill in the TrackMate results in the row.
+    When the row specifies several thresholds, detection is done once and a row is returned for every threshold.
+    :param row: The row of the recording in the Experiment Info file
+    :param recording_source_directory: The directory with the recordings
+    :param experiment_directory: The directory where the tracks file and TrackMate image are written
+    :param headless: In headless mode the recording is not displayed and there is no pause after processing
+    :param nr_threads: The number of threads TrackMate may use, all processors if None
+    :return: A (status, rows) tuple, with status 'OK', 'NOT_FOUND' or 'FAILED' and a row per threshold
+    """
+
+    status = 'OK'
+    recording_name = row['Recording Name']
+    thresholds = get_thresholds(row['Threshold'])
+
+    normalise_experiment_info_row(row)
+
     img_file_ext = get_paint_attribute('Paint', 'Image File Extension')
     recording_file_name = os.path.join(recording_source_directory, recording_name + img_file_ext)
 
@@ -186,76 +325,178 @@ def process_recording(row, recording_source_directory, experiment_directory):
         paint_logger.warning("Processing: Failed to open recording: " + recording_file_name)
         row['Recording Size'] = 0
         status = 'NOT_FOUND'
-    else:
-        row['Recording Size'] = os.path.getsize(recording_file_name)
-        imp = IJ.openImage(recording_file_name)
+        return status, [row]
 
-        imp.show()
-        IJ.run("Enhance Contrast", "saturated=0.35")
-        IJ.run("Grays")
+    row['Recording Size'] = os.path.getsize(recording_file_name)
+    imp = IJ.openImage(recording_file_name)
 
-        # Set the scale
-        # IJ.run("Set Scale...", "distance=6.2373 known=1 unit=micron")
-        # IJ.run("Scale Bar...", "width=10 height=5 thickness=3 bold overlay")
+    # The time between frames from the recording metadata, used to calculate the diffusion coefficients
+    frame_interval = imp.getCalibration().frameInterval
+    row['Frame Interval'] = round(frame_interval, 6) if frame_interval > 0 else ''
 
-        ext_recording_name = recording_name + "-threshold-" + str(int(threshold))
+    # The contrast is applied to the image itself, so the saved TrackMate image is the same in both modes
+    IJ.run(imp, "Enhance Contrast", "saturated=0.35")
+    IJ.run(imp, "Grays", "")
+    if not headless:
+        imp.show()
 
-        time_stamp = time.time()
-        tracks_file_path = os.path.join(experiment_directory, ext_recording_name + '-tracks.csv')
-        recording_file_path = os.path.join(experiment_directory, 'TrackMate Images', ext_recording_name + '.jpg')
+    # Set the scale
+    # IJ.run("Set Scale...", "distance=6.2373 known=1 unit=micron")
+    # IJ.run("Scale Bar...", "width=10 height=5 thickness=3 bold overlay")
+
+    ext_recording_names = [recording_name + "-threshold-" + str(int(threshold)) for threshold in thresholds]
+    tracks_file_paths = [os.path.join(experiment_directory, ext_recording_name + '-tracks.csv')
+                         for ext_recording_name in ext_recording_names]
+    recording_file_paths = [os.path.join(experiment_directory, 'TrackMate Images', ext_recording_name + '.jpg')
+                            for ext_recording_name in ext_recording_names]
 
+    time_stamp = time.time()
+    if len(thresholds) == 1:
         # suppress_fiji_output()
-        nr_spots, total_tracks, long_tracks = execute_trackmate_in_Fiji(
-            ext_recording_name, threshold, tracks_file_path, recording_file_path, False)
+        results = [execute_trackmate_in_Fiji(
+            ext_recording_names[0], thresholds[0], tracks_file_paths[0], recording_file_paths[0], False, imp=imp,
+            headless=headless, nr_threads=nr_threads, export_spots=True)]
         # restore_fiji_output()
+    else:
+        paint_logger.info("Threshold sweep over {} thresholds, with a single detection".format(len(thresholds)))
+        results = execute_trackmate_in_Fiji_for_thresholds(
+            ext_recording_names, thresholds, tracks_file_paths, recording_file_paths, imp, headless=headless,
+            nr_threads=nr_threads, export_spots=True)
 
-        # IJ.run("Set Scale...", "distance=6.2373 known=1 unit=micron")
-        # IJ.run("Scale Bar...", "width=10 height=5 thickness=3 bold overlay")
+    # IJ.run("Set Scale...", "distance=6.2373 known=1 unit=micron")
+    # IJ.run("Scale Bar...", "width=10 height=5 thickness=3 bold overlay")
 
-        if nr_spots == -1:
-            paint_logger.error("\n'Process single recording' did not manage to run 'paint_trackmate'")
-            status = 'FAILED'
-        else:
-            time.sleep(3)  # Display the recording for 3 seconds
-        run_time = round(time.time() - time_stamp, 1)
+    if any(nr_spots == -1 for nr_spots, _, _ in results):
+        paint_logger.error("\n'Process single recording' did not manage to run 'paint_trackmate'")
+        status = 'FAILED'
+    elif not headless:
+        time.sleep(3)  # Display the recording for 3 seconds
 
-        paint_logger.debug('Nr of spots: ' + str(nr_spots) + " processed in " + str(run_time) + " seconds")
-        imp.close()
+    # For a sweep the run time is that of the whole sweep, as the detection is shared
+    run_time = round(time.time() - time_stamp, 1)
+    imp.close()
 
-        # Update the row
-        row['Nr Spots'] = nr_spots
-        row['Nr Tracks'] = long_tracks
-        row['Run Time'] = run_time
-        row['Ext Recording Name'] = ext_recording_name
-        row['Time Stamp'] = time.asctime(time.localtime(time.time()))
-
-    return status, row
-
-
-def initialise_experiment_tm_file(experiment_directory, column_names):
-    temp_file_path = get_experiment_tm_file_path(experiment_directory)
-    try:
-        temp_file = open(temp_file_path, fiji_get_file_open_write_attribute())
-        temp_writer = csv.DictWriter(temp_file, column_names)
-        temp_writer.writeheader()
-        temp_file.close()
-        return temp_file_path
-    except IOError:
-        paint_logger.error("Could not open results file:" + temp_file_path)
-        suppress_fiji_output()
-        sys.exit(-1)
+    rows = []
+    for threshold, ext_recording_name, (nr_spots, total_tracks, long_tracks) in zip(
+            thresholds, ext_recording_names, results):
+        paint_logger.debug('Nr of spots: %d processed in %s seconds', nr_spots, run_time)
 
+        # Update the row
+        threshold_row = dict(row)
+        if len(thresholds) > 1:
+            threshold_row['Threshold'] = str(int(threshold))
+        threshold_row['Nr Spots'] = nr_spots
+        threshold_row['Nr Tracks'] = long_tracks
+        threshold_row['Run Time'] = run_time
+        threshold_row['Ext Recording Name'] = ext_recording_name
+        threshold_row['Time Stamp'] = time.asctime(time.localtime(time.time()))
+        rows.append(threshold_row)
+
+    return status, rows
+
+
+class StatusWriter(object):
+    """
+    Writes the All Recordings file (or the status file of a job) for the duration of a run.
+    The file is opened once. Rows are flushed and synced to disk every flush_interval rows and after every
+    processed recording, so a crash loses at most the rows of recordings that were not processed.
+    Optionally every processed recording is also reported as a JSON line on a progress stream, for monitoring long
+    batches: a file path, or '-' for standard output.
+    """
+
+    def __init__(self, file_path, column_names, progress_file_path=None, flush_interval=20):
+        self.file_path = file_path
+        self.flush_interval = flush_interval
+        self.rows_since_flush = 0
+        try:
+            self.file = open(file_path, fiji_get_file_open_write_attribute())
+        except IOError:
+            paint_logger.error("Could not open results file:" + file_path)
+            suppress_fiji_output()
+            sys.exit(-1)
+        self.writer = csv.DictWriter(self.file, column_names)
+        self.writer.writeheader()
+
+        if progress_file_path is None:
+            self.progress_file = None
+        elif progress_file_path == '-':
+            self.progress_file = sys.stdout
+        else:
+            self.progress_file = open(progress_file_path, 'a')
 
-def write_row_to_temp_file(row, temp_file_path, column_names):
-    try:
-        temp_file = open(temp_file_path, fiji_get_file_open_append_attribute())
-        temp_writer = csv.DictWriter(temp_file, column_names)
-        temp_writer.writerow(row)
-        temp_file.close()
-    except IOError:
-        paint_logger.error("Could not write results file:" + temp_file_path)
-        suppress_fiji_output()
-        sys.exit()
+    def write_row(self, row):
+        try:
+            self.writer.writerow(row)
+        except IOError:
+            paint_logger.error("Could not write results file:" + self.file_path)
+            suppress_fiji_output()
+            sys.exit()
+        self.rows_since_flush += 1
+        if self.rows_since_flush >= self.flush_interval:
+            self.flush()
+
+    def write_recording(self, status, rows, experiment_directory):
+        """
+        Write the rows of a processed recording, one per threshold, make them durable and report progress
+        """
+
+        for row in rows:
+            self.write_row(row)
+        self.flush()
+
+        if self.progress_file is not None:
+            for row in rows:
+                progress = {'Time Stamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+                            'Experiment Directory': experiment_directory,
+                            'Recording Name': row['Recording Name'],
+                            'Ext Recording Name': row.get('Ext Recording Name'),
+                            'Status': status,
+                            'Nr Spots': row.get('Nr Spots'),
+                            'Nr Tracks': row.get('Nr Tracks'),
+                            'Run Time': row.get('Run Time')}
+                self.progress_file.write(json.dumps(progress) + '\n')
+            self.progress_file.flush()
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.rows_since_flush = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+        if self.progress_file is not None and self.progress_file is not sys.stdout:
+            self.progress_file.close()
+
+
+def run_trackmate_job(job_file_path, status_file_path, recording_source_directory, experiment_directory,
+                      nr_threads=None, progress_file_path=None):
+    """
+    Process the recordings of one job of the Run TrackMate Parallel coordinator.
+    The job file has the columns of the Experiment Info file and only the rows to process. The result rows are
+    appended to the status file as each recording finishes. The tracks files are left in the experiment directory,
+    the coordinator assembles All Recordings and All Tracks when all jobs of the experiment are done.
+    :param job_file_path: The job file
+    :param status_file_path: The file the result rows are written to
+    :param recording_source_directory: The directory with the recordings
+    :param experiment_directory: The experiment directory
+    :param nr_threads: The number of threads TrackMate may use in this worker
+    :param progress_file_path: Where to report progress, None for no reporting
+    :return:
+    """
+
+    with open(job_file_path, mode='r') as job_file:
+        csv_reader = csv.DictReader(job_file)
+        col_names = csv_reader.fieldnames + TRACKMATE_COLUMNS
+        rows = list(csv_reader)
+
+    status_writer = StatusWriter(status_file_path, col_names, progress_file_path)
+    for file_count, row in enumerate(rows):
+        paint_logger.info("Processing file nr {} of {}: {}".format(file_count + 1, len(rows), row['Recording Name']))
+        status, result_rows = process_recording(row, recording_source_directory, experiment_directory,
+                                                headless=True, nr_threads=nr_threads)
+        status_writer.write_recording(status, result_rows, experiment_directory)
+    status_writer.close()
 
 
 # Function to process directories after the window is closed
@@ -376,7 +617,61 @@ def create_gui():
     frame.setVisible(True)
 
 
+def parse_headless_arguments(arguments):
+    """
+    Parse the command line arguments of a headless run, e.g.
+
+        ImageJ-linux64 --headless --console Run_TrackMate.py --images-directory <dir> --experiment-directory <dir>
+
+    :param arguments: The command line arguments, without the script name
+    :return: The parsed arguments
+    """
+
+    parser = argparse.ArgumentParser(prog='Run_TrackMate',
+                                     description='Run TrackMate on the recordings of an experiment, without GUI')
+    parser.add_argument('--images-directory', required=True, help='The directory with the recordings')
+    parser.add_argument('--experiment-directory', required=True, help='The directory with the Experiment Info file')
+
+    # Used by the Run TrackMate Parallel coordinator to run a worker on part of the recordings
+    parser.add_argument('--job-file', help='Process only the recordings in this job file')
+    parser.add_argument('--status-file', help='The file the results of the job are written to')
+    parser.add_argument('--threads', type=int, default=None, help='The number of threads TrackMate may use')
+    parser.add_argument('--progress-file', default=None,
+                        help="Report progress as JSON lines to this file, '-' for standard output")
+    return parser.parse_args(arguments)
+
+
+def run_trackmate_headless(recordings_directory, experiment_directory, progress_file_path=None):
+    """
+    Run TrackMate on the calling thread, without display, dialogs or pauses
+    :param recordings_directory:
+    :param experiment_directory:
+    :return:
+    """
+
+    for directory in (recordings_directory, experiment_directory):
+        if not os.path.isdir(directory):
+            paint_logger.error("The directory '{}' does not exist.".format(directory))
+            sys.exit(1)
+
+    time_stamp = time.time()
+    run_trackmate(experiment_directory, recordings_directory, headless=True, progress_file_path=progress_file_path)
+    run_time = round(time.time() - time_stamp, 1)
+    paint_logger.info("\nProcessing completed in {}.".format(format_time_nicely(run_time)))
+
+
 if __name__ == "__main__":
-    # Call the function to create the GUI
 
-    create_gui()
+    # Started with directories on the command line (or by Fiji with --headless): run without GUI
+    if len(sys.argv) > 1 or fiji_is_headless():
+        args = parse_headless_arguments(sys.argv[1:])
+        if args.job_file:
+            # Every worker has its own log, as workers run side by side
+            paint_logger_change_file_handler_name(os.path.splitext(os.path.basename(args.job_file))[0] + '.log')
+            run_trackmate_job(args.job_file, args.status_file, args.images_directory, args.experiment_directory,
+                              args.threads, args.progress_file)
+        else:
+            run_trackmate_headless(args.images_directory, args.experiment_directory, args.progress_file)
+    else:
+        # Call the function to create the GUI
+        create_gui()
@@ -1,3 +1,4 @@
+import argparse
 import csv
 import os
 import sys
@@ -11,6 +12,7 @@ from LoggerConfig import (
 
 from FijiSupportFunctions import (
     ask_user_for_file,
+    fiji_is_headless,
     format_time_nicely)
 
 from Run_TrackMate import run_trackmate
@@ -18,16 +20,45 @@ from Run_TrackMate import run_trackmate
 # Set an appropriate name for the log file
 paint_logger_change_file_handler_name('Run TrackMate Batch.log')
 
+
+def parse_headless_arguments(arguments):
+    """
+    Parse the command line arguments of a headless run, e.g.
+
+        ImageJ-linux64 --headless --console Run_TrackMate_Batch.py --batch-file <file>
+
+    :param arguments: The command line arguments, without the script name
+    :return: The parsed arguments
+    """
+
+    parser = argparse.ArgumentParser(prog='Run_TrackMate_Batch',
+                                     description='Run TrackMate on the experiments in a batch file, without GUI')
+    parser.add_argument('--batch-file', required=True, help='The batch file with Source, Destination and Process')
+    parser.add_argument('--progress-file', default=None,
+                        help="Report progress as JSON lines to this file, '-' for standard output")
+    return parser.parse_args(arguments)
+
+
 if __name__ == "__main__":
 
-    batch_file_name = ask_user_for_file("Specify the batch file")
-    if not batch_file_name:
-        paint_logger.info("User aborted the batch processing.")
-        sys.exit(1)
+    # Started with a batch file on the command line (or by Fiji with --headless): run without GUI
+    headless = len(sys.argv) > 1 or fiji_is_headless()
+    progress_file_path = None
+    if headless:
+        args = parse_headless_arguments(sys.argv[1:])
+        batch_file_name = args.batch_file
+        progress_file_path = args.progress_file
+    else:
+        batch_file_name = ask_user_for_file("Specify the batch file")
+        if not batch_file_name:
+            paint_logger.info("User aborted the batch processing.")
+            sys.exit(1)
 
     if not os.path.exists(batch_file_name):
         msg = "Error: The file '{}' does not exist.".format(batch_file_name)
         paint_logger.error(msg)
+        if headless:
+            sys.exit(1)
         JOptionPane.showMessageDialog(None, msg, "Warning", JOptionPane.WARNING_MESSAGE)
     else:
 
@@ -80,14 +111,17 @@ if __name__ == "__main__":
                         paint_logger.info(message)
                         paint_logger.info("-" * len(message))
                         run_trackmate(experiment_directory=os.path.join(row['Source'], row['Image']),
-                                      recording_source_directory=os.path.join(row['Destination'], row['Image']))
+                                      recording_source_directory=os.path.join(row['Destination'], row['Image']),
+                                      headless=headless, progress_file_path=progress_file_path)
                         paint_logger.info("")
                         paint_logger.info("")
                 run_time = round(time.time() - time_stamp, 1)
 
                 if error:
                     msg = "Errors occurred during processing. Refer to the log file for more information."
-                    JOptionPane.showMessageDialog(None, msg, "Warning", JOptionPane.WARNING_MESSAGE)
+                    paint_logger.warning(msg)
+                    if not headless:
+                        JOptionPane.showMessageDialog(None, msg, "Warning", JOptionPane.WARNING_MESSAGE)
                 else:
                     paint_logger.info("Processing completed in {} seconds".format(format_time_nicely(run_time)))
 
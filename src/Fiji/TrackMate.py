@@ -11,6 +11,7 @@ import sys
 
 import fiji.plugin.trackmate.features.FeatureFilter as FeatureFilter
 import fiji.plugin.trackmate.visualization.hyperstack.HyperStackDisplayer as HyperStackDisplayer
+import fiji.plugin.trackmate.visualization.hyperstack.TrackOverlay as TrackOverlay
 from fiji.plugin.trackmate import (
     Logger,
     Model,
@@ -19,13 +20,20 @@ from fiji.plugin.trackmate import (
     TrackMate)
 from fiji.plugin.trackmate.action import CaptureOverlayAction
 from fiji.plugin.trackmate.detection import LogDetectorFactory
+from fiji.plugin.trackmate.features.track import (
+    TrackBranchingAnalyzer,
+    TrackDurationAnalyzer,
+    TrackIndexAnalyzer,
+    TrackLocationAnalyzer)
 from fiji.plugin.trackmate.gui.displaysettings import DisplaySettingsIO
 from fiji.plugin.trackmate.gui.displaysettings.DisplaySettings import TrackMateObject
 from fiji.plugin.trackmate.tracking.jaqaman import SparseLAPTrackerFactory
 from fiji.plugin.trackmate.util import LogRecorder
-from ij import WindowManager
+from ij import ImagePlus, WindowManager
+from ij.gui import Overlay
 from ij.io import FileSaver
 from ij.plugin.frame import RoiManager
+from ij.process import ImageProcessor
 
 
 from FijiSupportFunctions import fiji_get_file_open_write_attribute
@@ -35,11 +43,47 @@ from PaintConfig import (
     get_paint_defaults_file_path)
 
 
-def execute_trackmate_in_Fiji(recording_name, threshold, tracks_filename, image_filename, kas_special):
-    print("\nProcessing: " + tracks_filename)
-
-    paint_config = load_paint_config(get_paint_defaults_file_path())
-    trackmate_config = paint_config['TrackMate']
+def get_track_colouring(trackmate_config):
+    track_colouring = trackmate_config['TRACK_COLOURING']
+    if track_colouring != 'TRACK_DURATION' and track_colouring != 'TRACK_INDEX':
+        paint_logger.error('Invalid track colouring option in TrackMate configuration,default to TRACK_DURATION')
+        track_colouring = 'TRACK_DURATION'
+    return track_colouring
+
+
+def add_feature_analyzers(settings, analyzer_profile):
+    """
+    Register the feature analyzers of the profile.
+    With 'minimal' only the analyzers for the features Paint reads are added: NUMBER_SPOTS (also used by the track
+    filter), TRACK_DURATION, TRACK_X/Y_LOCATION and TRACK_INDEX (for track colouring). QUALITY and POSITION_X/Y are
+    spot features that every spot has without analyzers. With 'all' every analyzer known to TrackMate is added.
+    :param settings: The TrackMate settings
+    :param analyzer_profile: 'minimal' or 'all'
+    :return:
+    """
+
+    if analyzer_profile == 'all':
+        # They will yield numerical features for the results, such as speed, mean intensity etc.
+        settings.addAllAnalyzers()
+        return
+
+    if analyzer_profile != 'minimal':
+        paint_logger.error("Invalid analyzer profile '{}' in TrackMate configuration, default to minimal".format(
+            analyzer_profile))
+    settings.addTrackAnalyzer(TrackBranchingAnalyzer())
+    settings.addTrackAnalyzer(TrackDurationAnalyzer())
+    settings.addTrackAnalyzer(TrackLocationAnalyzer())
+    settings.addTrackAnalyzer(TrackIndexAnalyzer())
+
+
+def create_trackmate_settings(imp, threshold, trackmate_config):
+    """
+    Create the TrackMate settings for the recording from the TrackMate section of the Paint configuration
+    :param imp: The recording
+    :param threshold: The LoG detection threshold
+    :param trackmate_config: The TrackMate section of the Paint configuration
+    :return: The settings object
+    """
 
     max_frame_gap = trackmate_config['MAX_FRAME_GAP']
     linking_max_distance = trackmate_config['LINKING_MAX_DISTANCE']
@@ -60,30 +104,6 @@ def execute_trackmate_in_Fiji(recording_name, threshold, tracks_filename, image_
 
     min_number_of_spots = trackmate_config['MIN_NR_SPOTS_IN_TRACK']
 
-    track_colouring = trackmate_config['TRACK_COLOURING']
-    if track_colouring != 'TRACK_DURATION' and track_colouring != 'TRACK_INDEX':
-        paint_logger.error('Invalid track colouring option in TrackMate configuration,default to TRACK_DURATION')
-        track_colouring = 'TRACK_DURATION'
-
-    # We have to do the following to avoid errors with UTF8 chars generated in
-    # TrackMate that will mess with our Fiji Jython.
-    reload(sys)
-    sys.setdefaultencoding('utf-8')
-
-    # ----------------------------
-    # Create the model object now
-    # ----------------------------
-
-    # Some of the parameters we configure below need to have
-    # a reference to the model at creation. So we create an
-    # empty model now.
-
-    model = Model()
-    model.setLogger(Logger.IJ_LOGGER)
-
-    # Get currently selected image
-    imp = WindowManager.getCurrentImage()
-
     # Prepare settings object
     settings = Settings(imp)
 
@@ -119,29 +139,23 @@ def execute_trackmate_in_Fiji(recording_name, threshold, tracks_filename, image_
     settings.trackerSettings['MERGING_MAX_DISTANCE'] = merging_max_distance  # 15 .0
     settings.trackerSettings['CUTOFF_PERCENTILE'] = cutoff_percentile  # 0.9
 
-    # Add ALL the feature analyzers known to TrackMate.
-    # They will yield numerical features for the results, such as speed, mean intensity etc.
-    settings.addAllAnalyzers()
+    # Add only the feature analyzers that are needed, unless all are asked for in exploratory runs
+    add_feature_analyzers(settings, trackmate_config.get('ANALYZER_PROFILE', 'minimal'))
 
     # Configure track filters - Only consider tracks of 3 and longer.
     filter2 = FeatureFilter('NUMBER_SPOTS', min_number_of_spots, True)
     settings.addTrackFilter(filter2)
 
-    # Instantiate plugin
-    trackmate = TrackMate(model, settings)
+    return settings
 
-    # Process
-    ok = trackmate.checkInput()
-    if not ok:
-        paint_logger.error('Routine paint_trackmate - checkInput failed')
-        return -1, -1, -1
 
-    ok = trackmate.process()
-    if not ok:
-        paint_logger.error('Routine paint_trackmate - process failed')
-        return -1, -1, -1
-
-    # Get spots data, iterate through each track to calculate the mean square displacement
+def calculate_diffusion_coefficients(model):
+    """
+    Iterate through each visible track to calculate the mean square displacement and from that the diffusion
+    coefficient
+    :param model: The TrackMate model after tracking
+    :return: A list with the diffusion coefficient of every visible track, in track order
+    """
 
     track_ids = model.getTrackModel().trackIDs(True)  # True means only return visible tracks
     diffusion_coefficient_list = []
@@ -168,14 +182,52 @@ def execute_trackmate_in_Fiji(recording_name, threshold, tracks_filename, image_
         nice_diffusion_coefficient = round(diffusion_coefficient * 1000, 0)
         diffusion_coefficient_list.append(nice_diffusion_coefficient)
 
-    # ----------------
-    # Display results
-    # ----------------
+    return diffusion_coefficient_list
+
+
+# The thumbnail pyramid, as in Thumbnails.py: Thumbnails/<size>/<name>.jpg next to the TrackMate image
+THUMBNAIL_DIR = 'Thumbnails'
+THUMBNAIL_SIZES = [512, 128]
+
+
+def save_thumbnails(image, image_filename):
+    """
+    Save JPEG thumbnails of the TrackMate image, each made from the next larger one
+    :param image: The flattened or captured TrackMate image
+    :param image_filename: The TrackMate image file
+    :return:
+    """
+
+    directory, file_name = os.path.split(image_filename)
+    name = os.path.splitext(file_name)[0]
+    processor = image.getProcessor()
+    processor.setInterpolationMethod(ImageProcessor.BILINEAR)
+    for size in THUMBNAIL_SIZES:
+        thumbnail_dir = os.path.join(directory, THUMBNAIL_DIR, str(size))
+        if not os.path.isdir(thumbnail_dir):
+            os.makedirs(thumbnail_dir)
+        scale = min(1.0, float(size) / max(processor.getWidth(), processor.getHeight()))
+        processor = processor.resize(int(round(processor.getWidth() * scale)),
+                                     int(round(processor.getHeight() * scale)), True)
+        FileSaver(ImagePlus(name, processor)).saveAsJpeg(os.path.join(thumbnail_dir, name + '.jpg'))
 
-    if kas_special:
-        rm = RoiManager.getInstance()
-        rm.runCommand("Open", os.path.expanduser("~/paint.roi"))
-        rm.runCommand("Show All")
+
+def save_image(image, image_filename):
+    """
+    Save the TrackMate image as JPEG, or as TIFF when the file name asks for it (Single Analysis and Kas Special)
+    :return: True if the image was saved
+    """
+
+    if image_filename.lower().endswith(('.tif', '.tiff')):
+        return FileSaver(image).saveAsTiff(image_filename)
+    return FileSaver(image).saveAsJpeg(image_filename)
+
+
+def save_trackmate_image(model, imp, image_filename, track_colouring, headless):
+    """
+    Save the recording with the tracks drawn on top, with its thumbnails
+    :return: The displayer, None in headless mode. An exception is raised when the image can not be saved.
+    """
 
     # A selection.
     selection_model = SelectionModel(model)
@@ -185,26 +237,60 @@ def execute_trackmate_in_Fiji(recording_name, threshold, tracks_filename, image_
     ds.setSpotVisible(False)
     ds.setTrackColorBy(TrackMateObject.TRACKS, track_colouring)
 
-    displayer = HyperStackDisplayer(model, selection_model, imp, ds)
-    displayer.render()
-    displayer.refresh()
+    if headless:
+        # The displayer needs a window, so the track overlay is drawn onto the image directly and flattened
+        overlay = Overlay()
+        overlay.add(TrackOverlay(model, imp, ds))
+        imp.setOverlay(overlay)
+        flattened = imp.flatten()
+        if not save_image(flattened, image_filename):
+            raise IOError("FileSaver could not write the image")
+        save_thumbnails(flattened, image_filename)
+        return None
+    else:
+        displayer = HyperStackDisplayer(model, selection_model, imp, ds)
+        displayer.render()
+        displayer.refresh()
+
+        tm_logger = LogRecorder(Logger.VOID_LOGGER)
+        capture = CaptureOverlayAction.capture(imp, -1, 1, tm_logger)
+        save_image(capture, image_filename)
+        save_thumbnails(capture, image_filename)
+        return displayer
+
+
+def get_spots_filename(tracks_filename):
+    return tracks_filename.replace('-tracks.csv', '-spots.csv')
+
+
+def write_spots_file(model, recording_name, spots_filename):
+    """
+    Write the spots of the visible tracks, so the diffusion coefficients can be calculated outside Fiji
+    (see Diffusion_Coefficient_Engine)
+    :return:
+    """
+
+    track_model = model.getTrackModel()
+    with open(spots_filename, fiji_get_file_open_write_attribute()) as csvfile:
+        csvwriter = csv.writer(csvfile)
+        csvwriter.writerow(["Ext Recording Name", "Track Label", "Frame", "X", "Y"])
+        for track_id in track_model.trackIDs(True):
+            label = 'Track_' + str(track_id)
+            for spot in track_model.trackSpots(track_id):
+                csvwriter.writerow([recording_name, label, int(spot.getFeature('FRAME')),
+                                    round(spot.getFeature('POSITION_X'), 4), round(spot.getFeature('POSITION_Y'), 4)])
 
-    # ---------------------------------------------------
-    # Save the image file with image with overlay as tiff
-    # ---------------------------------------------------
 
-    image = trackmate.getSettings().imp
-    tm_logger = LogRecorder(Logger.VOID_LOGGER)
-    capture = CaptureOverlayAction.capture(image, -1, 1, tm_logger)
-    FileSaver(capture).saveAsTiff(image_filename)
+def write_tracks_file(model, recording_name, tracks_filename, diffusion_coefficient_list=None):
+    """
+    Write the visible tracks of the model to the tracks file
+    When no diffusion coefficients are passed, the column is left empty, to be filled from the spots file
+    :return:
+    """
 
     # The feature model, that stores edge and track features.
     feature_model = model.getFeatureModel()
 
-    # ----------------
-    # Write the Tracks file
-    # ----------------
-
     fields = ["Ext Recording Name", "Track Label", "Nr Spots", "Track Duration", 'Track X Location', 'Track Y Location',
               'Diffusion Coefficient']
 
@@ -227,9 +313,15 @@ def execute_trackmate_in_Fiji(recording_name, threshold, tracks_filename, image_
             y = round(feature_model.getTrackFeature(track_id, 'TRACK_Y_LOCATION'), 2)
 
             # Write the record for each track
-            csvwriter.writerow([recording_name, label, spots, duration, x, y, diffusion_coefficient_list[track_index]])
+            if diffusion_coefficient_list is None:
+                diffusion_coefficient = ''
+            else:
+                diffusion_coefficient = diffusion_coefficient_list[track_index]
+            csvwriter.writerow([recording_name, label, spots, duration, x, y, diffusion_coefficient])
             track_index += 1
 
+
+def get_trackmate_counts(model):
     model.getLogger().log('Found ' + str(model.getTrackModel().nTracks(True)) + ' tracks.')
 
     nr_spots = model.getSpots().getNSpots(True)  # Get visible spots only
@@ -237,3 +329,165 @@ def execute_trackmate_in_Fiji(recording_name, threshold, tracks_filename, image_
     filtered_tracks = model.getTrackModel().nTracks(True)  # Get filtered tracks
 
     return nr_spots, tracks, filtered_tracks
+
+
+def execute_trackmate_in_Fiji(recording_name, threshold, tracks_filename, image_filename, kas_special, imp=None,
+                              headless=False, nr_threads=None, export_spots=False):
+    print("\nProcessing: " + tracks_filename)
+
+    paint_config = load_paint_config(get_paint_defaults_file_path())
+    trackmate_config = paint_config['TrackMate']
+    track_colouring = get_track_colouring(trackmate_config)
+
+    # We have to do the following to avoid errors with UTF8 chars generated in
+    # TrackMate that will mess with our Fiji Jython.
+    reload(sys)
+    sys.setdefaultencoding('utf-8')
+
+    # ----------------------------
+    # Create the model object now
+    # ----------------------------
+
+    # Some of the parameters we configure below need to have
+    # a reference to the model at creation. So we create an
+    # empty model now.
+
+    model = Model()
+    model.setLogger(Logger.IJ_LOGGER)
+
+    # Use the recording passed in, otherwise the currently selected image
+    if imp is None:
+        imp = WindowManager.getCurrentImage()
+
+    settings = create_trackmate_settings(imp, threshold, trackmate_config)
+
+    # Instantiate plugin
+    trackmate = TrackMate(model, settings)
+    if nr_threads:
+        trackmate.setNumThreads(nr_threads)
+
+    # Process
+    ok = trackmate.checkInput()
+    if not ok:
+        paint_logger.error('Routine paint_trackmate - checkInput failed')
+        return -1, -1, -1
+
+    ok = trackmate.process()
+    if not ok:
+        paint_logger.error('Routine paint_trackmate - process failed')
+        return -1, -1, -1
+
+    # ----------------
+    # Display results
+    # ----------------
+
+    if kas_special:
+        rm = RoiManager.getInstance()
+        rm.runCommand("Open", os.path.expanduser("~/paint.roi"))
+        rm.runCommand("Show All")
+
+    # ---------------------------------------------------
+    # Save the image file with image with overlay
+    # ---------------------------------------------------
+
+    # Without its image the recording can not be viewed, so it is reported as failed and no tracks are written
+    try:
+        save_trackmate_image(model, trackmate.getSettings().imp, image_filename, track_colouring, headless)
+    except Exception as e:
+        paint_logger.error("Could not save the TrackMate image {}: {}".format(image_filename, e))
+        return -1, -1, -1
+
+    # Get spots data, iterate through each track to calculate the mean square displacement, unless the spots are
+    # exported and the diffusion coefficients are calculated outside Fiji
+    if export_spots:
+        diffusion_coefficient_list = None
+        write_spots_file(model, recording_name, get_spots_filename(tracks_filename))
+    else:
+        diffusion_coefficient_list = calculate_diffusion_coefficients(model)
+
+    # ----------------
+    # Write the Tracks file
+    # ----------------
+
+    write_tracks_file(model, recording_name, tracks_filename, diffusion_coefficient_list)
+
+    return get_trackmate_counts(model)
+
+
+def execute_trackmate_in_Fiji_for_thresholds(recording_names, thresholds, tracks_filenames, image_filenames, imp,
+                                             headless=False, nr_threads=None, export_spots=False):
+    """
+    Run TrackMate for several thresholds on the same recording, with one LoG detection.
+    Detection runs once at the lowest threshold. For every threshold the spots are then filtered on QUALITY, which for
+    the LoG detector is the value compared to the threshold, and only linking and track analysis are repeated.
+    :param recording_names: The Ext Recording Name for every threshold
+    :param thresholds: The thresholds
+    :param tracks_filenames: The tracks file to write for every threshold
+    :param image_filenames: The TrackMate image to write for every threshold
+    :param imp: The recording
+    :param headless: Do not display anything
+    :param nr_threads: The number of threads TrackMate may use, all processors if None
+    :param export_spots: Write a spots file instead of calculating the diffusion coefficients in Fiji
+    :return: A list with a (nr_spots, tracks, filtered_tracks) tuple per threshold, (-1, -1, -1) if it failed
+    """
+
+    paint_config = load_paint_config(get_paint_defaults_file_path())
+    trackmate_config = paint_config['TrackMate']
+    track_colouring = get_track_colouring(trackmate_config)
+
+    reload(sys)
+    sys.setdefaultencoding('utf-8')
+
+    model = Model()
+    model.setLogger(Logger.IJ_LOGGER)
+
+    settings = create_trackmate_settings(imp, min(thresholds), trackmate_config)
+    trackmate = TrackMate(model, settings)
+    if nr_threads:
+        trackmate.setNumThreads(nr_threads)
+
+    failed = [(-1, -1, -1)] * len(thresholds)
+    if not trackmate.checkInput():
+        paint_logger.error('Routine paint_trackmate - checkInput failed')
+        return failed
+
+    # The expensive part, done once for all thresholds
+    if not (trackmate.execDetection() and trackmate.execInitialSpotFiltering() and
+            trackmate.computeSpotFeatures(True)):
+        paint_logger.error('Routine paint_trackmate - detection failed: ' + str(trackmate.getErrorMessage()))
+        return failed
+
+    results = []
+    for recording_name, threshold, tracks_filename, image_filename in zip(
+            recording_names, thresholds, tracks_filenames, image_filenames):
+        print("\nProcessing: " + tracks_filename)
+
+        settings.clearSpotFilters()
+        settings.addSpotFilter(FeatureFilter('QUALITY', threshold, True))
+        if not (trackmate.execSpotFiltering(True) and trackmate.execTracking() and
+                trackmate.computeEdgeFeatures(True) and trackmate.computeTrackFeatures(True) and
+                trackmate.execTrackFiltering(True)):
+            paint_logger.error('Routine paint_trackmate - tracking failed for threshold {}: {}'.format(
+                threshold, trackmate.getErrorMessage()))
+            results.append((-1, -1, -1))
+            continue
+
+        # Without its image the recording can not be viewed, so it is reported as failed and no tracks are written
+        try:
+            displayer = save_trackmate_image(model, imp, image_filename, track_colouring, headless)
+        except Exception as e:
+            paint_logger.error("Could not save the TrackMate image {}: {}".format(image_filename, e))
+            results.append((-1, -1, -1))
+            continue
+        if displayer is not None:
+            displayer.clear()
+
+        if export_spots:
+            diffusion_coefficient_list = None
+            write_spots_file(model, recording_name, get_spots_filename(tracks_filename))
+        else:
+            diffusion_coefficient_list = calculate_diffusion_coefficients(model)
+        write_tracks_file(model, recording_name, tracks_filename, diffusion_coefficient_list)
+        results.append(get_trackmate_counts(model))
+
+    return results
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+
+from LoggerConfig import paint_logger
+
+# The checkpoint is hidden, like the Recording Viewer journal, so it does not show up as an experiment file
+CHECKPOINT_FILE = '.Run TrackMate Checkpoint.jsonl'
+
+
+def get_checkpoint_file_path(experiment_directory):
+    return os.path.join(experiment_directory, CHECKPOINT_FILE)
+
+
+def get_settings_hash(trackmate_config):
+    """
+    A hash of the TrackMate settings, so that a change in Paint.json invalidates the completed recordings
+    :param trackmate_config: The TrackMate section of the Paint configuration
+    :return: The hash as a hex string
+    """
+
+    settings = dict((key, value) for key, value in trackmate_config.items() if key != 'logging')
+    return hashlib.md5(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def get_recording_signature(recording_file_path, threshold_value, settings_hash):
+    """
+    Describe the inputs of a recording, a completed recording is only reused when its signature is unchanged
+    :param recording_file_path: The recording
+    :param threshold_value: The Threshold as specified in the Experiment Info file
+    :param settings_hash: The hash of the TrackMate settings
+    :return: The signature, or None if the recording does not exist
+    """
+
+    if not os.path.isfile(recording_file_path):
+        return None
+    stat = os.stat(recording_file_path)
+    return {'Recording Size': stat.st_size,
+            'Recording Mtime': stat.st_mtime,
+            'Threshold': threshold_value,
+            'Settings Hash': settings_hash}
+
+
+def get_file_sizes(file_paths):
+    return dict((file_path, os.path.getsize(file_path)) for file_path in file_paths if os.path.isfile(file_path))
+
+
+def merge_trackmate_results(row, results):
+    """
+    Combine the current Experiment Info row of a recording with the TrackMate results of an earlier run
+    :param row: The row of the recording in the Experiment Info file
+    :param results: The TrackMate columns per threshold, as kept in the checkpoint
+    :return: The All Recordings rows of the recording
+    """
+
+    rows = []
+    for result in results:
+        merged_row = dict(row)
+        merged_row.update(result)
+        rows.append(merged_row)
+    return rows
+
+
+class TrackMateCheckpoint(object):
+    """
+    The completion records of a Run TrackMate run of an experiment, appended to a file as each recording finishes.
+    When a run is interrupted, the next run skips the recordings that completed with the same inputs and settings and
+    whose output files are still there. When the run completes, a final record is written so a rerun with unchanged
+    inputs only rewrites All Recordings, with the current Experiment Info.
+    """
+
+    def __init__(self, experiment_directory):
+        self.file_path = get_checkpoint_file_path(experiment_directory)
+        self.recordings = {}  # Recording Name -> the completion record of the recording
+        self.complete = None  # The completion record of the whole run, if it completed
+        self.load()
+
+    def load(self):
+        if not os.path.isfile(self.file_path):
+            return
+        with open(self.file_path, 'r') as checkpoint_file:
+            for line in checkpoint_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A record that was being written when the run stopped
+                    paint_logger.warning("Ignoring an incomplete record in {}".format(self.file_path))
+                    continue
+                if record['Type'] == 'Recording':
+                    self.recordings[record['Recording Name']] = record
+                elif record['Type'] == 'Complete':
+                    self.complete = record
+
+    def is_resumable(self):
+        """
+        A run can be resumed when recordings completed but the run itself did not
+        """
+
+        return len(self.recordings) > 0 and self.complete is None
+
+    def completed_results(self, recording_name, signature):
+        """
+        Return the TrackMate results of a recording that was processed with the same signature, otherwise None.
+        Until the run completes, only recordings that were processed successfully and whose output files still exist
+        are reused. Once the run completed, the per recording files are part of All Tracks and All Spots and the results
+        of all recordings are reused, as they were in All Recordings.
+        :return: A (status, results) tuple, with a dictionary of TrackMate columns per threshold, or None
+        """
+
+        record = self.recordings.get(recording_name)
+        if record is None or 'Results' not in record or record['Signature'] != signature:
+            return None
+        if self.complete is None:
+            if record['Status'] != 'OK' or get_file_sizes(record['Output Files']) != record['Output Files']:
+                return None
+        return record['Status'], record['Results']
+
+    def is_complete(self, signatures, output_files):
+        """
+        Determine if the previous run completed for the same recordings, inputs and settings, with its output files
+        unchanged
+        :param signatures: Recording Name -> signature of the recordings to process
+        :param output_files: The files the run produces for the experiment as a whole
+        """
+
+        return (self.complete is not None and
+                self.complete['Signatures'] == signatures and
+                all('Results' in self.recordings.get(recording_name, {}) for recording_name in signatures) and
+                get_file_sizes(output_files) == self.complete['Output Files'])
+
+    def record_recording(self, recording_name, signature, status, results, output_files):
+        """
+        Record a processed recording. Only the TrackMate results are kept, the Experiment Info columns are taken from
+        the Experiment Info file when the results are reused, so that edits made after the run are not lost.
+        """
+
+        record = {'Type': 'Recording',
+                  'Recording Name': recording_name,
+                  'Signature': signature,
+                  'Status': status,
+                  'Results': results,
+                  'Output Files': get_file_sizes(output_files)}
+        self._append(record)
+        self.recordings[recording_name] = record
+
+    def record_complete(self, signatures, output_files):
+        record = {'Type': 'Complete',
+                  'Signatures': signatures,
+                  'Output Files': get_file_sizes(output_files)}
+        self._append(record)
+        self.complete = record
+
+    def clear(self):
+        if os.path.isfile(self.file_path):
+            os.remove(self.file_path)
+        self.recordings = {}
+        self.complete = None
+
+    def _append(self, record):
+        # Flushed to disk immediately, the point is to survive a crash of Fiji
+        with open(self.file_path, 'a') as checkpoint_file:
+            checkpoint_file.write(json.dumps(record) + '\n')
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
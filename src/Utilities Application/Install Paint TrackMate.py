@@ -147,6 +147,7 @@ def install():
             "Single_Analysis.py",
             "FijiSupportFunctions.py",
             "Trackmate.py",
+            "TrackMateCheckpoint.py",
             "ConvertBrightfieldImages.py",
             "LoggerConfig.py",
             "DirectoriesAndLocations.py",
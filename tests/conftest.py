@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The application modules are imported as src.Application..., the Fiji scripts import each other by module name
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in (root_directory, os.path.join(root_directory, 'src', 'Fiji')):
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.Application.Utilities.Diffusion_Coefficient_Engine import (
+    calculate_diffusion_coefficients,
+    recompute_diffusion_coefficients,
+    update_tracks_diffusion_coefficients,
+    FIRST_SPOT,
+    MSD_FIT)
+
+
+def make_spots(ext_recording_name, track_label, frames, x, y):
+    return pd.DataFrame({'Ext Recording Name': ext_recording_name, 'Track Label': track_label,
+                         'Frame': frames, 'X': x, 'Y': y})
+
+
+def test_first_spot():
+    # Squared distances to the first spot are 1, 4 and 9, so the MSD is 14 / 3
+    df_spots = make_spots('R1', 'Track_0', [2, 0, 1, 3], [2.0, 0.0, 1.0, 3.0], [0.0, 0.0, 0.0, 0.0])
+    df_dc = calculate_diffusion_coefficients(df_spots, {'R1': 0.1}, FIRST_SPOT)
+    assert df_dc['Diffusion Coefficient'].tolist() == [round(14 / 3 / (4 * 0.1) * 1000)]
+
+
+def test_msd_fit_of_uniform_motion_with_a_gap():
+    # A step of 1 per frame, with frame 2 missing: MSD(lag) = lag^2
+    frames = [0, 1, 3, 4, 5]
+    df_spots = make_spots('R1', 'Track_0', frames, [float(frame) for frame in frames], [0.0] * len(frames))
+    df_dc = calculate_diffusion_coefficients(df_spots, {'R1': 0.05}, MSD_FIT)
+
+    times = np.arange(1, 5) * 0.05
+    expected = (np.arange(1, 5) ** 2 * times).sum() / (4 * (times * times).sum())
+    assert df_dc['Diffusion Coefficient'].tolist() == [round(expected * 1000)]
+
+
+def test_tracks_are_kept_apart():
+    df_spots = pd.concat([make_spots('R1', 'Track_0', [0, 1], [0.0, 1.0], [0.0, 0.0]),
+                          make_spots('R2', 'Track_0', [0, 1], [0.0, 2.0], [0.0, 0.0])])
+    df_dc = calculate_diffusion_coefficients(df_spots, {}, FIRST_SPOT)
+    assert df_dc['Ext Recording Name'].tolist() == ['R1', 'R2']
+    assert df_dc['Diffusion Coefficient'].tolist() == [5000, 20000]
+
+
+def test_tracks_without_spots_keep_their_value():
+    df_tracks = pd.DataFrame({'Ext Recording Name': ['R1', 'R1'], 'Track Label': ['Track_0', 'Track_1'],
+                              'Diffusion Coefficient': [1.0, 2.0]})
+    df_spots = make_spots('R1', 'Track_0', [0, 1], [0.0, 1.0], [0.0, 0.0])
+    df_tracks = update_tracks_diffusion_coefficients(df_tracks, df_spots, {'R1': 0.05})
+    assert df_tracks['Diffusion Coefficient'].tolist() == [5000, 2.0]
+
+
+@pytest.mark.parametrize('method', [FIRST_SPOT, MSD_FIT])
+def test_recompute_updates_all_tracks(tmp_path, method):
+    pd.DataFrame({'Recording Name': ['R'], 'Ext Recording Name': ['R1'], 'Frame Interval': [0.1]}).to_csv(
+        tmp_path / 'All Recordings.csv', index=False)
+    pd.DataFrame({'Ext Recording Name': ['R1'], 'Track Label': ['Track_0'], 'Diffusion Coefficient': [0]}).to_csv(
+        tmp_path / 'All Tracks.csv', index=False)
+    make_spots('R1', 'Track_0', [0, 1], [0.0, 1.0], [0.0, 0.0]).to_csv(tmp_path / 'All Spots.csv', index=False)
+
+    assert recompute_diffusion_coefficients(str(tmp_path), method=method)
+    df_tracks = pd.read_csv(tmp_path / 'All Tracks.csv')
+    assert df_tracks['Diffusion Coefficient'].tolist() == [2500]
+
+
+def test_recompute_requires_all_spots(tmp_path):
+    assert not recompute_diffusion_coefficients(str(tmp_path))
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+from src.Application.Recording_Viewer.Display_Selected_Squares import (
+    SquaresLayer,
+    square_appearance,
+    NO_TAU_COLOUR)
+
+NR_OF_SQUARES_IN_ROW = 4
+
+
+class RecordingCanvas:
+    """
+    Stands in for the Tk canvas and records which items are configured
+    """
+
+    def __init__(self):
+        self.item_types = {}
+        self.configured = []
+
+    def _create(self, item_type):
+        item = len(self.item_types) + 1
+        self.item_types[item] = item_type
+        return item
+
+    def create_image(self, *args, **kwargs):
+        return self._create('image')
+
+    def create_rectangle(self, *args, **kwargs):
+        return self._create('rectangle')
+
+    def create_text(self, *args, **kwargs):
+        return self._create('text')
+
+    def type(self, item):
+        return self.item_types.get(item)
+
+    def delete(self, tag):
+        if tag == 'all':
+            self.item_types = {}
+
+    def itemconfigure(self, item, **options):
+        self.configured.append(item)
+
+    def bind(self, *args):
+        pass
+
+    def tag_bind(self, *args):
+        pass
+
+
+def make_squares(selected):
+    nr_of_squares = NR_OF_SQUARES_IN_ROW * NR_OF_SQUARES_IN_ROW
+    return pd.DataFrame({'Square Nr': np.arange(nr_of_squares),
+                         'Selected': [square_nr in selected for square_nr in range(nr_of_squares)],
+                         'Cell Id': 0,
+                         'Label Nr': [1.0 + square_nr for square_nr in range(nr_of_squares)]})
+
+
+def make_layer():
+    canvas = RecordingCanvas()
+    layer = SquaresLayer(canvas, None, None, (None, None, None))
+    return canvas, layer
+
+
+def render(layer, df_squares, squares_in_rectangle=()):
+    layer.canvas.configured = []
+    layer.render('image', df_squares, NR_OF_SQUARES_IN_ROW, True, True, set(squares_in_rectangle))
+    return [item for item in layer.canvas.configured if item != layer.image_item]
+
+
+def test_unchanged_squares_are_not_touched():
+    canvas, layer = make_layer()
+    assert len(render(layer, make_squares({1, 5}))) > 0
+    pool = dict(canvas.item_types)
+
+    assert render(layer, make_squares({1, 5})) == []
+    assert canvas.item_types == pool  # The pool is reused, not rebuilt
+
+
+def test_only_changed_squares_are_updated():
+    canvas, layer = make_layer()
+    render(layer, make_squares({1, 5}))
+
+    configured = render(layer, make_squares({1, 6}))
+    changed_items = set(layer.items[5][:4]) | set(layer.items[6][:4])
+    assert set(configured) <= changed_items
+    assert layer.states[5] is None and layer.states[6] is not None
+
+
+def test_rectangle_selection_markers():
+    canvas, layer = make_layer()
+    render(layer, make_squares({1}))
+
+    assert sorted(render(layer, make_squares({1}), {2, 3})) == [layer.items[2][4], layer.items[3][4]]
+    assert render(layer, make_squares({1}), {2, 3}) == []
+    assert render(layer, make_squares({1}), {3}) == [layer.items[2][4]]
+
+
+def test_square_appearance():
+    assert square_appearance(-1, 1, True) is None
+    assert square_appearance(0, np.nan, True) == (NO_TAU_COLOUR, None, None)
+    assert square_appearance(0, 3, True) == (None, '3', 'white')
+    assert square_appearance(1, 3, False) == ('red', None, None)
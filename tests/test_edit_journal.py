@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+from src.Application.Recording_Viewer.Edit_Journal import (
+    EditJournal,
+    replay_journal,
+    RECORDINGS,
+    SQUARES,
+    TRACKS)
+from src.Application.Recording_Viewer.Recording_Viewer_Support_Functions import (
+    build_recording_ranges,
+    get_recording_rows)
+
+
+def load_project():
+    df_experiment = pd.DataFrame({
+        'Ext Recording Name': ['R1', 'R2'],
+        'Neighbour Mode': ['Free', 'Free'],
+        'Exclude': [False, False],
+        'Tau': [100.0, 120.0]})
+    df_experiment.set_index('Ext Recording Name', inplace=True, drop=False)
+
+    df_all_squares = pd.DataFrame({
+        'Ext Recording Name': ['R1'] * 3 + ['R2'] * 3,
+        'Unique Key': [f'{name} - {nr}' for name in ['R1', 'R2'] for nr in range(3)],
+        'Square Nr': [0, 1, 2] * 2,
+        'Selected': [False] * 6,
+        'Label Nr': [np.nan] * 6,
+        'Cell Id': [0] * 6})
+    df_all_squares.set_index('Unique Key', inplace=True, drop=False)
+    return df_experiment, df_all_squares, build_recording_ranges(df_all_squares)
+
+
+def edit_recording(df_experiment, df_all_squares, squares_ranges, journal):
+    df_experiment.loc['R2', 'Tau'] = 150.0
+    df_experiment.loc['R2', 'Neighbour Mode'] = 'Strict'
+    df_squares = get_recording_rows(df_all_squares, squares_ranges, 'R2').copy()
+    df_squares['Selected'] = [True, False, True]
+    df_squares['Label Nr'] = [1, np.nan, 2]
+    df_squares['Cell Id'] = [3, 0, 3]
+    journal.record_recording(df_experiment, df_squares, 'R2', tracks_changed=True)
+    return df_squares
+
+
+def test_replay_restores_the_edits(tmp_path):
+    df_experiment, df_all_squares, squares_ranges = load_project()
+    journal = EditJournal(str(tmp_path))
+    df_edited_squares = edit_recording(df_experiment, df_all_squares, squares_ranges, journal)
+
+    # The viewer stopped without saving, the next session loads the files again and replays the journal
+    df_experiment, df_all_squares, squares_ranges = load_project()
+    records = EditJournal(str(tmp_path)).read()
+    assert replay_journal(records, df_experiment, df_all_squares, squares_ranges) == {'R2'}
+
+    assert df_experiment.loc['R2', 'Tau'] == 150.0
+    assert df_experiment.loc['R2', 'Neighbour Mode'] == 'Strict'
+    assert df_experiment.loc['R1', 'Tau'] == 100.0
+    df_squares = get_recording_rows(df_all_squares, squares_ranges, 'R2')
+    for column in ['Selected', 'Cell Id']:
+        assert df_squares[column].tolist() == df_edited_squares[column].tolist()
+    assert df_squares['Label Nr'].iloc[[0, 2]].tolist() == [1, 2]
+    assert pd.isna(df_squares['Label Nr'].iloc[1])
+    assert df_all_squares.dtypes.equals(load_project()[1].dtypes)
+    assert not get_recording_rows(df_all_squares, squares_ranges, 'R1')['Selected'].any()
+
+
+def test_replay_applies_settings_for_all_recordings(tmp_path):
+    df_experiment, df_all_squares, squares_ranges = load_project()
+    journal = EditJournal(str(tmp_path))
+    journal.record_all_recordings(df_experiment, {'Neighbour Mode': 'Relaxed'})
+
+    replay_journal(journal.read(), df_experiment, df_all_squares, squares_ranges)
+    assert df_experiment['Neighbour Mode'].tolist() == ['Relaxed', 'Relaxed']
+
+
+def test_incomplete_last_record_is_skipped(tmp_path):
+    df_experiment, df_all_squares, squares_ranges = load_project()
+    journal = EditJournal(str(tmp_path))
+    edit_recording(df_experiment, df_all_squares, squares_ranges, journal)
+    with open(journal.journal_path, 'a') as journal_file:
+        journal_file.write('{"Recording": "R1", "Exp')
+
+    assert len(journal.read()) == 1
+
+
+def test_save_writes_only_dirty_files(tmp_path):
+    df_experiment, df_all_squares, squares_ranges = load_project()
+    journal = EditJournal(str(tmp_path))
+    journal.record_experiment(df_experiment, 'R1')
+    assert journal.is_dirty()
+
+    written = journal.save(str(tmp_path), df_all_squares, pd.DataFrame(), df_experiment)
+    assert written == [RECORDINGS]
+    assert not (tmp_path / SQUARES).exists() and not (tmp_path / TRACKS).exists()
+    assert not journal.exists() and not journal.is_dirty()
@@ -0,0 +1,66 @@
+import numpy as np
+
+from src.Application.TrackMate_Native.Spot_Linker import get_track_features, link_spots
+
+TRACKMATE_CONFIG = {
+    'LINKING_MAX_DISTANCE': 0.6,
+    'ALTERNATIVE_LINKING_COST_FACTOR': 1.05,
+    'ALLOW_GAP_CLOSING': True,
+    'MAX_FRAME_GAP': 3,
+    'GAP_CLOSING_MAX_DISTANCE': 1.2,
+    'CUTOFF_PERCENTILE': 0.9}
+
+
+def make_spots(particles):
+    """
+    :param particles: Per particle a list of (frame, x, y) positions
+    :return: The frames, x and y of all spots, sorted on frame
+    """
+
+    spots = sorted(spot for particle in particles for spot in particle)
+    frames, x, y = (np.array(values) for values in zip(*spots))
+    return frames.astype(np.int64), x.astype(float), y.astype(float)
+
+
+# Two particles far apart, the first one is not detected in frames 3 and 4
+PARTICLE_1 = [(0, 1.0, 1.0), (1, 1.2, 1.0), (2, 1.4, 1.0), (5, 2.0, 1.0), (6, 2.2, 1.0)]
+PARTICLE_2 = [(0, 10.0, 10.0), (1, 10.0, 10.3), (2, 10.0, 10.6), (3, 10.0, 10.9), (4, 10.0, 11.2)]
+
+
+def test_gap_is_closed():
+    frames, x, y = make_spots([PARTICLE_1, PARTICLE_2])
+    tracks = link_spots(frames, x, y, TRACKMATE_CONFIG)
+
+    assert len(set(tracks)) == 2
+    assert len(set(tracks[x < 5])) == 1 and len(set(tracks[x > 5])) == 1
+
+    features = get_track_features(frames, x, y, tracks, 0.05)
+    track_1 = tracks[x < 5][0]
+    assert features['Nr Spots'][track_1] == 5
+    assert np.isclose(features['Track Duration'][track_1], 6 * 0.05)
+
+
+def test_gap_is_not_closed_when_disabled_or_too_long():
+    frames, x, y = make_spots([PARTICLE_1, PARTICLE_2])
+    tracks = link_spots(frames, x, y, dict(TRACKMATE_CONFIG, ALLOW_GAP_CLOSING=False))
+    assert len(set(tracks)) == 3
+
+    tracks = link_spots(frames, x, y, dict(TRACKMATE_CONFIG, MAX_FRAME_GAP=2))
+    assert len(set(tracks)) == 3
+
+
+def test_gap_is_not_closed_beyond_the_distance():
+    frames, x, y = make_spots([PARTICLE_1, PARTICLE_2])
+    tracks = link_spots(frames, x, y, dict(TRACKMATE_CONFIG, GAP_CLOSING_MAX_DISTANCE=0.5))
+    assert len(set(tracks)) == 3
+
+
+def test_crossing_particles_are_linked_on_distance():
+    # Two particles moving towards each other on parallel lines, each stays in its own track
+    particle_1 = [(frame, 1.0 + 0.3 * frame, 1.0) for frame in range(5)]
+    particle_2 = [(frame, 3.0 - 0.3 * frame, 1.5) for frame in range(5)]
+    frames, x, y = make_spots([particle_1, particle_2])
+    tracks = link_spots(frames, x, y, TRACKMATE_CONFIG)
+
+    assert len(set(tracks)) == 2
+    assert len(set(tracks[y == 1.0])) == 1 and len(set(tracks[y == 1.5])) == 1
@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.Application.Recording_Viewer.Select_Squares import (
+    _select_squares_actual,
+    count_selected_squares,
+    select_squares)
+from src.Application.Recording_Viewer.Threshold_Index import ThresholdIndex
+
+NR_OF_SQUARES_IN_ROW = 10
+
+# (min density ratio, max variability, min track duration, max track duration, min R squared)
+THRESHOLDS = [
+    (2.0, 10.0, 0.0, 100.0, 0.6),
+    (0.0, 100.0, 0.0, 1000.0, 0.0),
+    (4.0, 12.0, 5.0, 40.0, 0.5),
+    (1.0, 15.0, 25.0, 25.0, 0.4),  # A track duration range of a single value, which is in the data
+    (100.0, 0.0, 0.0, 0.0, 1.0)]
+
+
+def make_squares(seed=0):
+    rng = np.random.default_rng(seed)
+    nr_of_squares = NR_OF_SQUARES_IN_ROW * NR_OF_SQUARES_IN_ROW
+    square_nrs = np.arange(nr_of_squares)
+    df_squares = pd.DataFrame({
+        'Unique Key': [f'R1 - {square_nr}' for square_nr in square_nrs],
+        'Square Nr': square_nrs,
+        'Row Nr': square_nrs // NR_OF_SQUARES_IN_ROW + 1,
+        'Col Nr': square_nrs % NR_OF_SQUARES_IN_ROW + 1,
+        'Density Ratio': rng.integers(0, 10, nr_of_squares).astype(float),
+        'Variability': rng.uniform(0, 15, nr_of_squares).round(1),
+        'Max Track Duration': rng.integers(0, 50, nr_of_squares).astype(float),
+        'R Squared': rng.uniform(0.4, 1, nr_of_squares).round(2),
+        'Tau': rng.choice([-1, 50, 150, 200], nr_of_squares).astype(float)})
+
+    # Squares without a value never pass a threshold
+    df_squares.loc[df_squares.sample(10, random_state=seed).index, 'R Squared'] = np.nan
+    df_squares.loc[df_squares.sample(10, random_state=seed + 1).index, 'Variability'] = np.nan
+    df_squares.set_index('Unique Key', inplace=True, drop=False)
+    return df_squares
+
+
+def make_viewer(df_squares, thresholds, neighbour_mode):
+    return SimpleNamespace(
+        df_squares=df_squares, image_name='R1', threshold_indexes={}, nr_of_squares_in_row=NR_OF_SQUARES_IN_ROW,
+        min_required_density_ratio=thresholds[0], max_allowable_variability=thresholds[1],
+        min_track_duration=thresholds[2], max_track_duration=thresholds[3], min_allowable_r_squared=thresholds[4],
+        neighbour_mode=neighbour_mode)
+
+
+@pytest.mark.parametrize('thresholds', THRESHOLDS)
+@pytest.mark.parametrize('only_valid_tau', [True, False])
+def test_select_matches_dataframe_conditions(thresholds, only_valid_tau):
+    df_squares = make_squares()
+    expected = make_squares()
+    _select_squares_actual(expected, *thresholds, 'Free', NR_OF_SQUARES_IN_ROW, only_valid_tau=only_valid_tau)
+
+    selected = ThresholdIndex(df_squares).select(*thresholds, only_valid_tau=only_valid_tau)
+    assert selected.tolist() == expected['Selected'].tolist()
+    assert ThresholdIndex(df_squares).count(*thresholds, only_valid_tau=only_valid_tau) == expected['Selected'].sum()
+
+
+@pytest.mark.parametrize('thresholds', THRESHOLDS)
+@pytest.mark.parametrize('neighbour_mode', ['Free', 'Strict', 'Relaxed'])
+def test_viewer_selection_matches_generate_squares(thresholds, neighbour_mode):
+    expected = make_squares(seed=1)
+    _select_squares_actual(expected, *thresholds, neighbour_mode, NR_OF_SQUARES_IN_ROW)
+
+    viewer = make_viewer(make_squares(seed=1), thresholds, neighbour_mode)
+    select_squares(viewer)
+    assert viewer.df_squares['Selected'].tolist() == expected['Selected'].tolist()
+
+    viewer = make_viewer(make_squares(seed=1), thresholds, neighbour_mode)
+    assert count_selected_squares(viewer, *thresholds, neighbour_mode) == expected['Selected'].sum()
+
+
+def test_index_is_rebuilt_for_other_squares():
+    viewer = make_viewer(make_squares(), THRESHOLDS[0], 'Free')
+    select_squares(viewer)
+    threshold_index = viewer.threshold_indexes['R1']
+    assert threshold_index.matches(viewer.df_squares)
+    assert not threshold_index.matches(viewer.df_squares.iloc[1:])
@@ -0,0 +1,75 @@
+import os
+
+from TrackMateCheckpoint import TrackMateCheckpoint, get_recording_signature, merge_trackmate_results
+
+
+def write_file(file_path, content='data'):
+    with open(file_path, 'w') as output_file:
+        output_file.write(content)
+    return file_path
+
+
+def make_experiment(tmp_path):
+    recording_file_path = write_file(str(tmp_path / 'Recording-1.nd2'), 'recording')
+    tracks_file_path = write_file(str(tmp_path / 'Recording-1-threshold-10-tracks.csv'))
+    signature = get_recording_signature(recording_file_path, '10', 'hash')
+    results = [{'Threshold': '10', 'Nr Spots': 500, 'Nr Tracks': 40, 'Ext Recording Name': 'Recording-1-threshold-10'}]
+    return signature, results, tracks_file_path
+
+
+def test_resume_reuses_completed_recording(tmp_path):
+    signature, results, tracks_file_path = make_experiment(tmp_path)
+    checkpoint = TrackMateCheckpoint(str(tmp_path))
+    checkpoint.record_recording('Recording-1', signature, 'OK', results, [tracks_file_path])
+    checkpoint.record_recording('Recording-2', None, 'NOT_FOUND', [{'Recording Size': 0}], [])
+
+    resumed = TrackMateCheckpoint(str(tmp_path))
+    assert resumed.is_resumable()
+    assert resumed.completed_results('Recording-1', signature) == ('OK', results)
+    # Recordings that did not complete successfully are processed again
+    assert resumed.completed_results('Recording-2', None) is None
+
+
+def test_resume_skips_recording_with_changed_inputs_or_outputs(tmp_path):
+    signature, results, tracks_file_path = make_experiment(tmp_path)
+    checkpoint = TrackMateCheckpoint(str(tmp_path))
+    checkpoint.record_recording('Recording-1', signature, 'OK', results, [tracks_file_path])
+
+    resumed = TrackMateCheckpoint(str(tmp_path))
+    assert resumed.completed_results('Recording-1', dict(signature, Threshold='20')) is None
+    os.remove(tracks_file_path)
+    assert resumed.completed_results('Recording-1', signature) is None
+
+
+def test_completed_run_takes_current_experiment_info(tmp_path):
+    signature, results, tracks_file_path = make_experiment(tmp_path)
+    all_tracks_file_path = write_file(str(tmp_path / 'All Tracks.csv'))
+    checkpoint = TrackMateCheckpoint(str(tmp_path))
+    checkpoint.record_recording('Recording-1', signature, 'OK', results, [tracks_file_path])
+    checkpoint.record_complete({'Recording-1': signature}, [all_tracks_file_path])
+
+    # The per recording files are part of All Tracks once the run completed
+    os.remove(tracks_file_path)
+    rerun = TrackMateCheckpoint(str(tmp_path))
+    assert rerun.is_complete({'Recording-1': signature}, [all_tracks_file_path])
+    status, results = rerun.completed_results('Recording-1', signature)
+    assert status == 'OK'
+
+    # The Experiment Info was edited after the run, the edit is in the All Recordings row
+    row = {'Recording Name': 'Recording-1', 'Threshold': '10', 'Concentration': '20', 'Cell Type': 'BMDC'}
+    rows = merge_trackmate_results(row, results)
+    assert rows == [{'Recording Name': 'Recording-1', 'Threshold': '10', 'Concentration': '20', 'Cell Type': 'BMDC',
+                     'Nr Spots': 500, 'Nr Tracks': 40, 'Ext Recording Name': 'Recording-1-threshold-10'}]
+
+
+def test_completed_run_is_invalidated_by_changed_inputs(tmp_path):
+    signature, results, tracks_file_path = make_experiment(tmp_path)
+    all_tracks_file_path = write_file(str(tmp_path / 'All Tracks.csv'))
+    checkpoint = TrackMateCheckpoint(str(tmp_path))
+    checkpoint.record_recording('Recording-1', signature, 'OK', results, [tracks_file_path])
+    checkpoint.record_complete({'Recording-1': signature}, [all_tracks_file_path])
+
+    rerun = TrackMateCheckpoint(str(tmp_path))
+    assert not rerun.is_complete({'Recording-1': dict(signature, Threshold='20')}, [all_tracks_file_path])
+    write_file(all_tracks_file_path, 'other data')
+    assert not rerun.is_complete({'Recording-1': signature}, [all_tracks_file_path])